@@ -1,15 +1,22 @@
 import os
+import time
 import pandas as pd
 import joblib
 import requests # The library for making web requests
-from flask import Flask, render_template, request, redirect, url_for, flash
-from models import db, Patient
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, g
+from sqlalchemy import func
+from models import db, Patient, RiskSummary, RISK_BANDS, record_patient_summary, rebuild_risk_summary
+from render_cache import RenderCache
+from event_hub import EventHub
 
 # --- App Initialization ---
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'a_very_secret_key'
 db_path = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instance', 'database.db')
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+# DATABASE_URL points the app at another SQLite file (e.g. a scratch database for load tests)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', f'sqlite:///{db_path}')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 try:
@@ -30,7 +37,8 @@ print("✅ Stacking Model and Scaler loaded successfully.")
 
 # --- Hugging Face API Configuration ---
 # We no longer load the summarizer model locally.
-API_URL = "https://api-inference.huggingface.co/models/t5-small"
+# HF_API_URL overrides it, e.g. with the local stub load_test.py starts
+API_URL = os.getenv("HF_API_URL", "https://api-inference.huggingface.co/models/t5-small")
 # IMPORTANT: Set your token as an environment variable for security
 # or replace "YOUR_TOKEN_HERE" for a quick test (not recommended for production)
 HF_TOKEN = os.getenv("HF_TOKEN")
@@ -51,6 +59,75 @@ DEFAULT_VALUES = { 'GCS_first': 14.0, 'Lactate_first': 2.0, 'SAPS-I': 38.0 }
 
 with app.app_context():
     db.create_all()
+    # Databases from before the summary table: fill it once from the existing patients
+    if db.session.query(RiskSummary.hour).first() is None and db.session.query(Patient.id).first() is not None:
+        print(f"✅ Risk summary rebuilt from {rebuild_risk_summary()} existing patients.")
+
+def latest_patient_id():
+    """Newest patient id: the data version every worker sees, as patients are only ever inserted"""
+    return db.session.query(func.max(Patient.id)).scalar() or 0
+
+# --- Render cache for the polled pages (dashboard, patient detail) ---
+# Keyed on the newest patient id, so a Patient committed through any worker invalidates every worker's pages
+render_cache = RenderCache(latest_patient_id, max_entries=int(os.getenv("RENDER_CACHE_SIZE", "256")))
+
+# --- Server-sent events: new patient rows pushed to open dashboards ---
+def patient_rows_after(after_id, limit):
+    """Event hub feed: dashboard rows of the newest `limit` patients committed after after_id, oldest first"""
+    with app.test_request_context():
+        patients = Patient.query.filter(Patient.id > after_id).order_by(Patient.id.desc()).limit(limit).all()
+        return [
+            (patient.id, 'patient', {'id': patient.id, 'html': render_template('_patient_row.html', patient=patient)})
+            for patient in reversed(patients)
+        ]
+
+# Fed from the database, so every worker streams rows reported through any worker
+event_hub = EventHub(
+    patient_rows_after,
+    latest_patient_id,
+    buffer_size=int(os.getenv("EVENT_BUFFER_SIZE", "256")),
+    keepalive=float(os.getenv("EVENT_KEEPALIVE_SECONDS", "15")),
+    poll_interval=float(os.getenv("EVENT_POLL_SECONDS", "1"))
+)
+
+def green_threads():
+    """True under a gevent worker (gunicorn -k gevent), where an open stream is a cheap greenlet"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+def stream_capacity():
+    """
+    Event streams this process may hold open. Each one occupies a server thread
+    (or greenlet) until the dashboard closes, so thread-bound servers only get the
+    EVENT_MAX_SUBSCRIBERS they are sized for: by default none under sync/gthread
+    gunicorn workers, where streams would take the threads /report needs.
+    Serve with gunicorn -k gevent (or the Flask dev server) for many wall screens.
+    """
+    configured = os.getenv("EVENT_MAX_SUBSCRIBERS")
+    if configured:
+        return int(configured)
+    if green_threads() or request.environ.get('SERVER_SOFTWARE', '').startswith('Werkzeug'):
+        return 500
+    return 0
+
+# --- Per-stage timings, reported to clients in the Server-Timing header ---
+@contextmanager
+def timed_stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        g.setdefault('stage_timings', {})[name] = (time.perf_counter() - started) * 1000
+
+@app.after_request
+def add_server_timing(response):
+    timings = g.get('stage_timings')
+    if timings:
+        response.headers['Server-Timing'] = ', '.join(f'{name};dur={ms:.2f}' for name, ms in timings.items())
+    return response
 
 def make_prediction(form_data):
     patient_features_full = DEFAULT_VALUES.copy()
@@ -61,14 +138,16 @@ def make_prediction(form_data):
         'Temp_first': float(form_data['temperature']), 'RespRate_first': float(form_data['respiratory_rate']),
     })
     
-    df_full = pd.DataFrame([patient_features_full], columns=model_features)
-    scaled_features_full = scaler.transform(df_full)
-    scaled_features_full_df = pd.DataFrame(scaled_features_full, columns=model_features)
-    
-    final_features_for_model = scaled_features_full_df[predictor.feature_names_in_]
+    with timed_stage('features'):
+        df_full = pd.DataFrame([patient_features_full], columns=model_features)
+        scaled_features_full = scaler.transform(df_full)
+        scaled_features_full_df = pd.DataFrame(scaled_features_full, columns=model_features)
+        
+        final_features_for_model = scaled_features_full_df[predictor.feature_names_in_]
     
-    prediction_result = predictor.predict(final_features_for_model)[0]
-    risk_proba = predictor.predict_proba(final_features_for_model)[0][1]
+    with timed_stage('model'):
+        prediction_result = predictor.predict(final_features_for_model)[0]
+        risk_proba = predictor.predict_proba(final_features_for_model)[0][1]
     
     prompt = f"""Summarize this patient case for an ER doctor: 
     A {form_data['age']}-year-old {form_data['gender']} presents with critical vitals.
@@ -77,7 +156,8 @@ def make_prediction(form_data):
     - O2 Saturation: {form_data['oxygen_saturation']}%
     """
     # Call the new API function instead of the local pipeline
-    summary_json = query_huggingface_api({"inputs": prompt})
+    with timed_stage('summary'):
+        summary_json = query_huggingface_api({"inputs": prompt})
     summary_text = summary_json[0].get('summary_text', 'Summary generation failed.')
 
     return {
@@ -106,8 +186,13 @@ def report():
                 risk_score=prediction['risk_score'],
                 generative_summary=prediction['summary']
             )
-            db.session.add(new_patient)
-            db.session.commit()
+            with timed_stage('commit'):
+                db.session.add(new_patient)
+                record_patient_summary(new_patient)
+                db.session.commit()
+            with timed_stage('publish'):
+                # This worker's open streams get the row without waiting for the next poll
+                event_hub.notify()
             flash(f"Patient report #{new_patient.id} analyzed successfully.", 'success')
             return redirect(url_for('patient_detail', patient_id=new_patient.id))
         except Exception as e:
@@ -122,11 +207,92 @@ def report():
 def index(): return render_template('index.html')
     
 @app.route('/dashboard')
+@render_cache.cached
 def dashboard():
+    # Taken before the query: rows committed after it are replayed to the page's event stream
+    last_event_id = latest_patient_id()
+    event_hub.start()
     patients = Patient.query.order_by(Patient.timestamp.desc()).all()
-    return render_template('dashboard.html', patients=patients)
+    return render_template('dashboard.html', patients=patients, last_event_id=last_event_id)
+
+@app.route('/events/patients')
+def patient_events():
+    """Server-sent event stream of patient rows for the dashboard"""
+    # Last-Event-ID on reconnects; ?since= (the id the page was rendered at) on first connect
+    stream = event_hub.subscribe(
+        request.headers.get('Last-Event-ID') or request.args.get('since'), max_subscribers=stream_capacity()
+    )
+    if stream is None:
+        return Response('Too many event subscribers', status=503, headers={'Retry-After': '30'})
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Stop nginx from buffering the stream
+        'X-Accel-Buffering': 'no'
+    })
+
+def summarize(rows):
+    """Fold (location, risk_band, patients, icu, risk_score_sum) rows into one block of statistics"""
+    block = {
+        'patients': 0, 'icu_flagged': 0, 'mean_risk_score': None,
+        'risk_bands': {band: 0 for band, _ in RISK_BANDS}, 'locations': {}
+    }
+    risk_sum = 0.0
+    for location, band, count, icu, score_sum in rows:
+        block['patients'] += count
+        block['icu_flagged'] += icu
+        block['risk_bands'][band] += count
+        place = block['locations'].setdefault(location or 'unspecified', {'patients': 0, 'icu_flagged': 0})
+        place['patients'] += count
+        place['icu_flagged'] += icu
+        risk_sum += score_sum
+    if block['patients']:
+        block['mean_risk_score'] = round(risk_sum / block['patients'], 4)
+    return block
+
+@app.route('/api/summary')
+def summary():
+    """
+    Live risk statistics from the summary table (never a scan of Patient).
+    ?windows=1,6,24 sets the rolling windows in hours; each covers whole hours, the current one included.
+    """
+    try:
+        windows = sorted({int(h) for h in request.args.get('windows', '1,6,24').split(',') if h.strip()})
+    except ValueError:
+        return jsonify({'error': 'windows must be comma-separated whole hours'}), 400
+    if not windows or windows[0] < 1 or windows[-1] > 24 * 31:
+        return jsonify({'error': 'windows must be between 1 and 744 hours'}), 400
+    
+    current_hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    totals = (RiskSummary.patient_count, RiskSummary.icu_count, RiskSummary.risk_score_sum)
+    recent = db.session.query(RiskSummary.hour, RiskSummary.location, RiskSummary.risk_band, *totals).filter(
+        RiskSummary.hour >= current_hour - timedelta(hours=windows[-1] - 1)
+    ).all()
+    all_time = db.session.query(
+        RiskSummary.location, RiskSummary.risk_band, *(func.sum(column) for column in totals)
+    ).group_by(RiskSummary.location, RiskSummary.risk_band).all()
+    
+    hourly = {}
+    for hour, location, band, count, icu, score_sum in recent:
+        bucket = hourly.setdefault(hour, [0, 0, 0.0])
+        bucket[0] += count
+        bucket[1] += icu
+        bucket[2] += score_sum
+    
+    return jsonify({
+        'generated_at': datetime.utcnow().isoformat() + 'Z',
+        'all_time': summarize(all_time),
+        'windows': {
+            f'{hours}h': summarize(row[1:] for row in recent if row[0] >= current_hour - timedelta(hours=hours - 1))
+            for hours in windows
+        },
+        'hourly': [
+            {'hour': hour.isoformat() + 'Z', 'patients': count, 'icu_flagged': icu, 'mean_risk_score': round(score_sum / count, 4)}
+            for hour, (count, icu, score_sum) in sorted(hourly.items())
+        ]
+    })
 
 @app.route('/patient/<int:patient_id>')
+@render_cache.cached
 def patient_detail(patient_id):
     patient = db.get_or_404(Patient, patient_id)
     return render_template('patient.html', patient=patient)
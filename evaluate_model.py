@@ -14,9 +14,68 @@ from sklearn.metrics import (
     precision_score, recall_score, accuracy_score, balanced_accuracy_score
 )
 from sklearn.model_selection import cross_val_score, StratifiedKFold
+from concurrent.futures import ProcessPoolExecutor
 import warnings
 warnings.filterwarnings('ignore')
 
+# Approximate bytes of working memory per (replicate, sample) cell in a bootstrap chunk
+BOOTSTRAP_BYTES_PER_CELL = 48
+
+
+def _bootstrap_chunk(y_sorted, pred_sorted, group_starts, n_replicates, seed):
+    """
+    Score n_replicates bootstrap resamples at once.
+    
+    Inputs are pre-sorted by descending predicted probability and group_starts
+    marks the first position of each run of tied scores, so AUC-ROC and
+    AUC-PR reduce to cumulative sums over resampling multiplicities.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(y_sorted)
+    
+    # Resampled index matrix -> multiplicity of each sample in each replicate
+    idx = rng.integers(0, n, size=(n_replicates, n))
+    idx += (np.arange(n_replicates) * n)[:, None]
+    weights = np.bincount(idx.ravel(), minlength=n_replicates * n).reshape(n_replicates, n)
+    del idx
+    
+    pos_w = weights * y_sorted
+    neg_w = weights - pos_w
+    
+    # Confusion counts for every replicate
+    tp = pos_w @ pred_sorted
+    fn = pos_w.sum(axis=1) - tp
+    fp = neg_w @ pred_sorted
+    tn = neg_w.sum(axis=1) - fp
+    
+    # Per tie-group totals, in descending score order
+    pos_g = np.add.reduceat(pos_w, group_starts, axis=1).astype(np.float64)
+    neg_g = np.add.reduceat(neg_w, group_starts, axis=1).astype(np.float64)
+    del pos_w, neg_w, weights
+    n_pos = pos_g.sum(axis=1)
+    n_neg = neg_g.sum(axis=1)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Mann-Whitney AUC: each positive beats negatives in lower-score groups, ties count half
+        neg_below = n_neg[:, None] - np.cumsum(neg_g, axis=1)
+        auc_roc = (pos_g * (neg_below + 0.5 * neg_g)).sum(axis=1) / (n_pos * n_neg)
+        
+        # Average precision: precision at each threshold weighted by the recall step
+        tp_cum = np.cumsum(pos_g, axis=1)
+        fp_cum = np.cumsum(neg_g, axis=1)
+        precision_at = np.where(pos_g > 0, tp_cum / (tp_cum + fp_cum), 0.0)
+        auc_pr = (pos_g * precision_at).sum(axis=1) / n_pos
+        
+        return {
+            'Sensitivity (Recall)': tp / (tp + fn),
+            'Specificity': tn / (tn + fp),
+            'Precision (PPV)': tp / (tp + fp),
+            'Negative Predictive Value': tn / (tn + fn),
+            'AUC-ROC': auc_roc,
+            'AUC-PR': auc_pr
+        }
+
+
 class HealthcareModelEvaluator:
     """Comprehensive evaluation suite for healthcare ML models"""
     
@@ -111,6 +170,56 @@ class HealthcareModelEvaluator:
         
         return metrics
     
+    def bootstrap_confidence_intervals(self, y_true, y_pred, y_pred_proba, n_bootstrap=2000,
+                                       confidence=0.95, max_chunk_mb=256, n_jobs=1, random_state=42):
+        """
+        Percentile bootstrap confidence intervals for the healthcare metrics.
+        
+        Replicates are generated and scored in NumPy chunks sized to stay under
+        max_chunk_mb of working memory; chunks run across n_jobs processes when
+        n_jobs > 1. Each chunk gets its own spawned seed, so results do not
+        depend on n_jobs.
+        """
+        y_true = np.asarray(y_true).astype(np.int64)
+        y_pred = np.asarray(y_pred).astype(np.int64)
+        y_pred_proba = np.asarray(y_pred_proba, dtype=np.float64)
+        n = len(y_true)
+        
+        # Sort once; every replicate reuses the same order and tie groups
+        order = np.argsort(-y_pred_proba, kind='mergesort')
+        sorted_scores = y_pred_proba[order]
+        group_starts = np.r_[0, np.flatnonzero(np.diff(sorted_scores)) + 1]
+        y_sorted = y_true[order]
+        pred_sorted = y_pred[order]
+        
+        chunk_size = max(1, min(n_bootstrap, (max_chunk_mb * 1024 * 1024) // (n * BOOTSTRAP_BYTES_PER_CELL)))
+        chunk_sizes = [chunk_size] * (n_bootstrap // chunk_size)
+        if n_bootstrap % chunk_size:
+            chunk_sizes.append(n_bootstrap % chunk_size)
+        seeds = np.random.SeedSequence(random_state).spawn(len(chunk_sizes))
+        
+        args = [(y_sorted, pred_sorted, group_starts, size, seed) for size, seed in zip(chunk_sizes, seeds)]
+        if n_jobs > 1 and len(args) > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                chunks = list(executor.map(_bootstrap_chunk, *zip(*args)))
+        else:
+            chunks = [_bootstrap_chunk(*a) for a in args]
+        
+        point = self.calculate_healthcare_metrics(y_true, y_pred, y_pred_proba)
+        alpha = (1 - confidence) / 2
+        intervals = {}
+        for metric in chunks[0]:
+            replicates = np.concatenate([c[metric] for c in chunks])
+            lower, upper = np.nanpercentile(replicates, [100 * alpha, 100 * (1 - alpha)])
+            intervals[metric] = {
+                'estimate': float(point[metric]),
+                'lower': float(lower),
+                'upper': float(upper),
+                'std': float(np.nanstd(replicates))
+            }
+        
+        return intervals
+    
     def plot_performance_curves(self, y_true, y_pred_proba, save_plots=True):
         """Plot ROC and Precision-Recall curves"""
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
@@ -200,7 +309,7 @@ class HealthcareModelEvaluator:
         
         return cv_scores
     
-    def generate_evaluation_report(self, save_report=True):
+    def generate_evaluation_report(self, save_report=True, n_bootstrap=2000):
         """Generate comprehensive evaluation report"""
         print("🔍 Starting comprehensive model evaluation...")
         print("=" * 60)
@@ -244,6 +353,15 @@ class HealthcareModelEvaluator:
         print(f"False Positives (Unnecessary ICU predictions): {metrics['False Positives']}")
         print(f"False Negatives (Missed ICU cases): {metrics['False Negatives']}")
         
+        # Bootstrap confidence intervals
+        confidence_intervals = self.bootstrap_confidence_intervals(
+            y_test, y_pred, y_pred_proba, n_bootstrap=n_bootstrap
+        )
+        
+        print(f"\n📏 95% BOOTSTRAP CONFIDENCE INTERVALS ({n_bootstrap} replicates):")
+        for metric, ci in confidence_intervals.items():
+            print(f"{metric}: {ci['estimate']:.3f} ({ci['lower']:.3f} - {ci['upper']:.3f})")
+        
         # Cross-validation analysis
         cv_scores = self.cross_validation_analysis(X_train, y_train)
         
@@ -262,6 +380,7 @@ class HealthcareModelEvaluator:
                 'ICU Cases': int(y_test.sum()),
                 'Prevalence': y_test.mean(),
                 **metrics,
+                'Confidence_Intervals': confidence_intervals,
                 'CV_Results': cv_scores
             }
             
@@ -0,0 +1,148 @@
+"""
+Server-sent event fan-out for the dashboard
+New and updated patient rows pushed to every open dashboard instead of full-page reloads
+"""
+import json
+import os
+import threading
+from collections import deque
+
+
+class EventHub:
+    """
+    Fan-out of events to any number of SSE subscribers, fed from shared state.
+
+    Events come from the database, not from the request that wrote them: a
+    poller thread calls fetch(after_id, limit) every poll_interval (or as soon
+    as notify() is called) and buffers the new (id, event, data) rows in one
+    shared ring of the last buffer_size events. Ids are the rows' own ids, so
+    every worker process sees every event under the same id, and a page can
+    embed the id it was rendered at. head() gives the newest id when polling
+    starts.
+
+    Publishing is O(1) whatever the number of subscribers. Each subscriber
+    only keeps the id of the last event it sent, so its backlog is bounded by
+    the ring. A subscriber that falls further behind (or resumes from an id
+    older than the ring, e.g. after a restart) gets a single "resync" event
+    telling the page to reload. Idle subscribers sleep on one condition and
+    wake every keepalive seconds to send a comment line, which also detects
+    closed connections.
+    """
+
+    def __init__(self, fetch, head, buffer_size=256, keepalive=15.0, poll_interval=1.0):
+        self.fetch = fetch
+        self.head = head
+        self.buffer_size = buffer_size
+        self.keepalive = keepalive
+        self.poll_interval = poll_interval
+        self.events = deque()
+        # Events up to floor are no longer (or were never) buffered
+        self.floor = 0
+        self.last_id = 0
+        self.condition = threading.Condition()
+        self.wake = threading.Event()
+        self.poller = None
+        self.poller_pid = None
+        self.subscribers = 0
+        self.stats = {'published': 0, 'polls': 0, 'poll_errors': 0, 'resyncs': 0, 'rejected': 0}
+
+    def start(self):
+        """Start polling in this process (idempotent; a forked worker starts its own poller)"""
+        with self.condition:
+            if self.poller is not None and self.poller_pid == os.getpid():
+                return
+            self.last_id = self.floor = self.head()
+            self.events.clear()
+            self.poller_pid = os.getpid()
+            self.poller = threading.Thread(target=self._poll, name='event-hub-poller', daemon=True)
+            self.poller.start()
+
+    def notify(self):
+        """Poll now instead of at the next interval (after a write in this process)"""
+        self.wake.set()
+
+    def _poll(self):
+        while True:
+            self.wake.wait(self.poll_interval)
+            self.wake.clear()
+            try:
+                rows = self.fetch(self.last_id, self.buffer_size)
+            except Exception as e:
+                self.stats['poll_errors'] += 1
+                print(f"⚠️ Event poll failed: {e}")
+                continue
+            self.stats['polls'] += 1
+            if rows:
+                self.publish(rows, complete=len(rows) < self.buffer_size)
+
+    def publish(self, rows, complete=True):
+        """
+        Buffer (id, event, data) rows, oldest first; data must be JSON-serializable.
+        complete=False means rows before these may be missing, so older cursors resync.
+        """
+        payloads = [(event_id, event, json.dumps(data, default=str)) for event_id, event, data in rows]
+        with self.condition:
+            if not complete:
+                self.floor = max(self.floor, payloads[0][0] - 1)
+            for item in payloads:
+                if item[0] <= self.last_id:
+                    continue
+                if len(self.events) >= self.buffer_size:
+                    self.floor = self.events.popleft()[0]
+                self.events.append(item)
+                self.last_id = item[0]
+                self.stats['published'] += 1
+            self.condition.notify_all()
+
+    def subscribe(self, last_event_id=None, max_subscribers=500):
+        """
+        Generator of SSE-formatted chunks for one connection, or None when
+        max_subscribers are already connected in this process. last_event_id
+        resumes after a reconnect, or after the event id a page was rendered at.
+        """
+        self.start()
+        with self.condition:
+            if self.subscribers >= max_subscribers:
+                self.stats['rejected'] += 1
+                return None
+            cursor = self.last_id
+            if last_event_id:
+                # Unparsable ids resync; ids ahead of this process's poller are simply waited for
+                cursor = int(last_event_id) if last_event_id.isdigit() else -1
+        return self._stream(cursor)
+
+    def _stream(self, cursor):
+        # Counted from the first chunk on, so a response that is never iterated can't leak a slot
+        with self.condition:
+            self.subscribers += 1
+        try:
+            # Client reconnect delay, then an immediate chunk so proxies flush the headers
+            yield 'retry: 3000\n\n'
+            while True:
+                with self.condition:
+                    if self.last_id <= cursor:
+                        self.condition.wait(self.keepalive)
+                    if cursor < self.floor:
+                        pending = None
+                        cursor = self.last_id
+                        self.stats['resyncs'] += 1
+                    else:
+                        pending = [item for item in self.events if item[0] > cursor]
+                        if pending:
+                            cursor = pending[-1][0]
+                if pending is None:
+                    yield f'id: {cursor}\nevent: resync\ndata: {{}}\n\n'
+                elif pending:
+                    yield ''.join(f'id: {event_id}\nevent: {event}\ndata: {payload}\n\n' for event_id, event, payload in pending)
+                else:
+                    yield ': keepalive\n\n'
+        finally:
+            with self.condition:
+                self.subscribers -= 1
+
+    def report(self):
+        with self.condition:
+            return {
+                'subscribers': self.subscribers, 'last_event_id': self.last_id, 'floor': self.floor,
+                'buffered': len(self.events), 'polling': self.poller is not None, **self.stats
+            }
@@ -0,0 +1,342 @@
+"""
+Report Pipeline Load Test
+Drives /report -> /patient/<id> on the Flask app under concurrency, with a local stand-in for the Hugging Face API
+
+Starts a stub summary API with configurable latency and error rate, runs the app against it (Flask's threaded
+server or gunicorn, on a scratch database) and reports throughput, latency percentiles and where each report's
+time goes, using the Server-Timing stages app.py emits (features, model, summary, commit, publish).
+
+Usage:
+    python load_test.py --concurrency 1,4,16 --requests 200 --stub-latency-ms 300
+    python load_test.py --server gunicorn --workers 4 --threads 2 --stub-latency-ms 800 --stub-error-rate 0.05
+    python load_test.py --url http://127.0.0.1:8000 --slots 8 --stub-port 8089
+        (a server you started with HF_API_URL=http://127.0.0.1:8089)
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import requests
+
+STAGES = ['features', 'model', 'summary', 'commit', 'publish']
+LOCATIONS = ['North Station', 'South Station', 'Harbor', 'Airport', 'Downtown']
+
+
+class SummaryStub:
+    """Local stand-in for the Hugging Face inference API: fixed latency plus jitter, and a share of 503s"""
+
+    def __init__(self, latency_ms: float = 300, jitter_ms: float = 50, error_rate: float = 0.0,
+                 port: int = 0, seed: int = 0):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'in_flight': 0, 'max_in_flight': 0}
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with stub.lock:
+                    delay = max(0.0, stub.rng.gauss(stub.latency, stub.jitter))
+                    failed = stub.rng.random() < stub.error_rate
+                    stub.stats['requests'] += 1
+                    stub.stats['errors'] += failed
+                    stub.stats['in_flight'] += 1
+                    stub.stats['max_in_flight'] = max(stub.stats['max_in_flight'], stub.stats['in_flight'])
+                try:
+                    time.sleep(delay)
+                    if failed:
+                        body, status = {'error': 'Model is currently loading', 'estimated_time': 20.0}, 503
+                    else:
+                        body, status = [{'summary_text': 'Elderly patient with tachycardia, hypotension and hypoxia.'}], 200
+                    payload = json.dumps(body).encode()
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                finally:
+                    with stub.lock:
+                        stub.stats['in_flight'] -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server.server_address[1]}/models/t5-small'
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name='summary-stub', daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def start_app_server(kind: str, port: int, workers: int, threads: int, env: Dict[str, str], log_path: str):
+    """Run app.py in its own process(es) so the load generator doesn't share its GIL"""
+    if kind == 'gunicorn':
+        command = ['gunicorn', '--workers', str(workers), '--threads', str(threads),
+                   '--bind', f'127.0.0.1:{port}', '--timeout', '120', 'app:app']
+    else:
+        command = [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port), '--with-threads']
+    log = open(log_path, 'w')
+    process = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)),
+                               env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f'http://127.0.0.1:{port}'
+    # Model loading can take a while
+    deadline = time.monotonic() + 180
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{kind} exited with code {process.returncode}; see {log_path}')
+        try:
+            if requests.get(base_url + '/', timeout=2).status_code == 200:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f'{kind} did not come up within 180s; see {log_path}')
+
+
+def random_report(rng: random.Random) -> Dict[str, Any]:
+    return {
+        'age': rng.randint(18, 95),
+        'gender': rng.choice(['Male', 'Female']),
+        'heart_rate': rng.randint(45, 160),
+        'systolic_blood_pressure': rng.randint(70, 190),
+        'diastolic_blood_pressure': rng.randint(40, 110),
+        'oxygen_saturation': round(rng.uniform(82, 100), 1),
+        'temperature': round(rng.uniform(35.0, 40.5), 1),
+        'respiratory_rate': rng.randint(10, 36),
+        'paramedic_notes': 'Load test report',
+        'location': rng.choice(LOCATIONS)
+    }
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    timings = {}
+    for entry in (header or '').split(','):
+        name, _, params = entry.strip().partition(';')
+        if params.startswith('dur='):
+            timings[name] = float(params[4:])
+    return timings
+
+
+def submit_report(session: requests.Session, base_url: str, form: Dict[str, Any]) -> Dict[str, Any]:
+    """One user flow: POST /report, then follow the redirect to the patient page"""
+    sample = {'ok': False}
+    started = time.perf_counter()
+    try:
+        response = session.post(base_url + '/report', data=form, allow_redirects=False, timeout=120)
+        sample['report_ms'] = (time.perf_counter() - started) * 1000
+        sample['stages'] = parse_server_timing(response.headers.get('Server-Timing'))
+        location = response.headers.get('Location', '')
+        if response.status_code != 302 or '/patient/' not in location:
+            sample['error'] = f'report failed (HTTP {response.status_code}, redirect to {location or "nowhere"})'
+            return sample
+        page_started = time.perf_counter()
+        page = session.get(requests.compat.urljoin(base_url, location), timeout=120)
+        sample['patient_ms'] = (time.perf_counter() - page_started) * 1000
+        if page.status_code != 200:
+            sample['error'] = f'patient page HTTP {page.status_code}'
+            return sample
+        sample['ok'] = True
+    except requests.RequestException as e:
+        sample['error'] = type(e).__name__
+    finally:
+        sample['total_ms'] = (time.perf_counter() - started) * 1000
+    return sample
+
+
+def run_level(base_url: str, concurrency: int, total_requests: int, seed: int) -> Dict[str, Any]:
+    """Closed loop: `concurrency` users each submit reports back to back until total_requests are done"""
+    remaining = iter(range(total_requests))
+    lock = threading.Lock()
+    samples: List[Dict[str, Any]] = []
+
+    def user(index: int):
+        rng = random.Random(seed * 1000 + index)
+        with requests.Session() as session:
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                sample = submit_report(session, base_url, random_report(rng))
+                with lock:
+                    samples.append(sample)
+
+    started = time.perf_counter()
+    users = [threading.Thread(target=user, args=(i,)) for i in range(concurrency)]
+    for thread in users:
+        thread.start()
+    for thread in users:
+        thread.join()
+    return summarize_level(concurrency, samples, time.perf_counter() - started)
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {'mean_ms': None, 'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'mean_ms': round(float(np.mean(values)), 2), 'p50_ms': round(float(p50), 2),
+            'p95_ms': round(float(p95), 2), 'p99_ms': round(float(p99), 2)}
+
+
+def summarize_level(concurrency: int, samples: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    ok = [s for s in samples if s['ok']]
+    errors: Dict[str, int] = {}
+    for s in samples:
+        if not s['ok']:
+            errors[s['error']] = errors.get(s['error'], 0) + 1
+
+    # Time in the report request not covered by a stage: queueing for a server thread, parsing, network
+    for s in ok:
+        s['stages']['other'] = max(0.0, s['report_ms'] - sum(s['stages'].get(stage, 0.0) for stage in STAGES))
+    mean_report = float(np.mean([s['report_ms'] for s in ok])) if ok else 0.0
+    stages = {}
+    for stage in STAGES + ['other']:
+        values = [s['stages'].get(stage, 0.0) for s in ok]
+        stages[stage] = {**percentiles(values), 'share': round(float(np.mean(values)) / mean_report, 3) if ok else None}
+
+    return {
+        'concurrency': concurrency,
+        'requests': len(samples),
+        'succeeded': len(ok),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 2),
+        'throughput_rps': round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        'latency': {
+            'flow': percentiles([s['total_ms'] for s in ok]),
+            'report': percentiles([s['report_ms'] for s in ok]),
+            'patient_page': percentiles([s['patient_ms'] for s in ok])
+        },
+        'stages': stages
+    }
+
+
+def capacity(level: Dict[str, Any], processes: int, slots: Optional[int]) -> Dict[str, Any]:
+    """
+    Throughput ceilings implied by the stage times of an uncontended level:
+    - per slot: a server thread is held for the whole report, summary call included
+    - CPU: stages other than the summary call hold the GIL, so processes / their time
+    - slots: slots x the per-slot rate, when the server's slot count is known
+    """
+    stage_ms = {stage: level['stages'][stage]['mean_ms'] or 0.0 for stage in STAGES}
+    service = sum(stage_ms.values()) / 1000
+    cpu = service - stage_ms['summary'] / 1000
+    ceilings = {
+        'based_on_concurrency': level['concurrency'],
+        'service_ms': round(service * 1000, 1),
+        'summary_share_of_service': round(stage_ms['summary'] / 1000 / service, 3) if service > 0 else None,
+        'per_slot_rps': round(1 / service, 2) if service > 0 else None,
+        'per_slot_rps_without_summary': round(1 / cpu, 2) if cpu > 0 else None,
+        'cpu_bound_rps': round(processes / cpu, 1) if cpu > 0 else None
+    }
+    if slots:
+        ceilings['slots'] = slots
+        ceilings['slot_bound_rps'] = round(slots / service, 1) if service > 0 else None
+    return ceilings
+
+
+def print_capacity(c: Dict[str, Any]):
+    print(f"\n📈 Capacity (stage times at concurrency {c['based_on_concurrency']}): {c['service_ms']:.0f} ms of server "
+          f"time per report, {c['summary_share_of_service']:.0%} of it waiting on the synchronous summary call")
+    print(f"   each server slot (gunicorn worker x thread) sustains ~{c['per_slot_rps']} reports/s, "
+          f"~{c['per_slot_rps_without_summary']} if the summary call were off the request path")
+    print(f"   CPU-bound ceiling ~{c['cpu_bound_rps']} reports/s for the measured server process(es)")
+    if 'slots' in c:
+        print(f"   {c['slots']} slots cap throughput at ~{min(c['slot_bound_rps'], c['cpu_bound_rps'])} reports/s")
+
+
+def print_level(level: Dict[str, Any]):
+    flow = level['latency']['flow']
+    print(f"\n▶ concurrency {level['concurrency']}: {level['succeeded']}/{level['requests']} ok in {level['elapsed_s']}s "
+          f"→ {level['throughput_rps']} reports/s")
+    if flow['p50_ms'] is not None:
+        print(f"   flow latency p50 {flow['p50_ms']:.0f} ms, p95 {flow['p95_ms']:.0f} ms, p99 {flow['p99_ms']:.0f} ms "
+              f"(patient page p50 {level['latency']['patient_page']['p50_ms']:.0f} ms)")
+        print(f"   {'stage':<10}{'mean':>10}{'p95':>10}{'share':>8}")
+        for stage, values in level['stages'].items():
+            print(f"   {stage:<10}{values['mean_ms']:>8.1f}ms{values['p95_ms']:>8.1f}ms{values['share']:>8.1%}")
+    for error, count in level['errors'].items():
+        print(f"   ⚠️ {count} x {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the Flask report pipeline against a stub summary API")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrent users per level")
+    parser.add_argument("--requests", type=int, default=200, help="Reports submitted per level")
+    parser.add_argument("--warmup", type=int, default=5, help="Reports submitted (and discarded) before measuring")
+    parser.add_argument("--stub-latency-ms", type=float, default=300.0, help="Mean summary API latency")
+    parser.add_argument("--stub-jitter-ms", type=float, default=50.0, help="Std of the summary API latency")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0, help="Share of summary calls answered with 503")
+    parser.add_argument("--stub-port", type=int, default=0, help="Stub port (0 = any free port)")
+    parser.add_argument("--server", choices=["flask", "gunicorn"], default="flask", help="Server to start the app with")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=1, help="gunicorn threads per worker")
+    parser.add_argument("--port", type=int, default=5057, help="Port for the started app server")
+    parser.add_argument("--url", help="Test an already running app (started with HF_API_URL pointing at the stub)")
+    parser.add_argument("--slots", type=int, help="Concurrent requests the --url server can run (workers x threads)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write all results as JSON")
+    args = parser.parse_args()
+
+    stub = SummaryStub(args.stub_latency_ms, args.stub_jitter_ms, args.stub_error_rate, port=args.stub_port, seed=args.seed)
+    stub.start()
+    print(f"✅ Summary stub at {stub.url} ({args.stub_latency_ms:g} ± {args.stub_jitter_ms:g} ms, "
+          f"{args.stub_error_rate:.0%} errors)")
+
+    process = None
+    scratch = tempfile.mkdtemp(prefix='report-load-test-')
+    if args.url:
+        base_url, processes, slots = args.url.rstrip('/'), 1, args.slots
+    else:
+        env = {'HF_API_URL': stub.url, 'DATABASE_URL': f"sqlite:///{os.path.join(scratch, 'load_test.db')}"}
+        process, base_url = start_app_server(args.server, args.port, args.workers, args.threads, env,
+                                             os.path.join(scratch, 'server.log'))
+        # The Flask dev server starts a thread per request, so only the CPU ceiling applies
+        processes, slots = (args.workers, args.workers * args.threads) if args.server == 'gunicorn' else (1, None)
+        print(f"✅ {args.server} serving the app at {base_url} (scratch database and log in {scratch})")
+
+    results = {'config': vars(args), 'levels': []}
+    try:
+        if args.warmup:
+            run_level(base_url, 1, args.warmup, args.seed)
+        for concurrency in [int(c) for c in args.concurrency.split(',')]:
+            level = run_level(base_url, concurrency, args.requests, args.seed + concurrency)
+            print_level(level)
+            results['levels'].append(level)
+        # Stage times stretch under contention, so size from the least loaded level
+        measured = [level for level in results['levels'] if level['succeeded']]
+        if measured:
+            results['capacity'] = capacity(min(measured, key=lambda l: l['concurrency']), processes, slots)
+            print_capacity(results['capacity'])
+        results['stub'] = dict(stub.stats)
+        print(f"\nStub served {stub.stats['requests']} summary calls ({stub.stats['errors']} errors), "
+              f"at most {stub.stats['max_in_flight']} at once")
+    finally:
+        stub.stop()
+        if process is not None:
+            process.terminate()
+            process.wait(10)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.output}")
@@ -0,0 +1,231 @@
+"""
+Offline Bulk Scoring
+Scores cohort exports in the X_train_2025.csv schema with the ICUPredictor ensemble, out of core and in parallel
+
+Usage:
+    python bulk_score.py cohort.csv scores.csv --workers 8
+    python bulk_score.py cohort.csv scores.csv --resume
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.threads import detect_cpu_limit
+
+# Dataset columns read from the cohort file, with compact dtypes
+COHORT_DTYPES = {
+    'RecordID': 'int64',
+    'Age': 'float32',
+    'Gender': 'float32',
+    'HR_first': 'float32',
+    'SysABP_first': 'float32',
+    'DiasABP_first': 'float32',
+    'SaO2_first': 'float32',
+    'Temp_first': 'float32',
+    'RespRate_first': 'float32',
+    'GCS_first': 'float32',
+    'Lactate_first': 'float32',
+    'SAPS-I': 'float32'
+}
+
+# Dataset column -> /predict field name
+COHORT_TO_VITALS = {
+    'Age': 'age',
+    'HR_first': 'heart_rate',
+    'SysABP_first': 'systolic_blood_pressure',
+    'DiasABP_first': 'diastolic_blood_pressure',
+    'SaO2_first': 'oxygen_saturation',
+    'Temp_first': 'temperature',
+    'RespRate_first': 'respiratory_rate',
+    'GCS_first': 'gcs_score',
+    'Lactate_first': 'lactate_level'
+}
+
+# Checkpoint fields that must match for --resume to continue a run
+RESUME_KEYS = ['input', 'input_size', 'input_mtime_ns', 'model_version', 'model_sha256']
+
+OUTPUT_COLUMNS = [
+    'RecordID', 'risk_score', 'risk_level', 'needs_icu', 'confidence',
+    'xgboost_score', 'lstm_score', 'lstm_skipped'
+]
+
+# Loaded once per worker process by _init_worker
+_predictor = None
+
+
+def _init_worker(threads: int = 1):
+    global _predictor
+    from utils.threads import ThreadBudget
+    from models.predictor import ICUPredictor
+    # Workers split the CPUs between them instead of each sizing pools to the whole host
+    budget = ThreadBudget(cpu_limit=threads, intra_op_threads=threads)
+    budget.apply()
+    _predictor = ICUPredictor()
+    budget.configure_predictor(_predictor)
+
+
+def cohort_to_vitals(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Map a cohort chunk onto the field names ICUPredictor.predict_batch expects"""
+    patients = chunk.rename(columns=COHORT_TO_VITALS)
+    if 'Gender' in chunk:
+        patients['gender'] = np.where(chunk['Gender'] == 1, 'Male', 'Female')
+    return patients
+
+
+def score_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Worker task: score one chunk with the process-wide predictor"""
+    results = _predictor.predict_batch(cohort_to_vitals(chunk))
+    if 'RecordID' in chunk:
+        results.insert(0, 'RecordID', chunk['RecordID'].to_numpy())
+    return results.reindex(columns=[c for c in OUTPUT_COLUMNS if c in results])
+
+
+def read_cohort(path: str, chunk_rows: int, skip_rows: int = 0) -> Iterator[pd.DataFrame]:
+    """Read only the scored columns, chunk by chunk, skipping rows already scored"""
+    header = pd.read_csv(path, nrows=0).columns
+    dtypes = {col: dtype for col, dtype in COHORT_DTYPES.items() if col in header}
+    return pd.read_csv(
+        path,
+        usecols=list(dtypes),
+        dtype=dtypes,
+        chunksize=chunk_rows,
+        skiprows=range(1, skip_rows + 1) if skip_rows else None
+    )
+
+
+def load_progress(progress_path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(progress_path):
+        return None
+    with open(progress_path) as f:
+        return json.load(f)
+
+
+def save_progress(progress_path: str, progress: Dict[str, Any]):
+    """Atomically replace the checkpoint so an interruption never leaves it half-written"""
+    tmp_path = progress_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(progress, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, progress_path)
+
+
+def _worker_model() -> Tuple[str, List[str]]:
+    return _predictor.model_version, _predictor.artifact_files
+
+
+def model_artifact_hash(paths: List[str]) -> str:
+    """SHA-256 over the model artifact files, so a retrained model under the same version is caught"""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def input_fingerprint(path: str) -> Dict[str, Any]:
+    """Size and mtime of the input file, to catch a cohort export rewritten in place"""
+    stat = os.stat(path)
+    return {'input_size': stat.st_size, 'input_mtime_ns': stat.st_mtime_ns}
+
+
+def bulk_score(input_path: str, output_path: str, chunk_rows: int = 50000,
+               workers: Optional[int] = None, resume: bool = False) -> Dict[str, Any]:
+    """
+    Score input_path into output_path (CSV, input row order).
+    
+    Up to 2 chunks per worker are in flight, so memory is bounded by chunk size
+    rather than file size. After each chunk is written the output is fsynced and
+    a .progress checkpoint records rows and bytes done; --resume truncates the
+    output to the last checkpoint and continues from the next row. It refuses
+    if the input's size or mtime, or the hash of the model artifacts, changed.
+    """
+    cpus, _ = detect_cpu_limit()
+    workers = workers or max(1, int(cpus))
+    threads = max(1, int(cpus) // workers)
+    progress_path = output_path + '.progress'
+    
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(threads,)) as pool:
+        # Model the workers loaded and the input as it is now, recorded to refuse mixed resumes
+        version, artifact_files = pool.submit(_worker_model).result()
+        
+        progress = {
+            'input': os.path.abspath(input_path), **input_fingerprint(input_path),
+            'model_version': version, 'model_sha256': model_artifact_hash(artifact_files),
+            'rows_done': 0, 'output_bytes': 0
+        }
+        if resume:
+            saved = load_progress(progress_path)
+            if saved is None or not os.path.exists(output_path):
+                print(f"⚠️ No checkpoint for {output_path}, starting from the beginning")
+            elif any(saved.get(key) != progress[key] for key in RESUME_KEYS):
+                changed = ', '.join(key for key in RESUME_KEYS if saved.get(key) != progress[key])
+                raise ValueError(
+                    f"Checkpoint was written for {saved['input']} with model {saved.get('model_version')}; "
+                    f"refusing to resume with {progress['input']} and model {version} ({changed} changed)"
+                )
+            else:
+                progress = saved
+                print(f"✅ Resuming after {progress['rows_done']:,} rows")
+        
+        started = time.perf_counter()
+        rows_at_start = progress['rows_done']
+        chunks = read_cohort(input_path, chunk_rows, skip_rows=progress['rows_done'])
+        
+        mode = 'r+b' if progress['output_bytes'] else 'wb'
+        with open(output_path, mode) as out:
+            _score_into(out, chunks, pool, 2 * workers, progress, progress_path)
+    
+    elapsed = time.perf_counter() - started
+    scored = progress['rows_done'] - rows_at_start
+    print(f"✅ Scored {scored:,} rows in {elapsed:.1f}s ({scored / max(elapsed, 1e-9):,.0f} rows/s) -> {output_path}")
+    return progress
+
+
+def _score_into(out, chunks: Iterator[pd.DataFrame], pool: ProcessPoolExecutor, window: int,
+                progress: Dict[str, Any], progress_path: str):
+    """Keep up to `window` chunks in flight and write results in input order"""
+    # Drop anything written after the last checkpoint
+    out.truncate(progress['output_bytes'])
+    out.seek(progress['output_bytes'])
+    
+    pending = deque()
+    for chunk in chunks:
+        pending.append((len(chunk), pool.submit(score_chunk, chunk)))
+        while len(pending) >= window:
+            _write_chunk(out, pending.popleft(), progress, progress_path)
+    while pending:
+        _write_chunk(out, pending.popleft(), progress, progress_path)
+
+
+def _write_chunk(out, task, progress: Dict[str, Any], progress_path: str):
+    n_rows, future = task
+    results = future.result()
+    out.write(results.to_csv(index=False, header=progress['output_bytes'] == 0).encode())
+    out.flush()
+    os.fsync(out.fileno())
+    
+    progress['rows_done'] += n_rows
+    progress['output_bytes'] = out.tell()
+    save_progress(progress_path, progress)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline ICU risk scoring for cohort CSV files")
+    parser.add_argument("input", help="Cohort CSV in the X_train_2025.csv schema")
+    parser.add_argument("output", help="Output CSV of per-record scores")
+    parser.add_argument("--chunk-rows", type=int, default=50000, help="Rows per scoring task")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU quota)")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run from its checkpoint")
+    args = parser.parse_args()
+    
+    bulk_score(args.input, args.output, chunk_rows=args.chunk_rows, workers=args.workers, resume=args.resume)
@@ -15,6 +15,11 @@ class Settings(BaseSettings):
     PORT: int = 8000
     DEBUG: bool = False
     
+    # Model bundle (preferred over the separate pickles below when present)
+    MODEL_BUNDLE_PATH: str = os.path.join(os.path.dirname(__file__), "..", "models", "icu_model.bundle")
+    LEGACY_MODEL_BUNDLE_PATH: str = os.path.join(os.path.dirname(__file__), "..", "..", "icu_model.bundle")
+    VERIFY_MODEL_BUNDLE: bool = True
+    
     # Model paths
     MODEL_PATH: str = os.path.join(os.path.dirname(__file__), "..", "models", "emergency_predictor_stacked.pkl")
     SCALER_PATH: str = os.path.join(os.path.dirname(__file__), "..", "models", "scaler.pkl")
@@ -26,6 +31,104 @@ class Settings(BaseSettings):
     LEGACY_SCALER_PATH: str = os.path.join(os.path.dirname(__file__), "..", "..", "scaler.pkl")
     LEGACY_FEATURE_LIST_PATH: str = os.path.join(os.path.dirname(__file__), "..", "..", "feature_list.pkl")
     
+    # Model registry: extra versions served alongside the default model, selected per request with
+    # X-Model-Version / ?model_version= or via X-Site-Id and MODEL_SITES. MODEL_VERSIONS maps a name to
+    # a bundle path or {"model_path": ..., "scaler_path": ..., "feature_list_path": ...}; they load on
+    # first use and least recently used ones are evicted beyond MODEL_MEMORY_BUDGET_MB (0 = no limit).
+    DEFAULT_MODEL_VERSION: str = "1.0.0"
+    MODEL_VERSIONS: dict = {}
+    MODEL_SITES: dict = {}
+    MODEL_MEMORY_BUDGET_MB: float = 0
+    
+    # Admission control: concurrent inferences, queued requests and max queueing time.
+    # Requests beyond these limits get 503 + Retry-After (or rule-based scores if opted in).
+    INFERENCE_CONCURRENCY: int = 1
+    MAX_QUEUE_DEPTH: int = 32
+    MAX_QUEUE_WAIT_MS: int = 2000
+    MIN_RETRY_AFTER_SECONDS: int = 1
+    
+    # Dispatch queued requests by rule-based acuity; a risk score of 1.0 is queued as if it
+    # arrived PRIORITY_AGING_MS earlier, which also bounds how long stable patients can be overtaken.
+    # Must be below MAX_QUEUE_WAIT_MS, or stable patients are shed before the bound applies.
+    PRIORITY_SCHEDULING: bool = True
+    PRIORITY_AGING_MS: int = 500
+    
+    # CPU thread budget: the CPU quota (from the cgroup, or CPU_LIMIT when set) is shared by WORKERS
+    # server processes; in each, INFERENCE_CONCURRENCY requests run at once and each request gets an
+    # equal share of threads for XGBoost, TensorFlow and BLAS/OpenMP (or INTRA_OP_THREADS when set)
+    THREAD_BUDGET_ENABLED: bool = True
+    CPU_LIMIT: float = 0
+    WORKERS: int = 1
+    INTRA_OP_THREADS: int = 0
+    
+    # Process-pool inference: INFERENCE_POOL_WORKERS processes (0 = off) each load the default model and
+    # score /predict and /predict/file batches exchanged through shared memory, INFERENCE_POOL_SLOTS slots
+    # of up to INFERENCE_POOL_MAX_BATCH rows per worker. Raise INFERENCE_CONCURRENCY to keep them busy.
+    # Batches the pool hasn't answered within INFERENCE_POOL_TIMEOUT_MS are scored in the serving process.
+    INFERENCE_POOL_WORKERS: int = 0
+    INFERENCE_POOL_SLOTS: int = 4
+    INFERENCE_POOL_MAX_BATCH: int = 5000
+    INFERENCE_POOL_TIMEOUT_MS: int = 10000
+    
+    # Bulk file scoring (/predict/file): rows per scoring chunk, and upload bytes kept
+    # in memory before the spooled upload moves to a temp file
+    BULK_CHUNK_ROWS: int = 5000
+    BULK_SPOOL_MAX_MB: int = 16
+    
+    # Cached per-feature explanations (rows, keyed by model version and input)
+    EXPLANATION_CACHE_SIZE: int = 4096
+    
+    # Input drift monitor: a feature is flagged once it has DRIFT_MIN_SAMPLES observed values and
+    # its mean moves more than DRIFT_MEAN_SHIFT_THRESHOLD training stds or its std changes by more
+    # than a factor of DRIFT_STD_RATIO_THRESHOLD
+    DRIFT_MONITOR_ENABLED: bool = True
+    DRIFT_HISTOGRAM_BINS: int = 20
+    DRIFT_MIN_SAMPLES: int = 100
+    DRIFT_MEAN_SHIFT_THRESHOLD: float = 0.5
+    DRIFT_STD_RATIO_THRESHOLD: float = 1.5
+    
+    # Shadow evaluation of a candidate model (enabled when a bundle or model path is set).
+    # SHADOW_SAMPLE_RATE of live /predict requests are re-scored after the response is sent,
+    # in a separate process niced by SHADOW_NICE and limited to SHADOW_CPU_BUDGET of one core.
+    SHADOW_BUNDLE_PATH: str = ""
+    SHADOW_MODEL_PATH: str = ""
+    SHADOW_SCALER_PATH: str = ""
+    SHADOW_FEATURE_LIST_PATH: str = ""
+    SHADOW_SAMPLE_RATE: float = 0.1
+    SHADOW_QUEUE_SIZE: int = 256
+    SHADOW_CPU_BUDGET: float = 0.25
+    SHADOW_NICE: int = 10
+    
+    # Prediction audit log: records are buffered (AUDIT_BUFFER_SIZE) and written in batches by a
+    # background thread to gzip segments in AUDIT_LOG_DIR, rotated by size or age. When the buffer is
+    # full, AUDIT_OVERFLOW_POLICY is "block" (wait up to AUDIT_BLOCK_TIMEOUT_MS, then drop),
+    # "drop_oldest" or "drop_newest"; drops are written to the log as gap records. AUDIT_LOG_DIR is kept
+    # outside the source tree (and on a volume in docker-compose) so the trail survives container rebuilds.
+    AUDIT_LOG_ENABLED: bool = True
+    AUDIT_LOG_DIR: str = "/var/lib/ml-service/audit"
+    AUDIT_BUFFER_SIZE: int = 10000
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_INTERVAL_MS: int = 1000
+    AUDIT_SEGMENT_MAX_MB: float = 64
+    AUDIT_SEGMENT_MAX_AGE_SECONDS: int = 3600
+    AUDIT_OVERFLOW_POLICY: str = "block"
+    AUDIT_BLOCK_TIMEOUT_MS: int = 50
+    
+    # Allocation tracking (/admin/memory/*): tracemalloc heap snapshots and diffs once tracing is started
+    # (on demand, or at startup with MEMORY_TRACE_ON_STARTUP; it slows allocations while on), keeping the
+    # last MEMORY_MAX_SNAPSHOTS; and per-stage allocation counters for MEMORY_ACCOUNTING_SAMPLE_RATE of requests
+    MEMORY_TRACE_ON_STARTUP: bool = False
+    MEMORY_TRACE_FRAMES: int = 1
+    MEMORY_MAX_SNAPSHOTS: int = 4
+    MEMORY_ACCOUNTING_SAMPLE_RATE: float = 0.01
+    
+    # Admin endpoints (/admin/*); requests must send it in X-Admin-Token, and they are disabled while it is unset
+    ADMIN_TOKEN: str = ""
+    
+    # Sampling profiler
+    PROFILER_MAX_DURATION: float = 300.0
+    PROFILER_MIN_INTERVAL_MS: float = 1.0
+    
     # CORS
     CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:5000", "http://localhost:5173"]
     
@@ -36,6 +139,15 @@ class Settings(BaseSettings):
     RISK_THRESHOLD_CRITICAL: float = 0.8
     RISK_THRESHOLD_HIGH: float = 0.6
     RISK_THRESHOLD_MEDIUM: float = 0.4
+    ICU_DECISION_THRESHOLD: float = 0.5
+    
+    # Cascade inference: skip the LSTM when the XGBoost score alone fixes the
+    # risk level and ICU decision. CASCADE_MARGIN keeps a safety gap to each boundary;
+    # CASCADE_LSTM_MIN/MAX is the LSTM score range assumed when bounding the ensemble.
+    CASCADE_ENABLED: bool = False
+    CASCADE_MARGIN: float = 0.0
+    CASCADE_LSTM_MIN: float = 0.0
+    CASCADE_LSTM_MAX: float = 1.0
     
     class Config:
         env_file = ".env"
@@ -2,14 +2,30 @@
 ML Microservice for Emergency Healthcare Platform
 FastAPI-based prediction service with XGBoost + LSTM ensemble
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, Response, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
+import pandas as pd
 import uvicorn
+import anyio
+import functools
+import hmac
+import time
+import uuid
 import os
 
 from models.predictor import ICUPredictor
+from models.registry import ModelRegistry, UnknownModelVersion, ModelLoadError
+from utils.profiler import SamplingProfiler
+from utils.batch_scoring import VitalsValidator, spool_upload, iter_csv_chunks, iter_ndjson_chunks, stream_scores
+from utils.admission import AdmissionController, PriorityAdmissionController, Overloaded
+from utils.shadow import ShadowEvaluator
+from utils.threads import ThreadBudget
+from utils.audit import AuditLog, prediction_record
+from utils.inference_pool import InferencePool
+from utils.memory import HeapTracker, AllocationAccounting
 from config import settings
 
 # Initialize FastAPI app
@@ -30,8 +46,126 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize predictor
+# Thread pools sized to the CPU quota, before any model runs
+thread_budget = ThreadBudget(
+    cpu_limit=settings.CPU_LIMIT,
+    workers=settings.WORKERS,
+    concurrency=settings.INFERENCE_CONCURRENCY,
+    intra_op_threads=settings.INTRA_OP_THREADS
+)
+if settings.THREAD_BUDGET_ENABLED:
+    thread_budget.apply()
+    print(f"✅ Thread budget: {thread_budget.intra_op_threads} intra-op thread(s) x "
+          f"{thread_budget.concurrency} concurrent request(s) on {thread_budget.cpus:g} CPU(s) / {thread_budget.workers} worker(s)")
+
+# Allocation tracking: heap snapshots on demand (tracing from startup covers model loading),
+# per-stage counters on a sample of requests
+heap_tracker = HeapTracker(max_snapshots=settings.MEMORY_MAX_SNAPSHOTS)
+if settings.MEMORY_TRACE_ON_STARTUP:
+    heap_tracker.start(settings.MEMORY_TRACE_FRAMES)
+allocation_accounting = AllocationAccounting(sample_rate=settings.MEMORY_ACCOUNTING_SAMPLE_RATE)
+
+
+def configure_version(model: ICUPredictor):
+    """Per-model runtime settings, for the default predictor and registry versions as they load"""
+    if settings.THREAD_BUDGET_ENABLED:
+        thread_budget.configure_predictor(model)
+    model.allocation_accounting = allocation_accounting
+
+
+# Initialize predictor (the default version) and the registry of alternative versions
 predictor = ICUPredictor()
+configure_version(predictor)
+registry = ModelRegistry(
+    predictor,
+    settings.DEFAULT_MODEL_VERSION,
+    versions=settings.MODEL_VERSIONS,
+    sites=settings.MODEL_SITES,
+    memory_budget_mb=settings.MODEL_MEMORY_BUDGET_MB,
+    on_load=configure_version
+)
+
+# Bounded queue in front of model inference, ordered by acuity when backlogged
+admission_options = dict(
+    max_concurrency=settings.INFERENCE_CONCURRENCY,
+    max_queue_depth=settings.MAX_QUEUE_DEPTH,
+    max_queue_wait=settings.MAX_QUEUE_WAIT_MS / 1000.0,
+    min_retry_after=settings.MIN_RETRY_AFTER_SECONDS
+)
+if settings.PRIORITY_SCHEDULING:
+    admission = PriorityAdmissionController(aging=settings.PRIORITY_AGING_MS / 1000.0, **admission_options)
+else:
+    admission = AdmissionController(**admission_options)
+
+# Candidate model scored on a sample of live traffic, off the request path (started on startup)
+shadow = None
+if settings.SHADOW_BUNDLE_PATH or settings.SHADOW_MODEL_PATH:
+    shadow = ShadowEvaluator(
+        candidate_paths={
+            "bundle_path": settings.SHADOW_BUNDLE_PATH or None,
+            "model_path": settings.SHADOW_MODEL_PATH or None,
+            "scaler_path": settings.SHADOW_SCALER_PATH or None,
+            "feature_list_path": settings.SHADOW_FEATURE_LIST_PATH or None
+        },
+        sample_rate=settings.SHADOW_SAMPLE_RATE,
+        max_queue=settings.SHADOW_QUEUE_SIZE,
+        cpu_budget=settings.SHADOW_CPU_BUDGET,
+        nice=settings.SHADOW_NICE
+    )
+
+# Append-only prediction audit trail, written by a background thread (started on startup)
+audit = None
+if settings.AUDIT_LOG_ENABLED:
+    audit = AuditLog(
+        settings.AUDIT_LOG_DIR,
+        buffer_size=settings.AUDIT_BUFFER_SIZE,
+        batch_size=settings.AUDIT_BATCH_SIZE,
+        flush_interval=settings.AUDIT_FLUSH_INTERVAL_MS / 1000.0,
+        segment_max_mb=settings.AUDIT_SEGMENT_MAX_MB,
+        segment_max_age=settings.AUDIT_SEGMENT_MAX_AGE_SECONDS,
+        overflow=settings.AUDIT_OVERFLOW_POLICY,
+        block_timeout=settings.AUDIT_BLOCK_TIMEOUT_MS / 1000.0
+    )
+
+# Worker processes scoring the default model over shared memory (started on startup)
+inference_pool = None
+if settings.INFERENCE_POOL_WORKERS > 0:
+    inference_pool = InferencePool(
+        predictor,
+        workers=settings.INFERENCE_POOL_WORKERS,
+        slots=settings.INFERENCE_POOL_SLOTS,
+        max_batch=settings.INFERENCE_POOL_MAX_BATCH,
+        cpus=thread_budget.cpus_per_worker,
+        timeout=settings.INFERENCE_POOL_TIMEOUT_MS / 1000.0
+    )
+
+# On-demand sampling profiler (idle until started via /admin/profiler/start)
+profiler = SamplingProfiler()
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Guard admin endpoints with ADMIN_TOKEN; they are disabled while it is unset"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled (set ADMIN_TOKEN)")
+    if not hmac.compare_digest((x_admin_token or "").encode(), settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+def select_model(
+    model_version: Optional[str] = None,
+    x_model_version: Optional[str] = Header(None),
+    x_site_id: Optional[str] = Header(None)
+) -> ICUPredictor:
+    """
+    Model version for this request: ?model_version= or X-Model-Version, else the
+    version mapped to X-Site-Id, else the default. Sync so first-use loads run in the threadpool.
+    """
+    try:
+        return registry.get(model_version or x_model_version, site=x_site_id)
+    except UnknownModelVersion as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except ModelLoadError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
 
 # Request/Response Models
@@ -47,7 +181,7 @@ class PatientVitals(BaseModel):
     respiratory_rate: int = Field(..., ge=0, le=100, description="Respiratory rate per minute")
     gcs_score: Optional[int] = Field(14, ge=3, le=15, description="Glasgow Coma Scale score")
     lactate_level: Optional[float] = Field(2.0, ge=0, description="Blood lactate level")
-
+    
     model_config = {
         "json_schema_extra": {
             "example": {
@@ -66,6 +200,10 @@ class PatientVitals(BaseModel):
     }
 
 
+# Column-wise validation for bulk uploads, using the same constraints as PatientVitals
+vitals_validator = VitalsValidator.from_model(PatientVitals)
+
+
 class PredictionResponse(BaseModel):
     """Output schema for ICU prediction"""
     needs_icu: bool
@@ -76,6 +214,35 @@ class PredictionResponse(BaseModel):
     summary: Optional[str] = None
     xgboost_score: Optional[float] = None
     lstm_score: Optional[float] = None
+    lstm_skipped: bool = False
+    score_bounds: Optional[List[float]] = None
+    degraded: bool = False
+    risk_factors: Optional[List[str]] = None
+
+
+class ProfilerStartRequest(BaseModel):
+    """Profiling session options; the session ends at whichever limit is hit first"""
+    duration_seconds: Optional[float] = Field(30.0, gt=0, description="Stop after this many seconds")
+    max_requests: Optional[int] = Field(None, gt=0, description="Stop after this many /predict requests")
+    interval_ms: float = Field(5.0, gt=0, description="Sampling interval in milliseconds")
+    include_idle: bool = Field(False, description="Keep samples of threads parked in select/wait")
+
+
+class FeatureContribution(BaseModel):
+    """One feature's share of the tabular model score"""
+    feature: str
+    value: float
+    contribution: float
+    probability_contribution: float
+
+
+class ExplanationResponse(BaseModel):
+    """Per-feature contributions; base_value + sum(contribution) is the tabular score in log-odds"""
+    xgboost_score: float
+    base_value: float
+    base_probability: float
+    model_version: str
+    contributions: List[FeatureContribution]
 
 
 class HealthResponse(BaseModel):
@@ -95,6 +262,8 @@ async def root():
         "status": "running",
         "endpoints": {
             "predict": "/predict",
+            "predict_file": "/predict/file",
+            "explain": "/explain",
             "health": "/health",
             "docs": "/docs"
         }
@@ -111,14 +280,58 @@ async def health_check():
     )
 
 
+def pooled(model: ICUPredictor) -> bool:
+    """True when requests for this model are scored by the inference pool"""
+    return inference_pool is not None and model is predictor and inference_pool.running
+
+
+def timed_predict(model: ICUPredictor, patient_data: dict) -> tuple:
+    """model.predict (in the inference pool when enabled) plus its compute time, for shadow latency comparisons"""
+    started = time.perf_counter()
+    with allocation_accounting.request():
+        result = inference_pool.predict(patient_data) if pooled(model) else model.predict(patient_data)
+    return result, time.perf_counter() - started
+
+
+def accounted(score_batch):
+    """Scorer wrapper that samples each bulk chunk for allocation accounting like a request"""
+    def score(patients: pd.DataFrame) -> pd.DataFrame:
+        with allocation_accounting.request():
+            return score_batch(patients)
+    return score
+
+
+def admitted(score_batch):
+    """Scorer wrapper that queues each bulk chunk for an inference slot, at the lowest priority"""
+    def score(patients: pd.DataFrame) -> pd.DataFrame:
+        # stream_scores runs in Starlette's threadpool; admission lives on the event loop
+        return anyio.from_thread.run(functools.partial(admission.run, score_batch, patients, priority=0.0))
+    return score
+
+
 @app.post("/predict", response_model=PredictionResponse, tags=["Prediction"])
-async def predict_icu(patient: PatientVitals):
+async def predict_icu(
+    patient: PatientVitals,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    allow_degraded: bool = False,
+    x_allow_degraded: Optional[str] = Header(None),
+    model: ICUPredictor = Depends(select_model)
+):
     """
     Predict ICU requirement based on patient vital signs.
     
     Uses an ensemble of XGBoost (tabular features) and LSTM (time-series patterns)
     to provide accurate ICU risk assessment.
+    
+    Under overload the request fails fast with 503 and Retry-After, unless the
+    caller opts in (allow_degraded=true or X-Allow-Degraded: true) to a
+    rule-based score marked degraded=true.
+    
+    The model version is chosen with ?model_version=, X-Model-Version or X-Site-Id.
+    Every prediction is audit-logged; X-Audit-Id identifies its record.
     """
+    started = time.perf_counter()
     try:
         # Prepare patient data
         patient_data = {
@@ -130,12 +343,40 @@ async def predict_icu(patient: PatientVitals):
             "oxygen_saturation": patient.oxygen_saturation,
             "temperature": patient.temperature,
             "respiratory_rate": patient.respiratory_rate,
-            "gcs_score": patient.gcs_score or 14,
-            "lactate_level": patient.lactate_level or 2.0
+            # Left as None when not supplied; the predictor fills defaults and tracks the fill rate
+            "gcs_score": patient.gcs_score if "gcs_score" in patient.model_fields_set else None,
+            "lactate_level": patient.lactate_level if "lactate_level" in patient.model_fields_set else None
         }
         
         # Get prediction
-        result = predictor.predict(patient_data)
+        latency = None
+        try:
+            result, latency = await admission.run(
+                timed_predict, model, patient_data,
+                priority=model.triage_priority(patient_data)
+            )
+            if shadow is not None and model is predictor:
+                # Runs after the response is sent
+                background_tasks.add_task(shadow.submit, patient_data, result, latency)
+        except Overloaded as e:
+            if not (allow_degraded or str(x_allow_degraded).lower() == "true"):
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"Service overloaded: {e.reason}",
+                    headers={"Retry-After": str(e.retry_after)}
+                )
+            result = model.predict_degraded(patient_data)
+        profiler.record_request()
+        
+        if audit is not None:
+            audit_id = uuid.uuid4().hex
+            response.headers["X-Audit-Id"] = audit_id
+            timings = {"total": time.perf_counter() - started}
+            if latency is not None:
+                timings["model"] = latency
+            record = prediction_record("/predict", patient_data, result, timings, audit_id=audit_id)
+            # Runs after the response is sent; may wait briefly for buffer space
+            background_tasks.add_task(audit.log, record)
         
         return PredictionResponse(
             needs_icu=result["needs_icu"],
@@ -145,9 +386,15 @@ async def predict_icu(patient: PatientVitals):
             model_version=result["model_version"],
             summary=result.get("summary"),
             xgboost_score=result.get("xgboost_score"),
-            lstm_score=result.get("lstm_score")
+            lstm_score=result.get("lstm_score"),
+            lstm_skipped=result.get("lstm_skipped", False),
+            score_bounds=result.get("score_bounds"),
+            degraded=result.get("degraded", False),
+            risk_factors=result.get("risk_factors")
         )
-        
+    
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Prediction error: {str(e)}")
         raise HTTPException(
@@ -156,10 +403,308 @@ async def predict_icu(patient: PatientVitals):
         )
 
 
+@app.post("/predict/file", tags=["Prediction"])
+async def predict_file(request: Request, format: Optional[str] = None, output: str = "ndjson",
+                       model: ICUPredictor = Depends(select_model)):
+    """
+    Score a CSV or NDJSON file of patient vitals sent as the request body.
+    
+    Columns (or JSON keys) use the /predict field names. The upload is parsed in
+    chunks of BULK_CHUNK_ROWS, validated column-wise and scored in batches; one
+    result per input row streams back as NDJSON or CSV (output=csv). Invalid rows
+    carry an error message instead of failing the upload.
+    
+    format defaults from Content-Type (application/x-ndjson or text/csv).
+    Chunks are scored through admission control like /predict requests: the
+    upload is refused with 503 when the queue is already full, and the stream
+    ends with an error record if a later chunk is shed.
+    """
+    content_type = request.headers.get("content-type", "")
+    format = format or ("ndjson" if "json" in content_type else "csv")
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ndjson'")
+    if output not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="output must be 'csv' or 'ndjson'")
+    
+    if admission.queue_depth >= admission.max_queue_depth:
+        raise HTTPException(
+            status_code=503,
+            detail="Service overloaded: Prediction queue is full",
+            headers={"Retry-After": str(admission.retry_after())}
+        )
+    
+    upload = await spool_upload(request.stream(), settings.BULK_SPOOL_MAX_MB * 1024 * 1024)
+    read_chunks = iter_ndjson_chunks if format == "ndjson" else iter_csv_chunks
+    upload_id = uuid.uuid4().hex
+    results = stream_scores(
+        read_chunks(upload, settings.BULK_CHUNK_ROWS),
+        vitals_validator,
+        admitted(accounted(inference_pool.predict_batch if pooled(model) else model.predict_batch)),
+        output=output,
+        upload=upload,
+        on_scored=audit_batch(upload_id, model.model_version) if audit is not None else None
+    )
+    
+    media_type = "text/csv" if output == "csv" else "application/x-ndjson"
+    return StreamingResponse(results, media_type=media_type, headers={"X-Audit-Id": upload_id})
+
+
+def audit_batch(upload_id: str, model_version: str):
+    """on_scored callback that audit-logs every scored row of an upload"""
+    def on_scored(inputs: pd.DataFrame, results: pd.DataFrame, seconds: float):
+        inputs = inputs.drop(columns="error").astype(object).where(inputs.notna(), None)
+        timings = {"batch_per_row": seconds / max(len(results), 1)}
+        audit.log_many([
+            prediction_record("/predict/file", patient, dict(result, model_version=model_version), timings,
+                              audit_id=upload_id, row=int(row))
+            for row, patient, result in zip(
+                results.index, inputs.to_dict("records"), results.to_dict("records")
+            )
+        ])
+    return on_scored
+
+
+async def _explain(model: ICUPredictor, patients: List[PatientVitals], top_k: Optional[int]) -> List[dict]:
+    frame = pd.DataFrame([patient.model_dump() for patient in patients])
+    frame["gcs_score"] = frame["gcs_score"].fillna(14)
+    frame["lactate_level"] = frame["lactate_level"].fillna(2.0)
+    try:
+        return await admission.run(model.explain_batch, frame, top_k)
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service overloaded: {e.reason}",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@app.post("/explain", response_model=ExplanationResponse, tags=["Prediction"])
+async def explain_prediction(patient: PatientVitals, top_k: Optional[int] = None,
+                             model: ICUPredictor = Depends(select_model)):
+    """
+    Explain the tabular model's score for one patient: how much each feature
+    pushed the risk up or down, largest first (top_k limits the list).
+    """
+    return (await _explain(model, [patient], top_k))[0]
+
+
+@app.post("/explain/batch", response_model=List[ExplanationResponse], tags=["Prediction"])
+async def explain_batch(patients: List[PatientVitals], top_k: Optional[int] = None,
+                        model: ICUPredictor = Depends(select_model)):
+    """Explanations for many patients, computed in one batched call"""
+    if not patients:
+        return []
+    return await _explain(model, patients, top_k)
+
+
 @app.get("/model/info", tags=["Model"])
-async def model_info():
-    """Get information about the loaded models"""
-    return predictor.get_model_info()
+async def model_info(model: ICUPredictor = Depends(select_model)):
+    """Get information about the loaded models (of the selected version)"""
+    return model.get_model_info()
+
+
+@app.get("/model/versions", tags=["Model"])
+async def model_versions():
+    """Registered model versions, which are loaded, their memory footprint and usage"""
+    return registry.report()
+
+
+@app.get("/model/drift", tags=["Model"])
+async def model_drift(model: ICUPredictor = Depends(select_model)):
+    """Running input statistics and drift scores against the training distribution"""
+    if model.drift_monitor is None:
+        raise HTTPException(status_code=404, detail="Drift monitoring is disabled or no model is loaded")
+    return model.drift_monitor.report()
+
+
+@app.post("/admin/drift/reset", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def reset_drift(model: ICUPredictor = Depends(select_model)):
+    """Start a fresh drift observation window"""
+    if model.drift_monitor is None:
+        raise HTTPException(status_code=404, detail="Drift monitoring is disabled or no model is loaded")
+    model.drift_monitor.reset()
+    return {"status": "reset"}
+
+
+@app.post("/admin/models/{name}/unload", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def unload_model(name: str):
+    """Evict a loaded model version now (it reloads on its next request)"""
+    if name == registry.default_name:
+        raise HTTPException(status_code=400, detail="The default model version cannot be unloaded")
+    return {"name": name, "unloaded": registry.unload(name)}
+
+
+@app.get("/admin/shadow", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def shadow_report():
+    """Candidate vs live model: score deltas, risk-band disagreements and latency"""
+    if shadow is None:
+        raise HTTPException(status_code=404, detail="No shadow model configured (set SHADOW_BUNDLE_PATH or SHADOW_MODEL_PATH)")
+    return shadow.report()
+
+
+@app.get("/admin/threads", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def thread_report():
+    """CPU quota, the inter-request / intra-op thread split and the native thread pools in use"""
+    return {"enabled": settings.THREAD_BUDGET_ENABLED, **thread_budget.report()}
+
+
+@app.get("/admin/audit", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def audit_status():
+    """Audit log buffer occupancy, write and drop counters and the current segment"""
+    if audit is None:
+        raise HTTPException(status_code=404, detail="Audit logging is disabled")
+    return audit.report()
+
+
+@app.get("/admin/pool", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def pool_status():
+    """Inference pool workers, slot occupancy, batch counters and round-trip latency"""
+    if inference_pool is None:
+        raise HTTPException(status_code=404, detail="Inference pool is disabled (set INFERENCE_POOL_WORKERS)")
+    return inference_pool.report()
+
+
+@app.get("/admin/memory", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def memory_status():
+    """Tracing state, traced vs resident memory, kept snapshots and sampled per-stage allocation counters"""
+    return {**heap_tracker.status(), "allocations": allocation_accounting.report()}
+
+
+@app.post("/admin/memory/tracing/start", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def start_tracing(frames: int = 1):
+    """Start tracemalloc (frames = traceback depth kept per allocation; more is slower)"""
+    return heap_tracker.start(max(1, min(frames, 64)))
+
+
+@app.post("/admin/memory/tracing/stop", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def stop_tracing():
+    """Stop tracemalloc; kept snapshots can still be diffed against each other"""
+    return heap_tracker.stop()
+
+
+@app.post("/admin/memory/snapshots", tags=["Admin"], dependencies=[Depends(require_admin)])
+def take_memory_snapshot(label: Optional[str] = None, group_by: str = "module", top: int = 30):
+    """Take a heap snapshot and return its largest allocation sites"""
+    try:
+        snapshot = heap_tracker.take_snapshot(label)
+        return heap_tracker.top(snapshot["id"], group_by=group_by, limit=top)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/admin/memory/snapshots/{snapshot_id}", tags=["Admin"], dependencies=[Depends(require_admin)])
+def memory_snapshot(snapshot_id: int, group_by: str = "module", top: int = 30):
+    """Largest allocation sites of a kept snapshot, grouped by module, lineno, filename or traceback"""
+    try:
+        return heap_tracker.top(snapshot_id, group_by=group_by, limit=top)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/admin/memory/diff", tags=["Admin"], dependencies=[Depends(require_admin)])
+def memory_diff(base: int, target: Optional[int] = None, group_by: str = "module", top: int = 30):
+    """
+    Allocation growth from snapshot `base` to `target` (default: the heap now, not kept as a snapshot),
+    with RSS growth and the part of it tracemalloc cannot see (native allocations).
+    """
+    try:
+        return heap_tracker.diff(base, target, group_by=group_by, limit=top)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/admin/memory/allocations/reset", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def reset_allocations():
+    """Clear the per-stage allocation counters"""
+    allocation_accounting.reset()
+    return {"status": "reset"}
+
+
+@app.get("/admin/admission", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def admission_stats():
+    """Current inference queue depth, in-flight count and shed counters"""
+    return admission.stats()
+
+
+@app.post("/admin/profiler/start", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def start_profiler(options: ProfilerStartRequest):
+    """Start sampling all threads for the next N requests or T seconds"""
+    duration = min(options.duration_seconds or settings.PROFILER_MAX_DURATION, settings.PROFILER_MAX_DURATION)
+    interval = max(options.interval_ms, settings.PROFILER_MIN_INTERVAL_MS) / 1000.0
+    try:
+        return profiler.start(
+            duration=duration,
+            max_requests=options.max_requests,
+            interval=interval,
+            include_idle=options.include_idle
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.post("/admin/profiler/stop", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def stop_profiler():
+    """Stop the current profiling session"""
+    return profiler.stop()
+
+
+@app.get("/admin/profiler/report", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def profiler_report(format: str = "json", top: int = 50):
+    """
+    Profiling results. format=collapsed returns flamegraph-ready collapsed stacks
+    (flamegraph.pl, speedscope); format=json returns the hottest stacks and frames.
+    """
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed())
+    if format != "json":
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'collapsed'")
+    return profiler.report(top=top)
+
+
+@app.on_event("startup")
+async def startup():
+    if audit is not None:
+        try:
+            audit.start()
+        except OSError as e:
+            raise RuntimeError(
+                f"Audit log directory {settings.AUDIT_LOG_DIR} is not writable ({e}); "
+                "set AUDIT_LOG_DIR, or AUDIT_LOG_ENABLED=false to run without an audit trail"
+            ) from e
+    if inference_pool is not None:
+        try:
+            inference_pool.start()
+        except Exception as e:
+            # Requests are scored in this process until workers are ready, or if they never are
+            print(f"⚠️ Inference pool disabled: {e}")
+    if shadow is not None:
+        try:
+            shadow.start()
+        except Exception as e:
+            # The live service does not depend on the candidate
+            print(f"⚠️ Shadow evaluation disabled: {e}")
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    admission.shutdown()
+    if inference_pool is not None:
+        inference_pool.shutdown()
+    if shadow is not None:
+        shadow.shutdown()
+    if audit is not None:
+        # Writes out everything still buffered and fsyncs the last segment
+        audit.close()
 
 
 # Run server
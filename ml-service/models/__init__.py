@@ -3,5 +3,13 @@ Models package initialization
 """
 from .predictor import ICUPredictor
 from .lstm_model import LSTMPredictor
+from .bundle import ModelBundle, write_model_bundle
+from .rules import RuleEngine, ICU_FALLBACK_RULES, LSTM_FALLBACK_RULES
+from .explainer import StackedExplainer
+from .registry import ModelRegistry, UnknownModelVersion, ModelLoadError
 
-__all__ = ["ICUPredictor", "LSTMPredictor"]
+__all__ = [
+    "ICUPredictor", "LSTMPredictor", "ModelBundle", "write_model_bundle",
+    "RuleEngine", "ICU_FALLBACK_RULES", "LSTM_FALLBACK_RULES", "StackedExplainer",
+    "ModelRegistry", "UnknownModelVersion", "ModelLoadError"
+]
@@ -0,0 +1,406 @@
+"""
+Versioned single-file model bundle
+Feature order, scaler statistics, stacked tree/linear model parameters and
+LSTM weights stored as aligned, memory-mappable arrays plus a JSON manifest
+
+File layout:
+    MAGIC (8 bytes) | manifest length (uint64, little-endian) | manifest JSON
+    | arrays, each starting on a 64-byte boundary
+
+Arrays are opened read-only with np.memmap, so loading never unpickles
+objects and worker processes share the same pages through the OS page cache.
+This module only depends on NumPy so training scripts can import it directly
+(XGBoost is imported lazily, only to rebuild native boosters for explanations).
+"""
+import hashlib
+import json
+import os
+import struct
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+BUNDLE_MAGIC = b"ICUBNDL\x00"
+BUNDLE_FORMAT_VERSION = 1
+ARRAY_ALIGNMENT = 64
+
+_HEADER = struct.Struct("<8sQ")
+
+
+class BundleFormatError(ValueError):
+    """Raised when a bundle is malformed, from an unknown version or fails its checksums"""
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _align(offset: int) -> int:
+    return (offset + ARRAY_ALIGNMENT - 1) // ARRAY_ALIGNMENT * ARRAY_ALIGNMENT
+
+
+# ---------------------------------------------------------------------------
+# Writing
+# ---------------------------------------------------------------------------
+
+def _export_xgboost(estimator, prefix: str, arrays: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Flatten an XGBoost binary classifier into concatenated node arrays"""
+    model = json.loads(estimator.get_booster().save_raw(raw_format="json"))
+    learner = model["learner"]
+    objective = learner["objective"]["name"]
+    if objective != "binary:logistic":
+        raise BundleFormatError(f"Unsupported XGBoost objective: {objective}")
+    booster = learner["gradient_booster"]
+    if booster.get("name", "gbtree") != "gbtree":
+        raise BundleFormatError(f"Unsupported XGBoost booster: {booster.get('name')}")
+    
+    # base_score is serialized as "5E-1" or "[5E-1]" depending on the XGBoost version
+    base_score = float(str(learner["learner_model_param"]["base_score"]).strip("[]"))
+    
+    left, right, feature, threshold, default_left, value, roots = [], [], [], [], [], [], []
+    offset = 0
+    for tree in booster["model"]["trees"]:
+        if any(tree.get("split_type", [])):
+            raise BundleFormatError("Categorical splits are not supported in model bundles")
+        tree_left = np.asarray(tree["left_children"], dtype=np.int32)
+        tree_right = np.asarray(tree["right_children"], dtype=np.int32)
+        is_leaf = tree_left < 0
+        left.append(np.where(is_leaf, -1, tree_left + offset))
+        right.append(np.where(is_leaf, -1, tree_right + offset))
+        feature.append(np.asarray(tree["split_indices"], dtype=np.int32))
+        # split_conditions holds the leaf value on leaf nodes
+        threshold.append(np.asarray(tree["split_conditions"], dtype=np.float32))
+        default_left.append(np.asarray(tree["default_left"], dtype=np.uint8))
+        value.append(np.where(is_leaf, np.asarray(tree["split_conditions"], dtype=np.float32), 0))
+        roots.append(offset)
+        offset += len(tree_left)
+    
+    names = {}
+    for key, parts, dtype in [
+        ("left", left, np.int32), ("right", right, np.int32), ("feature", feature, np.int32),
+        ("threshold", threshold, np.float32), ("default_left", default_left, np.uint8),
+        ("value", value, np.float32),
+    ]:
+        names[key] = f"{prefix}/{key}"
+        arrays[names[key]] = np.concatenate(parts).astype(dtype)
+    names["roots"] = f"{prefix}/roots"
+    arrays[names["roots"]] = np.asarray(roots, dtype=np.int32)
+    
+    # The native model is kept alongside for XGBoost's tree-path contributions (explanations)
+    names["raw_model"] = f"{prefix}/raw_model"
+    arrays[names["raw_model"]] = np.frombuffer(bytes(estimator.get_booster().save_raw(raw_format="ubj")), dtype=np.uint8)
+    
+    return {
+        "type": "xgboost_trees",
+        "arrays": names,
+        "base_margin": float(np.log(base_score / (1.0 - base_score))),
+    }
+
+
+def _export_linear(estimator, prefix: str, arrays: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Export a binary logistic regression as coefficient/intercept arrays"""
+    names = {"coef": f"{prefix}/coef", "intercept": f"{prefix}/intercept"}
+    arrays[names["coef"]] = np.asarray(estimator.coef_, dtype=np.float64).ravel()
+    arrays[names["intercept"]] = np.asarray(estimator.intercept_, dtype=np.float64).ravel()
+    return {"type": "logistic", "arrays": names}
+
+
+def _export_estimator(estimator, prefix: str, arrays: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    classes = [int(c) for c in getattr(estimator, "classes_", [0, 1])]
+    if classes != [0, 1]:
+        raise BundleFormatError(f"Only binary 0/1 classifiers can be bundled, got classes {classes}")
+    if hasattr(estimator, "get_booster"):
+        return _export_xgboost(estimator, prefix, arrays)
+    if hasattr(estimator, "coef_") and hasattr(estimator, "intercept_"):
+        return _export_linear(estimator, prefix, arrays)
+    raise BundleFormatError(f"Unsupported estimator type: {type(estimator).__name__}")
+
+
+def _export_stacking(model, arrays: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Export a fitted StackingClassifier (or a single supported estimator)"""
+    if not hasattr(model, "estimators_"):
+        return {"estimators": [], "final_estimator": _export_estimator(model, "model", arrays)}
+    
+    if getattr(model, "passthrough", False):
+        raise BundleFormatError("Stacking models with passthrough=True are not supported")
+    estimators = []
+    for (name, _), estimator, method in zip(model.estimators, model.estimators_, model.stack_method_):
+        if method != "predict_proba":
+            raise BundleFormatError(f"Unsupported stack_method '{method}' for estimator '{name}'")
+        spec = _export_estimator(estimator, f"stack/{name}", arrays)
+        spec["name"] = name
+        estimators.append(spec)
+    
+    return {
+        "estimators": estimators,
+        "final_estimator": _export_estimator(model.final_estimator_, "stack/final", arrays),
+    }
+
+
+def _export_lstm(lstm_model, arrays: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Export a Keras Sequential model as a layer spec plus weight arrays"""
+    config_keys = ("units", "activation", "recurrent_activation", "return_sequences", "rate", "name")
+    layers = []
+    for i, layer in enumerate(lstm_model.layers):
+        config = layer.get_config()
+        weights = []
+        for j, weight in enumerate(layer.get_weights()):
+            name = f"lstm/{i}/{j}"
+            arrays[name] = np.asarray(weight, dtype=np.float32)
+            weights.append(name)
+        layers.append({
+            "class_name": layer.__class__.__name__,
+            "config": {k: config[k] for k in config_keys if k in config},
+            "weights": weights,
+        })
+    return {"input_shape": [int(d) for d in lstm_model.input_shape[1:]], "layers": layers}
+
+
+def write_model_bundle(path: str, feature_list: List[str], scaler, model, lstm_model=None,
+                       model_version: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Write a bundle from fitted training artifacts.
+    
+    Args:
+        path: Output file path
+        feature_list: Column order the scaler was fitted on
+        scaler: Fitted StandardScaler
+        model: Fitted StackingClassifier (XGBoost/logistic estimators) or a single such estimator
+        lstm_model: Optional Keras Sequential LSTM model
+        model_version: Version string; defaults to one derived from the content hash
+    
+    Returns:
+        The manifest that was written
+    """
+    arrays: Dict[str, np.ndarray] = {}
+    n_features = len(feature_list)
+    
+    mean = getattr(scaler, "mean_", None)
+    var = getattr(scaler, "var_", None)
+    scale = getattr(scaler, "scale_", None)
+    arrays["scaler/mean"] = np.asarray(mean if mean is not None else np.zeros(n_features), dtype=np.float64)
+    arrays["scaler/var"] = np.asarray(var if var is not None else np.ones(n_features), dtype=np.float64)
+    arrays["scaler/scale"] = np.asarray(scale if scale is not None else np.ones(n_features), dtype=np.float64)
+    
+    model_features = [str(f) for f in getattr(model, "feature_names_in_", feature_list)]
+    manifest: Dict[str, Any] = {
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "feature_list": [str(f) for f in feature_list],
+        "model_features": model_features,
+        "model": _export_stacking(model, arrays),
+        "lstm": _export_lstm(lstm_model, arrays) if lstm_model is not None else None,
+    }
+    
+    # Lay out arrays on aligned offsets relative to the end of the manifest
+    entries = {}
+    relative = 0
+    content_hash = hashlib.sha256()
+    for name in sorted(arrays):
+        array = np.ascontiguousarray(arrays[name])
+        arrays[name] = array
+        relative = _align(relative)
+        digest = hashlib.sha256(array.tobytes()).hexdigest()
+        content_hash.update(name.encode() + digest.encode())
+        entries[name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": relative,
+            "nbytes": int(array.nbytes),
+            "sha256": digest,
+        }
+        relative += array.nbytes
+    
+    manifest["content_sha256"] = content_hash.hexdigest()
+    manifest["model_version"] = model_version or f"1.0.0+{manifest['content_sha256'][:12]}"
+    manifest["arrays"] = entries
+    
+    header = json.dumps(manifest, sort_keys=True).encode("utf-8")
+    data_start = _align(_HEADER.size + len(header))
+    
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(BUNDLE_MAGIC, len(header)))
+        f.write(header)
+        for name in sorted(arrays):
+            f.write(b"\x00" * (data_start + entries[name]["offset"] - f.tell()))
+            f.write(arrays[name].tobytes())
+    os.replace(tmp_path, path)
+    
+    return manifest
+
+
+# ---------------------------------------------------------------------------
+# Loading and inference
+# ---------------------------------------------------------------------------
+
+class BundleScaler:
+    """StandardScaler replacement backed by bundle arrays"""
+    
+    def __init__(self, mean: np.ndarray, var: np.ndarray, scale: np.ndarray, feature_names: List[str]):
+        self.mean_ = mean
+        self.var_ = var
+        self.scale_ = scale
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.n_features_in_ = len(feature_names)
+    
+    def transform(self, X) -> np.ndarray:
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+
+class _TreeEnsemble:
+    """Vectorized evaluation of flattened XGBoost trees"""
+    
+    def __init__(self, arrays: Dict[str, np.ndarray], base_margin: float):
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.default_left = arrays["default_left"].astype(bool)
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.base_margin = base_margin
+        self.raw_model = arrays.get("raw_model")
+        self.nthread = 0
+        self._booster = None
+    
+    def margin(self, X: np.ndarray) -> np.ndarray:
+        # XGBoost compares features in float32
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        while True:
+            left = self.left[nodes]
+            internal = left >= 0
+            if not internal.any():
+                break
+            x = X[rows, self.feature[nodes]]
+            go_left = np.where(np.isnan(x), self.default_left[nodes], x < self.threshold[nodes])
+            nodes = np.where(internal, np.where(go_left, left, self.right[nodes]), nodes)
+        return self.base_margin + self.value[nodes].sum(axis=1, dtype=np.float64)
+    
+    def predict_positive(self, X: np.ndarray) -> np.ndarray:
+        return _sigmoid(self.margin(X))
+    
+    def get_booster(self):
+        """Native XGBoost booster rebuilt from the embedded model (imports xgboost on first use)"""
+        if self.raw_model is None:
+            raise BundleFormatError("Bundle has no embedded XGBoost model; re-export it to enable explanations")
+        if self._booster is None:
+            import xgboost
+            self._booster = xgboost.Booster(params={"nthread": self.nthread}, model_file=bytearray(self.raw_model))
+        return self._booster
+    
+    def set_thread_count(self, threads: int):
+        self.nthread = threads
+        if self._booster is not None:
+            self._booster.set_param({"nthread": threads})
+
+
+class _LogisticModel:
+    """Binary logistic regression from bundle arrays"""
+    
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.coef = arrays["coef"]
+        self.intercept = float(arrays["intercept"][0])
+    
+    def margin(self, X: np.ndarray) -> np.ndarray:
+        return np.asarray(X, dtype=np.float64) @ self.coef + self.intercept
+    
+    def predict_positive(self, X: np.ndarray) -> np.ndarray:
+        return _sigmoid(self.margin(X))
+
+
+class BundleModel:
+    """
+    Stacked classifier rebuilt from bundle arrays.
+    Exposes the predict/predict_proba/feature_names_in_ surface the serving code uses.
+    """
+    
+    def __init__(self, spec: Dict[str, Any], arrays: Dict[str, np.ndarray], model_features: List[str]):
+        self.feature_names_in_ = np.asarray(model_features, dtype=object)
+        self.classes_ = np.array([0, 1])
+        self.estimators = [self._build(e, arrays) for e in spec["estimators"]]
+        self.final_estimator = self._build(spec["final_estimator"], arrays)
+    
+    @staticmethod
+    def _build(spec: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+        named = {key: arrays[name] for key, name in spec["arrays"].items()}
+        if spec["type"] == "xgboost_trees":
+            return _TreeEnsemble(named, spec["base_margin"])
+        if spec["type"] == "logistic":
+            return _LogisticModel(named)
+        raise BundleFormatError(f"Unknown estimator type in bundle: {spec['type']}")
+    
+    def _final_margin(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        if self.estimators:
+            X = np.column_stack([e.predict_positive(X) for e in self.estimators])
+        return self.final_estimator.margin(X)
+    
+    def predict_proba(self, X) -> np.ndarray:
+        positive = _sigmoid(self._final_margin(X))
+        return np.column_stack([1.0 - positive, positive])
+    
+    def predict(self, X) -> np.ndarray:
+        return (self._final_margin(X) > 0).astype(np.int64)
+
+
+class ModelBundle:
+    """A loaded, memory-mapped model bundle"""
+    
+    def __init__(self, path: str, manifest: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+        self.path = path
+        self.manifest = manifest
+        self.arrays = arrays
+        self.model_version: str = manifest["model_version"]
+        self.feature_list: List[str] = manifest["feature_list"]
+        self.scaler = BundleScaler(
+            arrays["scaler/mean"], arrays["scaler/var"], arrays["scaler/scale"], self.feature_list
+        )
+        self.model = BundleModel(manifest["model"], arrays, manifest["model_features"])
+        self.lstm_spec: Optional[Dict[str, Any]] = manifest.get("lstm")
+    
+    @property
+    def has_lstm(self) -> bool:
+        return self.lstm_spec is not None
+    
+    def lstm_weights(self) -> List[List[np.ndarray]]:
+        """Per-layer weight arrays, in the order Keras set_weights expects"""
+        return [[self.arrays[name] for name in layer["weights"]] for layer in self.lstm_spec["layers"]]
+    
+    @classmethod
+    def load(cls, path: str, verify: bool = True) -> "ModelBundle":
+        """
+        Open a bundle read-only.
+        
+        Args:
+            path: Bundle file path
+            verify: Check every array against its manifest SHA-256
+        """
+        with open(path, "rb") as f:
+            magic, header_len = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != BUNDLE_MAGIC:
+                raise BundleFormatError(f"{path} is not a model bundle")
+            manifest = json.loads(f.read(header_len).decode("utf-8"))
+        
+        version = manifest.get("format_version")
+        if version != BUNDLE_FORMAT_VERSION:
+            raise BundleFormatError(f"Unsupported bundle format version {version} (expected {BUNDLE_FORMAT_VERSION})")
+        
+        data_start = _align(_HEADER.size + header_len)
+        entries = manifest["arrays"]
+        arrays = {}
+        if entries:
+            mapped = np.memmap(path, dtype=np.uint8, mode="r")
+            for name, entry in entries.items():
+                start = data_start + entry["offset"]
+                raw = mapped[start:start + entry["nbytes"]]
+                if len(raw) != entry["nbytes"]:
+                    raise BundleFormatError(f"Bundle array '{name}' is truncated")
+                if verify and hashlib.sha256(raw).hexdigest() != entry["sha256"]:
+                    raise BundleFormatError(f"Checksum mismatch for bundle array '{name}'")
+                arrays[name] = raw.view(np.dtype(entry["dtype"])).reshape(entry["shape"])
+        
+        return cls(path, manifest, arrays)
@@ -0,0 +1,165 @@
+"""
+Input Drift Monitoring
+Streaming per-feature statistics of scored inputs compared against the scaler's training distribution
+"""
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from scipy.special import ndtr
+
+
+class DriftMonitor:
+    """
+    Constant-memory running statistics for every model input feature.
+    
+    Each update merges a batch into per-feature Welford mean/variance, a fixed-bin
+    histogram (bins spanning the training mean +/- 4 std, plus under/overflow) and
+    a default-fill counter. Values filled with defaults are counted but kept out of
+    the moments and histograms, so a missing lab value does not look like a shift.
+    
+    The training reference is the scaler's mean_/var_. Only moments are known, so
+    the histogram PSI is taken against a normal with those moments and is a shape
+    indicator; the mean shift (in training std units) and std ratio drive status.
+    """
+    
+    def __init__(self, feature_names: Sequence[str], train_mean: Optional[np.ndarray] = None,
+                 train_var: Optional[np.ndarray] = None, bins: int = 20, min_samples: int = 100,
+                 mean_shift_threshold: float = 0.5, std_ratio_threshold: float = 1.5):
+        self.feature_names = [str(f) for f in feature_names]
+        n_features = len(self.feature_names)
+        self.bins = bins
+        self.min_samples = min_samples
+        self.mean_shift_threshold = mean_shift_threshold
+        self.std_ratio_threshold = std_ratio_threshold
+        
+        self.train_mean = None if train_mean is None else np.asarray(train_mean, dtype=np.float64)
+        self.train_std = None if train_var is None else np.sqrt(np.asarray(train_var, dtype=np.float64))
+        if self.train_mean is not None:
+            std = np.where(self.train_std > 0, self.train_std, 1.0)
+            offsets = np.linspace(-4.0, 4.0, bins + 1)
+            self.bin_low = self.train_mean - 4.0 * std
+            self.bin_width = 8.0 * std / bins
+            # Expected share per bucket (underflow, bins, overflow) under a normal reference
+            cdf = ndtr(offsets)
+            expected = np.concatenate([[cdf[0]], np.diff(cdf), [1.0 - cdf[-1]]])
+            self.expected = np.broadcast_to(expected, (n_features, bins + 2))
+        else:
+            self.bin_low = np.zeros(n_features)
+            self.bin_width = np.ones(n_features)
+            self.expected = None
+        
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        n_features = len(self.feature_names)
+        with self._lock:
+            self.started_at = time.time()
+            self.rows = 0
+            self.count = np.zeros(n_features, dtype=np.int64)
+            self.mean = np.zeros(n_features)
+            self.m2 = np.zeros(n_features)
+            self.filled = np.zeros(n_features, dtype=np.int64)
+            self.histogram = np.zeros((n_features, self.bins + 2), dtype=np.int64)
+    
+    def update(self, values: np.ndarray, filled: Optional[np.ndarray] = None):
+        """
+        Merge a batch of raw (unscaled) feature rows.
+        
+        Args:
+            values: (n, n_features) feature values in feature_names order
+            filled: (n, n_features) mask of values that were default-filled
+                (NaN values are treated as missing as well)
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[None, :]
+        observed = ~np.isnan(values)
+        if filled is not None:
+            observed &= ~np.asarray(filled, dtype=bool).reshape(values.shape)
+        
+        # Batch moments per feature over observed values only
+        batch_count = observed.sum(axis=0)
+        masked = np.where(observed, values, 0.0)
+        batch_mean = masked.sum(axis=0) / np.maximum(batch_count, 1)
+        batch_m2 = np.where(observed, (values - batch_mean) ** 2, 0.0).sum(axis=0)
+        
+        positions = (np.where(observed, values, self.bin_low) - self.bin_low) / self.bin_width
+        buckets = np.floor(positions).astype(np.int64) + 1
+        buckets = np.clip(buckets, 0, self.bins + 1)
+        rows, cols = np.nonzero(observed)
+        
+        with self._lock:
+            # Chan et al. parallel merge of (count, mean, M2)
+            total = self.count + batch_count
+            delta = batch_mean - self.mean
+            safe_total = np.maximum(total, 1)
+            self.m2 += batch_m2 + delta ** 2 * self.count * batch_count / safe_total
+            self.mean += delta * batch_count / safe_total
+            self.count = total
+            self.filled += len(values) - batch_count
+            self.rows += len(values)
+            np.add.at(self.histogram, (cols, buckets[rows, cols]), 1)
+    
+    def report(self) -> Dict[str, Any]:
+        """Per-feature live statistics and drift scores versus the training reference"""
+        with self._lock:
+            count = self.count.copy()
+            mean = self.mean.copy()
+            var = np.where(count > 1, self.m2 / np.maximum(count - 1, 1), np.nan)
+            filled = self.filled.copy()
+            histogram = self.histogram.copy()
+            rows = self.rows
+        
+        std = np.sqrt(var)
+        features: Dict[str, Dict[str, Any]] = {}
+        drifting: List[str] = []
+        for j, name in enumerate(self.feature_names):
+            entry = {
+                "count": int(count[j]),
+                "mean": _round(mean[j]) if count[j] else None,
+                "std": _round(std[j]),
+                "default_fill_rate": round(float(filled[j]) / rows, 4) if rows else None
+            }
+            if self.train_mean is not None:
+                train_std = self.train_std[j] if self.train_std[j] > 0 else 1.0
+                entry["train_mean"] = _round(self.train_mean[j])
+                entry["train_std"] = _round(self.train_std[j])
+                entry["mean_shift"] = _round((mean[j] - self.train_mean[j]) / train_std) if count[j] else None
+                entry["std_ratio"] = _round(std[j] / train_std)
+                entry["psi_vs_normal"] = _round(_psi(histogram[j], self.expected[j])) if count[j] else None
+                entry["status"] = self._status(entry)
+                if entry["status"] == "drift":
+                    drifting.append(name)
+            features[name] = entry
+        
+        return {
+            "since": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started_at)),
+            "rows": rows,
+            "reference": "scaler" if self.train_mean is not None else None,
+            "drifting_features": drifting,
+            "features": features
+        }
+    
+    def _status(self, entry: Dict[str, Any]) -> str:
+        if entry["count"] < self.min_samples or entry["mean_shift"] is None:
+            return "insufficient_data"
+        std_ratio = entry["std_ratio"]
+        if abs(entry["mean_shift"]) > self.mean_shift_threshold or (
+            std_ratio is not None and not (1 / self.std_ratio_threshold <= std_ratio <= self.std_ratio_threshold)
+        ):
+            return "drift"
+        return "ok"
+
+
+def _psi(counts: np.ndarray, expected: np.ndarray, eps: float = 1e-4) -> float:
+    """Population stability index of observed bucket counts against expected shares"""
+    actual = np.maximum(counts / max(counts.sum(), 1), eps)
+    expected = np.maximum(expected, eps)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def _round(value: float, digits: int = 4) -> Optional[float]:
+    return None if value is None or not np.isfinite(value) else round(float(value), digits)
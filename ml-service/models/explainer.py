@@ -0,0 +1,167 @@
+"""
+Prediction Explanations
+Per-feature contributions for the stacked tabular model from XGBoost's native tree-path attributions
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _probability_share(margin: np.ndarray, bias: np.ndarray) -> np.ndarray:
+    """
+    Factor that carries margin contributions into probability space, so that
+    contributions summing to (margin - bias) sum to sigmoid(margin) - sigmoid(bias).
+    Falls back to the sigmoid slope when the margin barely moves.
+    """
+    delta = margin - bias
+    flat = np.abs(delta) < 1e-12
+    p0 = _sigmoid(bias)
+    return np.where(flat, p0 * (1.0 - p0), (_sigmoid(margin) - p0) / np.where(flat, 1.0, delta))
+
+
+class StackedExplainer:
+    """
+    Additive per-feature contributions, in log-odds, for the stacked model.
+    
+    XGBoost estimators use the booster's pred_contribs (TreeSHAP) in one native
+    call per batch; logistic estimators contribute coef * scaled value, which is
+    exact because the scaler centres every feature on its training mean. Base
+    estimator contributions are carried into probability space and weighted by
+    the meta-learner, so base_value + contributions equals the stacked log-odds.
+    The scaler is per-feature, so each contribution maps back to one raw feature.
+    """
+    
+    def __init__(self, model, model_features: Sequence[str], model_version: str = "", cache_size: int = 4096):
+        self.model_features = [str(f) for f in model_features]
+        self.model_version = model_version
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, bytes], Tuple[np.ndarray, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        # sklearn StackingClassifier exposes estimators_/final_estimator_, BundleModel estimators/final_estimator
+        if hasattr(model, "estimators_"):
+            bases, final = model.estimators_, model.final_estimator_
+        elif hasattr(model, "final_estimator"):
+            bases, final = model.estimators, model.final_estimator
+        else:
+            bases, final = [], model
+        
+        if bases:
+            self.base_estimators = [self._describe(e) for e in bases]
+            self.meta = self._linear_params(final)
+        else:
+            self.base_estimators = [self._describe(final)]
+            self.meta = None
+    
+    @staticmethod
+    def _linear_params(estimator) -> Tuple[np.ndarray, float]:
+        if hasattr(estimator, "coef_"):
+            return np.asarray(estimator.coef_, dtype=np.float64).ravel(), float(np.ravel(estimator.intercept_)[0])
+        if hasattr(estimator, "coef"):
+            return np.asarray(estimator.coef, dtype=np.float64).ravel(), float(estimator.intercept)
+        raise ValueError(f"Cannot explain estimator of type {type(estimator).__name__}")
+    
+    @classmethod
+    def _describe(cls, estimator) -> Tuple[str, Any]:
+        if hasattr(estimator, "get_booster"):
+            return "trees", estimator.get_booster()
+        return "linear", cls._linear_params(estimator)
+    
+    def _margin_contributions(self, component: Tuple[str, Any], X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(n, n_features) margin contributions and (n,) bias of one estimator"""
+        kind, params = component
+        if kind == "trees":
+            import xgboost
+            dmatrix = xgboost.DMatrix(X, feature_names=params.feature_names)
+            contribs = params.predict(dmatrix, pred_contribs=True)
+            return contribs[:, :-1].astype(np.float64), contribs[:, -1].astype(np.float64)
+        coef, intercept = params
+        return X * coef, np.full(len(X), intercept)
+    
+    def _compute(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.meta is None:
+            return self._margin_contributions(self.base_estimators[0], X)
+        
+        weights, intercept = self.meta
+        contributions = np.zeros_like(X)
+        base_values = np.full(len(X), intercept)
+        for weight, component in zip(weights, self.base_estimators):
+            contribs, bias = self._margin_contributions(component, X)
+            share = _probability_share(bias + contribs.sum(axis=1), bias)
+            contributions += weight * contribs * share[:, None]
+            base_values += weight * _sigmoid(bias)
+        return contributions, base_values
+    
+    def explain(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Contributions for scaled model inputs, computing only rows not already cached.
+        
+        Returns:
+            (contributions (n, n_features), base_values (n,)), both in log-odds
+        """
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        keys = [(self.model_version, row.tobytes()) for row in X]
+        contributions = np.empty_like(X)
+        base_values = np.empty(len(X))
+        
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    contributions[i], base_values[i] = cached
+                    self._cache.move_to_end(key)
+            self.cache_hits += len(keys) - len(missing)
+            self.cache_misses += len(missing)
+        
+        if missing:
+            computed, computed_bases = self._compute(X[missing])
+            contributions[missing] = computed
+            base_values[missing] = computed_bases
+            with self._lock:
+                for i, contrib, base in zip(missing, computed, computed_bases):
+                    self._cache[keys[i]] = (contrib, float(base))
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        
+        return contributions, base_values
+    
+    def report(self, raw_values: np.ndarray, contributions: np.ndarray, base_values: np.ndarray,
+               top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Per-patient explanation dicts, contributions sorted by magnitude"""
+        margins = base_values + contributions.sum(axis=1)
+        # Probability-point view of the same contributions, for display
+        probability_contributions = contributions * _probability_share(margins, base_values)[:, None]
+        
+        reports = []
+        for i in range(len(contributions)):
+            order = np.argsort(-np.abs(contributions[i]), kind="stable")[:top_k]
+            reports.append({
+                "xgboost_score": round(float(_sigmoid(margins[i])), 4),
+                "base_value": round(float(base_values[i]), 4),
+                "base_probability": round(float(_sigmoid(base_values[i])), 4),
+                "model_version": self.model_version,
+                "contributions": [
+                    {
+                        "feature": self.model_features[j],
+                        "value": round(float(raw_values[i, j]), 4),
+                        "contribution": round(float(contributions[i, j]), 4),
+                        "probability_contribution": round(float(probability_contributions[i, j]), 4)
+                    }
+                    for j in order.tolist()
+                ]
+            })
+        return reports
+    
+    def cache_info(self) -> Dict[str, Any]:
+        return {"size": len(self._cache), "max_size": self.cache_size, "hits": self.cache_hits, "misses": self.cache_misses}
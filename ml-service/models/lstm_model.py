@@ -3,8 +3,11 @@ LSTM Model for Time-Series Vital Signs Analysis
 Handles sequential pattern recognition in patient vital signs
 """
 import numpy as np
+import pandas as pd
 import os
 
+from .rules import lstm_rule_engine
+
 # Conditional TensorFlow import for environments without GPU
 try:
     os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'  # Suppress TF warnings
@@ -15,6 +18,26 @@ except ImportError:
     TF_AVAILABLE = False
     print("⚠️ TensorFlow not available. LSTM predictions will use fallback.")
 
+# Input vitals in LSTM feature order, with the value used when one is missing
+SERIES_VITALS = [
+    ('heart_rate', 80),
+    ('systolic_blood_pressure', 120),
+    ('diastolic_blood_pressure', 80),
+    ('oxygen_saturation', 98),
+    ('temperature', 37),
+    ('respiratory_rate', 16)
+]
+
+# Approximate normalization (center, scale) for each vital
+SERIES_NORMALIZATION = np.array([
+    [120, 50],   # HR: mean ~80, std ~20
+    [120, 20],   # SysBP: mean ~120, std ~20
+    [80, 15],    # DiaBP: mean ~80, std ~15
+    [97, 3],     # SpO2: mean ~97, std ~3
+    [37, 0.5],   # Temp: mean ~37, std ~0.5
+    [16, 4]      # Resp: mean ~16, std ~4
+])
+
 
 class LSTMPredictor:
     """
@@ -22,9 +45,10 @@ class LSTMPredictor:
     Analyzes temporal patterns in vital signs to predict ICU need.
     """
     
-    def __init__(self, model_path: str = None):
+    def __init__(self, model_path: str = None, bundle=None):
         self.model = None
         self.model_path = model_path
+        self.bundle = bundle
         self.is_model_loaded = False
         self.time_series_features = ['HR', 'SysABP', 'DiasABP', 'SaO2', 'Temp', 'RespRate']
         self.n_timesteps = 3  # first, median, last
@@ -36,7 +60,11 @@ class LSTMPredictor:
     def _load_or_create_model(self):
         """Load existing model or create new architecture"""
         try:
-            if self.model_path and os.path.exists(self.model_path):
+            if self.bundle is not None:
+                self._build_from_bundle()
+                self.is_model_loaded = True
+                print(f"✅ LSTM model loaded from bundle {self.bundle.model_version}")
+            elif self.model_path and os.path.exists(self.model_path):
                 self.model = keras.models.load_model(self.model_path)
                 self.is_model_loaded = True
                 print(f"✅ LSTM model loaded from {self.model_path}")
@@ -48,6 +76,21 @@ class LSTMPredictor:
             print(f"⚠️ Error loading LSTM model: {e}")
             self._create_model_architecture()
     
+    def _build_from_bundle(self):
+        """Rebuild the Keras model from the bundle's layer spec and weight arrays"""
+        spec = self.bundle.lstm_spec
+        self.n_timesteps, self.n_features = spec["input_shape"]
+        
+        layers = [keras.layers.Input(shape=tuple(spec["input_shape"]))]
+        for layer in spec["layers"]:
+            layer_class = getattr(keras.layers, layer["class_name"])
+            layers.append(layer_class(**layer["config"]))
+        self.model = keras.Sequential(layers)
+        
+        for layer, weights in zip(self.model.layers, self.bundle.lstm_weights()):
+            if weights:
+                layer.set_weights(weights)
+    
     def _create_model_architecture(self):
         """Create LSTM model architecture"""
         if not TF_AVAILABLE:
@@ -109,21 +152,28 @@ class LSTMPredictor:
         ])
         
         # Normalize values
-        # These are approximate normalization ranges for vital signs
-        normalization = np.array([
-            [120, 50],   # HR: mean ~80, std ~20
-            [120, 20],   # SysBP: mean ~120, std ~20
-            [80, 15],    # DiaBP: mean ~80, std ~15
-            [97, 3],     # SpO2: mean ~97, std ~3
-            [37, 0.5],   # Temp: mean ~37, std ~0.5
-            [16, 4]      # Resp: mean ~16, std ~4
-        ])
-        
-        normalized = (time_series - normalization[:, 0]) / normalization[:, 1]
+        normalized = (time_series - SERIES_NORMALIZATION[:, 0]) / SERIES_NORMALIZATION[:, 1]
         
         # Reshape for LSTM: (1, timesteps, features)
         return normalized.reshape(1, self.n_timesteps, self.n_features)
     
+    def prepare_time_series_batch(self, patients: pd.DataFrame) -> np.ndarray:
+        """Vectorized prepare_time_series_data for a frame of patients, shape (n, timesteps, features)"""
+        n = len(patients)
+        current = np.column_stack([
+            patients[name].to_numpy(dtype=np.float64) if name in patients else np.full(n, default, dtype=np.float64)
+            for name, default in SERIES_VITALS
+        ])
+        
+        # Same +/-5% jitter on the first reading; SpO2 only drifts downwards
+        variance_factor = 0.05
+        high = np.full(len(SERIES_VITALS), variance_factor)
+        high[3] = 0
+        first = current * (1 + np.random.uniform(-variance_factor, high, size=current.shape))
+        
+        time_series = np.stack([first, current, current], axis=1)
+        return (time_series - SERIES_NORMALIZATION[:, 0]) / SERIES_NORMALIZATION[:, 1]
+    
     def predict(self, patient_data: dict) -> dict:
         """
         Generate LSTM prediction for patient data.
@@ -146,55 +196,40 @@ class LSTMPredictor:
                 "model_type": "lstm",
                 "success": True
             }
-            
+        
         except Exception as e:
             print(f"LSTM prediction error: {e}")
             return self._fallback_prediction(patient_data)
     
+    def predict_batch(self, patients: pd.DataFrame) -> np.ndarray:
+        """LSTM risk scores for a frame of patients in one model call"""
+        if TF_AVAILABLE and self.model is not None:
+            try:
+                X = self.prepare_time_series_batch(patients)
+                return self.model.predict(X, batch_size=1024, verbose=0)[:, 0].astype(np.float64)
+            except Exception as e:
+                print(f"LSTM batch prediction error: {e}")
+        
+        scores, _ = lstm_rule_engine.evaluate(lstm_rule_engine.to_matrix(patients))
+        return scores
+    
     def _fallback_prediction(self, patient_data: dict) -> dict:
         """
         Fallback prediction using rule-based logic when LSTM unavailable.
         """
-        risk_score = 0.0
-        
-        # Heart rate risk
-        hr = patient_data.get('heart_rate', 80)
-        if hr > 120 or hr < 50:
-            risk_score += 0.2
-        elif hr > 100 or hr < 60:
-            risk_score += 0.1
-        
-        # Blood pressure risk
-        sys_bp = patient_data.get('systolic_blood_pressure', 120)
-        if sys_bp > 180 or sys_bp < 90:
-            risk_score += 0.2
-        elif sys_bp > 140 or sys_bp < 100:
-            risk_score += 0.1
-        
-        # Oxygen saturation risk
-        spo2 = patient_data.get('oxygen_saturation', 98)
-        if spo2 < 90:
-            risk_score += 0.3
-        elif spo2 < 94:
-            risk_score += 0.15
-        
-        # Temperature risk
-        temp = patient_data.get('temperature', 37)
-        if temp > 39 or temp < 35:
-            risk_score += 0.15
-        
-        # Respiratory rate risk
-        resp = patient_data.get('respiratory_rate', 16)
-        if resp > 30 or resp < 10:
-            risk_score += 0.15
-        elif resp > 24 or resp < 12:
-            risk_score += 0.08
-        
-        return {
-            "risk_score": min(risk_score, 1.0),
-            "model_type": "lstm_fallback",
-            "success": True
-        }
+        return self.fallback_prediction_batch([patient_data])[0]
+    
+    def fallback_prediction_batch(self, patients: list) -> list:
+        """Rule-based fallback predictions for a batch of patients"""
+        scores, _ = lstm_rule_engine.score(patients)
+        return [
+            {
+                "risk_score": float(score),
+                "model_type": "lstm_fallback",
+                "success": True
+            }
+            for score in scores
+        ]
     
     def is_loaded(self) -> bool:
         """Check if model is loaded"""
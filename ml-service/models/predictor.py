@@ -3,13 +3,32 @@ ICU Predictor - Ensemble Model
 Combines XGBoost and LSTM predictions for ICU risk assessment
 """
 import os
+from contextlib import nullcontext
 import numpy as np
 import pandas as pd
 import joblib
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 from config import settings
 from .lstm_model import LSTMPredictor
+from .bundle import ModelBundle
+from .rules import icu_rule_engine
+from .explainer import StackedExplainer
+from .drift import DriftMonitor
+
+# Model feature -> /predict field it is derived from; other features are always default-filled
+FEATURE_INPUTS = {
+    'Age': 'age',
+    'Gender': 'gender',
+    'HR_first': 'heart_rate',
+    'SysABP_first': 'systolic_blood_pressure',
+    'DiasABP_first': 'diastolic_blood_pressure',
+    'SaO2_first': 'oxygen_saturation',
+    'Temp_first': 'temperature',
+    'RespRate_first': 'respiratory_rate',
+    'GCS_first': 'gcs_score',
+    'Lactate_first': 'lactate_level'
+}
 
 
 class ICUPredictor:
@@ -21,12 +40,29 @@ class ICUPredictor:
     Uses weighted averaging for final prediction.
     """
     
-    def __init__(self):
+    def __init__(self, bundle_path: Optional[str] = None, model_path: Optional[str] = None,
+                 scaler_path: Optional[str] = None, feature_list_path: Optional[str] = None,
+                 model_version: Optional[str] = None):
+        """
+        Artifact paths default to the configured (and legacy) locations; passing any
+        of them, e.g. for a candidate model, loads only the given artifacts.
+        
+        model_version names pickle-loaded models (default DEFAULT_MODEL_VERSION);
+        a bundle reports the version recorded in it.
+        """
+        self.artifact_paths = (bundle_path, model_path, scaler_path, feature_list_path)
         self.xgboost_model = None
         self.scaler = None
         self.feature_list = None
         self.lstm_predictor = None
-        self.model_version = "1.0.0"
+        self.bundle_path = None
+        # Bundle or pickle files the tabular model was loaded from
+        self._artifact_files: List[str] = []
+        self.model_version = model_version or settings.DEFAULT_MODEL_VERSION
+        self.explainer = None
+        self.drift_monitor = None
+        # Sampled per-stage allocation counters (utils.memory.AllocationAccounting), set by the service
+        self.allocation_accounting = None
         
         # Default feature values for missing data
         self.default_values = {
@@ -47,24 +83,42 @@ class ICUPredictor:
     
     def _load_models(self):
         """Load all required models and preprocessors"""
-        # Try loading from ml-service/models directory first, then legacy paths
-        model_paths = [
-            (settings.MODEL_PATH, settings.SCALER_PATH, settings.FEATURE_LIST_PATH),
-            (settings.LEGACY_MODEL_PATH, settings.LEGACY_SCALER_PATH, settings.LEGACY_FEATURE_LIST_PATH)
-        ]
+        bundle_override, model_override, scaler_override, feature_override = self.artifact_paths
+        if any(self.artifact_paths):
+            bundle_paths = [bundle_override] if bundle_override else []
+            model_paths = [(model_override, scaler_override or "", feature_override or "")] if model_override else []
+        else:
+            bundle_paths = [settings.MODEL_BUNDLE_PATH, settings.LEGACY_MODEL_BUNDLE_PATH]
+            # Try loading from ml-service/models directory first, then legacy paths
+            model_paths = [
+                (settings.MODEL_PATH, settings.SCALER_PATH, settings.FEATURE_LIST_PATH),
+                (settings.LEGACY_MODEL_PATH, settings.LEGACY_SCALER_PATH, settings.LEGACY_FEATURE_LIST_PATH)
+            ]
+        
+        # Prefer a single-file model bundle; fall back to the separate pickles
+        for bundle_path in bundle_paths:
+            if os.path.exists(bundle_path):
+                try:
+                    self._load_bundle(bundle_path)
+                    return
+                except Exception as e:
+                    print(f"⚠️ Error loading model bundle from {bundle_path}: {e}")
         
         for model_path, scaler_path, feature_path in model_paths:
             try:
                 if os.path.exists(model_path):
                     self.xgboost_model = joblib.load(model_path)
+                    self._artifact_files.append(model_path)
                     print(f"✅ XGBoost model loaded from {model_path}")
                     
                     if os.path.exists(scaler_path):
                         self.scaler = joblib.load(scaler_path)
+                        self._artifact_files.append(scaler_path)
                         print(f"✅ Scaler loaded from {scaler_path}")
                     
                     if os.path.exists(feature_path):
                         self.feature_list = joblib.load(feature_path)
+                        self._artifact_files.append(feature_path)
                         print(f"✅ Feature list loaded from {feature_path}")
                     
                     break
@@ -73,6 +127,8 @@ class ICUPredictor:
         
         if self.xgboost_model is None:
             print("⚠️ XGBoost model not found. Using fallback predictions.")
+        else:
+            self._init_drift_monitor()
         
         # Initialize LSTM predictor
         try:
@@ -82,21 +138,95 @@ class ICUPredictor:
             print(f"⚠️ Error initializing LSTM predictor: {e}")
             self.lstm_predictor = LSTMPredictor()  # Use default/fallback
     
+    def _load_bundle(self, bundle_path: str):
+        """Load model, scaler, feature order and LSTM weights from a model bundle"""
+        bundle = ModelBundle.load(bundle_path, verify=settings.VERIFY_MODEL_BUNDLE)
+        self.xgboost_model = bundle.model
+        self.scaler = bundle.scaler
+        self.feature_list = bundle.feature_list
+        self.model_version = bundle.model_version
+        print(f"✅ Model bundle {bundle.model_version} loaded from {bundle_path}")
+        
+        self.bundle_path = bundle_path
+        self._artifact_files = [bundle_path]
+        self._init_drift_monitor()
+        
+        lstm_bundle = bundle if bundle.has_lstm else None
+        self.lstm_predictor = LSTMPredictor(settings.LSTM_MODEL_PATH, bundle=lstm_bundle)
+        print("✅ LSTM predictor initialized")
+    
+    @property
+    def artifact_files(self) -> List[str]:
+        """Files the loaded models came from, including a separately saved LSTM"""
+        files = list(self._artifact_files)
+        lstm = self.lstm_predictor
+        if lstm is not None and lstm.is_model_loaded and lstm.bundle is None and lstm.model_path:
+            files.append(lstm.model_path)
+        return files
+    
+    def _init_drift_monitor(self):
+        """Track model inputs against the scaler's training mean/variance"""
+        if not settings.DRIFT_MONITOR_ENABLED:
+            return
+        feature_columns = self.feature_list if self.feature_list else self.tabular_features
+        train_mean = getattr(self.scaler, 'mean_', None)
+        train_var = getattr(self.scaler, 'var_', None)
+        if train_mean is None or len(train_mean) != len(feature_columns):
+            train_mean = train_var = None
+        self.drift_monitor = DriftMonitor(
+            feature_columns,
+            train_mean=train_mean,
+            train_var=train_var,
+            bins=settings.DRIFT_HISTOGRAM_BINS,
+            min_samples=settings.DRIFT_MIN_SAMPLES,
+            mean_shift_threshold=settings.DRIFT_MEAN_SHIFT_THRESHOLD,
+            std_ratio_threshold=settings.DRIFT_STD_RATIO_THRESHOLD
+        )
+    
+    def _stage(self, name: str):
+        """Allocation accounting around one inference stage (no-op unless enabled)"""
+        if self.allocation_accounting is None:
+            return nullcontext()
+        return self.allocation_accounting.stage(name)
+    
+    def _observe_inputs(self, features: pd.DataFrame, filled: np.ndarray):
+        if self.drift_monitor is not None:
+            self.drift_monitor.update(features.to_numpy(dtype=np.float64), filled)
+    
+    def _observe_frame(self, patients: pd.DataFrame, raw: pd.DataFrame):
+        if self.drift_monitor is not None:
+            filled = np.column_stack([
+                patients[FEATURE_INPUTS[col]].isna().to_numpy()
+                if FEATURE_INPUTS.get(col) in patients else np.ones(len(patients), dtype=bool)
+                for col in raw.columns
+            ])
+            self._observe_inputs(raw, filled)
+    
+    def observe_batch(self, patients: pd.DataFrame):
+        """Record a frame of patients in the drift monitor without scoring it (when scored elsewhere, e.g. a pool worker)"""
+        if self.drift_monitor is not None:
+            self._observe_frame(patients, self._prepare_feature_frame(patients))
+    
     def _prepare_features(self, patient_data: Dict[str, Any]) -> pd.DataFrame:
         """Prepare features for XGBoost model"""
+        def value(name: str, default: float) -> float:
+            # Missing and None both mean "not measured"
+            supplied = patient_data.get(name)
+            return float(default if supplied is None else supplied)
+        
         # Map input to model features
         features = self.default_values.copy()
         features.update({
-            'Age': float(patient_data.get('age', 50)),
+            'Age': value('age', 50),
             'Gender': 1 if str(patient_data.get('gender', '')).lower() == 'male' else 0,
-            'HR_first': float(patient_data.get('heart_rate', 80)),
-            'SysABP_first': float(patient_data.get('systolic_blood_pressure', 120)),
-            'DiasABP_first': float(patient_data.get('diastolic_blood_pressure', 80)),
-            'SaO2_first': float(patient_data.get('oxygen_saturation', 98)),
-            'Temp_first': float(patient_data.get('temperature', 37)),
-            'RespRate_first': float(patient_data.get('respiratory_rate', 16)),
-            'GCS_first': float(patient_data.get('gcs_score', 14)),
-            'Lactate_first': float(patient_data.get('lactate_level', 2.0))
+            'HR_first': value('heart_rate', 80),
+            'SysABP_first': value('systolic_blood_pressure', 120),
+            'DiasABP_first': value('diastolic_blood_pressure', 80),
+            'SaO2_first': value('oxygen_saturation', 98),
+            'Temp_first': value('temperature', 37),
+            'RespRate_first': value('respiratory_rate', 16),
+            'GCS_first': value('gcs_score', 14),
+            'Lactate_first': value('lactate_level', 2.0)
         })
         
         # Use feature list if available, otherwise use tabular features
@@ -115,6 +245,94 @@ class ICUPredictor:
         
         return df
     
+    def _prepare_feature_frame(self, patients: pd.DataFrame) -> pd.DataFrame:
+        """Columnar _prepare_features for a frame of patients keyed by the API field names"""
+        n = len(patients)
+        
+        def column(name: str, default: float) -> np.ndarray:
+            if name not in patients:
+                return np.full(n, default, dtype=np.float64)
+            return patients[name].astype(np.float64).fillna(default).to_numpy()
+        
+        features = {col: np.full(n, value, dtype=np.float64) for col, value in self.default_values.items()}
+        gender = patients['gender'] if 'gender' in patients else pd.Series('', index=patients.index)
+        features.update({
+            'Age': column('age', 50),
+            'Gender': (gender.astype(str).str.lower() == 'male').to_numpy(dtype=np.float64),
+            'HR_first': column('heart_rate', 80),
+            'SysABP_first': column('systolic_blood_pressure', 120),
+            'DiasABP_first': column('diastolic_blood_pressure', 80),
+            'SaO2_first': column('oxygen_saturation', 98),
+            'Temp_first': column('temperature', 37),
+            'RespRate_first': column('respiratory_rate', 16),
+            'GCS_first': column('gcs_score', 14),
+            'Lactate_first': column('lactate_level', 2.0)
+        })
+        
+        # Model features supplied directly (e.g. SAPS-I in a cohort export) replace their defaults
+        for col, default in self.default_values.items():
+            if col in patients:
+                features[col] = column(col, default)
+        
+        feature_columns = self.feature_list if self.feature_list else self.tabular_features
+        return pd.DataFrame({
+            col: features[col] if col in features else np.full(n, self.default_values.get(col, 0), dtype=np.float64)
+            for col in feature_columns
+        })
+    
+    def _get_xgboost_batch(self, patients: pd.DataFrame) -> np.ndarray:
+        """XGBoost risk scores for a frame of patients, falling back to the rule table"""
+        if self.xgboost_model is not None:
+            try:
+                _, df = self._model_inputs(patients, observe=True)
+                with self._stage("xgboost"):
+                    return self.xgboost_model.predict_proba(df)[:, 1].astype(np.float64)
+            except Exception as e:
+                print(f"XGBoost batch prediction error: {e}")
+        
+        scores, _ = icu_rule_engine.evaluate(icu_rule_engine.to_matrix(patients))
+        return scores
+    
+    def _model_inputs(self, patients: pd.DataFrame, observe: bool = False) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Raw and scaled feature frames, both in the column order the model expects"""
+        with self._stage("prepare_features"):
+            raw = self._prepare_feature_frame(patients)
+            if observe:
+                self._observe_frame(patients, raw)
+        scaled = raw
+        if self.scaler is not None:
+            with self._stage("scaling"):
+                scaled = pd.DataFrame(self.scaler.transform(raw), columns=raw.columns)
+        if hasattr(self.xgboost_model, 'feature_names_in_'):
+            model_features = list(self.xgboost_model.feature_names_in_)
+            raw, scaled = raw[model_features], scaled[model_features]
+        return raw, scaled
+    
+    def explain_batch(self, patients: pd.DataFrame, top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Per-feature contributions to the tabular (XGBoost/stacked) score for a frame of patients.
+        
+        Computed with one native pred_contribs call per batch for rows not
+        already cached for this model version.
+        """
+        if self.xgboost_model is None:
+            raise RuntimeError("Explanations require a loaded tabular model")
+        
+        raw, scaled = self._model_inputs(patients)
+        if self.explainer is None:
+            try:
+                self.explainer = StackedExplainer(
+                    self.xgboost_model,
+                    list(scaled.columns),
+                    model_version=self.model_version,
+                    cache_size=settings.EXPLANATION_CACHE_SIZE
+                )
+            except ValueError as e:
+                raise RuntimeError(f"Explanations unavailable for this model: {e}")
+        
+        contributions, base_values = self.explainer.explain(scaled.to_numpy(dtype=np.float64))
+        return self.explainer.report(raw.to_numpy(dtype=np.float64), contributions, base_values, top_k=top_k)
+    
     def _get_xgboost_prediction(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
         """Get prediction from XGBoost model"""
         if self.xgboost_model is None:
@@ -122,12 +340,18 @@ class ICUPredictor:
         
         try:
             # Prepare features
-            df = self._prepare_features(patient_data)
+            with self._stage("prepare_features"):
+                df = self._prepare_features(patient_data)
+                self._observe_inputs(df, np.array([
+                    patient_data.get(FEATURE_INPUTS[col]) is None if col in FEATURE_INPUTS else True
+                    for col in df.columns
+                ]))
             
             # Scale features if scaler is available
             if self.scaler is not None:
-                scaled_features = self.scaler.transform(df)
-                df = pd.DataFrame(scaled_features, columns=df.columns)
+                with self._stage("scaling"):
+                    scaled_features = self.scaler.transform(df)
+                    df = pd.DataFrame(scaled_features, columns=df.columns)
             
             # Get features expected by model
             if hasattr(self.xgboost_model, 'feature_names_in_'):
@@ -135,8 +359,9 @@ class ICUPredictor:
                 df = df[model_features]
             
             # Predict
-            prediction = self.xgboost_model.predict(df)[0]
-            probability = self.xgboost_model.predict_proba(df)[0][1]
+            with self._stage("xgboost"):
+                prediction = self.xgboost_model.predict(df)[0]
+                probability = self.xgboost_model.predict_proba(df)[0][1]
             
             return {
                 "risk_score": float(probability),
@@ -144,83 +369,33 @@ class ICUPredictor:
                 "model_type": "xgboost",
                 "success": True
             }
-            
+        
         except Exception as e:
             print(f"XGBoost prediction error: {e}")
             return self._fallback_prediction(patient_data)
     
     def _fallback_prediction(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
         """Fallback rule-based prediction when models unavailable"""
-        risk_score = 0.0
-        risk_factors = []
-        
-        # Age risk
-        age = patient_data.get('age', 50)
-        if age > 75:
-            risk_score += 0.15
-            risk_factors.append("Advanced age (>75)")
-        elif age > 65:
-            risk_score += 0.08
-        
-        # Heart rate
-        hr = patient_data.get('heart_rate', 80)
-        if hr > 130 or hr < 45:
-            risk_score += 0.2
-            risk_factors.append(f"Critical heart rate ({hr} bpm)")
-        elif hr > 110 or hr < 55:
-            risk_score += 0.1
-        
-        # Blood pressure
-        sys_bp = patient_data.get('systolic_blood_pressure', 120)
-        dia_bp = patient_data.get('diastolic_blood_pressure', 80)
-        if sys_bp > 180 or sys_bp < 85:
-            risk_score += 0.2
-            risk_factors.append(f"Critical BP ({sys_bp}/{dia_bp})")
-        elif sys_bp > 150 or sys_bp < 95:
-            risk_score += 0.1
-        
-        # Oxygen saturation
-        spo2 = patient_data.get('oxygen_saturation', 98)
-        if spo2 < 88:
-            risk_score += 0.3
-            risk_factors.append(f"Severe hypoxia (SpO2: {spo2}%)")
-        elif spo2 < 92:
-            risk_score += 0.2
-            risk_factors.append(f"Low oxygen ({spo2}%)")
-        elif spo2 < 95:
-            risk_score += 0.1
-        
-        # Temperature
-        temp = patient_data.get('temperature', 37)
-        if temp > 40 or temp < 34:
-            risk_score += 0.15
-            risk_factors.append(f"Critical temperature ({temp}°C)")
-        elif temp > 38.5 or temp < 35.5:
-            risk_score += 0.08
-        
-        # Respiratory rate
-        resp = patient_data.get('respiratory_rate', 16)
-        if resp > 35 or resp < 8:
-            risk_score += 0.2
-            risk_factors.append(f"Critical respiratory rate ({resp}/min)")
-        elif resp > 25 or resp < 10:
-            risk_score += 0.1
-        
-        # GCS score
-        gcs = patient_data.get('gcs_score', 14)
-        if gcs < 9:
-            risk_score += 0.25
-            risk_factors.append(f"Severely altered consciousness (GCS: {gcs})")
-        elif gcs < 13:
-            risk_score += 0.12
-        
-        return {
-            "risk_score": min(risk_score, 1.0),
-            "prediction": 1 if risk_score >= 0.5 else 0,
-            "model_type": "fallback_rules",
-            "risk_factors": risk_factors,
-            "success": True
-        }
+        return self.fallback_prediction_batch([patient_data])[0]
+    
+    def fallback_prediction_batch(self, patients: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Rule-based predictions for a batch of patients, evaluated in one vectorized pass"""
+        scores, risk_factors = icu_rule_engine.score(patients)
+        return [
+            {
+                "risk_score": float(score),
+                "prediction": 1 if score >= 0.5 else 0,
+                "model_type": "fallback_rules",
+                "risk_factors": factors,
+                "success": True
+            }
+            for score, factors in zip(scores, risk_factors)
+        ]
+    
+    def triage_priority(self, patient_data: Dict[str, Any]) -> float:
+        """Cheap acuity pre-screen (rule score, no reason formatting) used to order queued requests"""
+        scores, _ = icu_rule_engine.evaluate(icu_rule_engine.to_matrix([patient_data]))
+        return float(scores[0])
     
     def predict(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -228,52 +403,204 @@ class ICUPredictor:
         
         Args:
             patient_data: Dictionary containing patient vital signs
-            
+        
         Returns:
             Dictionary with prediction results
         """
         # Get individual predictions
         xgb_result = self._get_xgboost_prediction(patient_data)
-        lstm_result = self.lstm_predictor.predict(patient_data) if self.lstm_predictor else {"risk_score": 0.5}
         
         # Weighted ensemble
         xgb_weight = settings.ENSEMBLE_WEIGHTS.get("xgboost", 0.7)
         lstm_weight = settings.ENSEMBLE_WEIGHTS.get("lstm", 0.3)
-        
-        # Calculate ensemble score
         xgb_score = xgb_result.get("risk_score", 0.5)
-        lstm_score = lstm_result.get("risk_score", 0.5)
-        
-        ensemble_score = (xgb_score * xgb_weight) + (lstm_score * lstm_weight)
         
-        # Determine risk level
-        if ensemble_score >= settings.RISK_THRESHOLD_CRITICAL:
-            risk_level = "Critical"
-        elif ensemble_score >= settings.RISK_THRESHOLD_HIGH:
-            risk_level = "High"
-        elif ensemble_score >= settings.RISK_THRESHOLD_MEDIUM:
-            risk_level = "Medium"
+        # Cascade: skip the LSTM when no LSTM score could change the outcome
+        score_bounds = None
+        lstm_skipped = False
+        if settings.CASCADE_ENABLED:
+            score_bounds = self._cascade_bounds(xgb_score, xgb_weight, lstm_weight)
+            lstm_skipped = self._is_decisive(*score_bounds)
+        
+        if lstm_skipped:
+            lstm_score = None
+            # Any score inside the bounds gives the same outcome; report the XGBoost score
+            ensemble_score = min(max(xgb_score, score_bounds[0]), score_bounds[1])
+            # Without the LSTM, assume the worst-case disagreement it could have had
+            confidence = 1.0 - (max(xgb_score, 1.0 - xgb_score) * 0.5)
         else:
-            risk_level = "Low"
+            with self._stage("lstm"):
+                lstm_result = self.lstm_predictor.predict(patient_data) if self.lstm_predictor else {"risk_score": 0.5}
+            lstm_score = lstm_result.get("risk_score", 0.5)
+            
+            # Calculate ensemble score
+            ensemble_score = (xgb_score * xgb_weight) + (lstm_score * lstm_weight)
+            
+            # Calculate confidence based on model agreement
+            score_diff = abs(xgb_score - lstm_score)
+            confidence = 1.0 - (score_diff * 0.5)  # Higher agreement = higher confidence
         
-        # Calculate confidence based on model agreement
-        score_diff = abs(xgb_score - lstm_score)
-        confidence = 1.0 - (score_diff * 0.5)  # Higher agreement = higher confidence
+        # Determine risk level
+        risk_level = self._risk_level(ensemble_score)
         
         # Generate summary
         summary = self._generate_summary(patient_data, ensemble_score, risk_level)
         
         return {
-            "needs_icu": ensemble_score >= 0.5,
+            "needs_icu": ensemble_score >= settings.ICU_DECISION_THRESHOLD,
             "risk_score": round(ensemble_score, 4),
             "risk_level": risk_level,
             "confidence": round(confidence, 4),
             "model_version": self.model_version,
             "summary": summary,
             "xgboost_score": round(xgb_score, 4),
-            "lstm_score": round(lstm_score, 4)
+            "lstm_score": round(lstm_score, 4) if lstm_score is not None else None,
+            "lstm_skipped": lstm_skipped,
+            "score_bounds": [round(bound, 4) for bound in score_bounds] if score_bounds else None
         }
     
+    def predict_batch(self, patients: pd.DataFrame, round_scores: bool = True) -> pd.DataFrame:
+        """
+        Vectorized predict() for a frame of patients keyed by the API field names.
+        
+        Returns a frame indexed like the input with the scoring fields of
+        predict() (no clinical summary, which is per-patient text). Scores are
+        rounded to 4 places like predict()'s unless round_scores is False.
+        """
+        xgb_weight = settings.ENSEMBLE_WEIGHTS.get("xgboost", 0.7)
+        lstm_weight = settings.ENSEMBLE_WEIGHTS.get("lstm", 0.3)
+        xgb_scores = self._get_xgboost_batch(patients)
+        
+        lstm_scores = np.full(len(patients), np.nan)
+        lstm_skipped = np.zeros(len(patients), dtype=bool)
+        if settings.CASCADE_ENABLED:
+            low, high = self._cascade_bounds(xgb_scores, xgb_weight, lstm_weight)
+            lstm_skipped = self._decisive_mask(low, high)
+        
+        run_lstm = ~lstm_skipped
+        if run_lstm.any():
+            with self._stage("lstm"):
+                lstm_scores[run_lstm] = (
+                    self.lstm_predictor.predict_batch(patients[run_lstm]) if self.lstm_predictor else 0.5
+                )
+        
+        ensemble_scores = xgb_scores * xgb_weight + lstm_scores * lstm_weight
+        confidence = 1.0 - np.abs(xgb_scores - lstm_scores) * 0.5
+        if lstm_skipped.any():
+            ensemble_scores[lstm_skipped] = np.clip(xgb_scores, low, high)[lstm_skipped]
+            confidence[lstm_skipped] = 1.0 - np.maximum(xgb_scores, 1.0 - xgb_scores)[lstm_skipped] * 0.5
+        
+        def rounded(values: np.ndarray) -> np.ndarray:
+            return values.round(4) if round_scores else values
+        
+        return pd.DataFrame({
+            "needs_icu": ensemble_scores >= settings.ICU_DECISION_THRESHOLD,
+            "risk_score": rounded(ensemble_scores),
+            "risk_level": self._risk_levels(ensemble_scores),
+            "confidence": rounded(confidence),
+            "xgboost_score": rounded(xgb_scores),
+            "lstm_score": rounded(lstm_scores),
+            "lstm_skipped": lstm_skipped
+        }, index=patients.index)
+    
+    def result_from_batch(self, patient_data: Dict[str, Any], scores: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        predict()-shaped result for one patient from a row of unrounded
+        predict_batch scores (e.g. computed in an inference pool process),
+        adding the summary.
+        """
+        risk_score = float(scores["risk_score"])
+        xgb_score = float(scores["xgboost_score"])
+        lstm_score = scores.get("lstm_score")
+        score_bounds = None
+        if settings.CASCADE_ENABLED:
+            score_bounds = self._cascade_bounds(
+                xgb_score, settings.ENSEMBLE_WEIGHTS.get("xgboost", 0.7), settings.ENSEMBLE_WEIGHTS.get("lstm", 0.3)
+            )
+        risk_level = self._risk_level(risk_score)
+        
+        return {
+            "needs_icu": risk_score >= settings.ICU_DECISION_THRESHOLD,
+            "risk_score": round(risk_score, 4),
+            "risk_level": risk_level,
+            "confidence": round(float(scores["confidence"]), 4),
+            "model_version": self.model_version,
+            "summary": self._generate_summary(patient_data, risk_score, risk_level),
+            "xgboost_score": round(xgb_score, 4),
+            "lstm_score": None if lstm_score is None or np.isnan(lstm_score) else round(float(lstm_score), 4),
+            "lstm_skipped": bool(scores["lstm_skipped"]),
+            "score_bounds": [round(bound, 4) for bound in score_bounds] if score_bounds else None
+        }
+    
+    def predict_degraded(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Cheap rule-based prediction in the same shape as predict(), served
+        when the service sheds load and the caller accepts a degraded answer.
+        """
+        fallback = self._fallback_prediction(patient_data)
+        risk_score = fallback["risk_score"]
+        risk_level = self._risk_level(risk_score)
+        
+        return {
+            "needs_icu": risk_score >= settings.ICU_DECISION_THRESHOLD,
+            "risk_score": round(risk_score, 4),
+            "risk_level": risk_level,
+            "confidence": 0.5,
+            "model_version": self.model_version,
+            "summary": self._generate_summary(patient_data, risk_score, risk_level),
+            "risk_factors": fallback["risk_factors"],
+            "degraded": True
+        }
+    
+    def _risk_level(self, score: float) -> str:
+        """Map an ensemble score to its risk band"""
+        if score >= settings.RISK_THRESHOLD_CRITICAL:
+            return "Critical"
+        elif score >= settings.RISK_THRESHOLD_HIGH:
+            return "High"
+        elif score >= settings.RISK_THRESHOLD_MEDIUM:
+            return "Medium"
+        return "Low"
+    
+    def _risk_levels(self, scores: np.ndarray) -> np.ndarray:
+        """Array form of _risk_level"""
+        return np.select(
+            [
+                scores >= settings.RISK_THRESHOLD_CRITICAL,
+                scores >= settings.RISK_THRESHOLD_HIGH,
+                scores >= settings.RISK_THRESHOLD_MEDIUM
+            ],
+            ["Critical", "High", "Medium"],
+            default="Low"
+        )
+    
+    def _cascade_bounds(self, xgb_score: float, xgb_weight: float, lstm_weight: float) -> Tuple[float, float]:
+        """Range of ensemble scores reachable for any LSTM score in the configured range"""
+        base = xgb_score * xgb_weight
+        return base + lstm_weight * settings.CASCADE_LSTM_MIN, base + lstm_weight * settings.CASCADE_LSTM_MAX
+    
+    def _is_decisive(self, low: float, high: float) -> bool:
+        """True when every score in [low, high] falls in the same risk band and ICU decision"""
+        margin = settings.CASCADE_MARGIN
+        return all(low >= b + margin or high < b - margin for b in self._decision_boundaries())
+    
+    def _decisive_mask(self, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+        """Array form of _is_decisive for batch scoring"""
+        margin = settings.CASCADE_MARGIN
+        decisive = np.ones(len(low), dtype=bool)
+        for b in self._decision_boundaries():
+            decisive &= (low >= b + margin) | (high < b - margin)
+        return decisive
+    
+    def _decision_boundaries(self) -> Tuple[float, ...]:
+        """Scores at which the risk band or ICU decision changes"""
+        return (
+            settings.RISK_THRESHOLD_CRITICAL,
+            settings.RISK_THRESHOLD_HIGH,
+            settings.RISK_THRESHOLD_MEDIUM,
+            settings.ICU_DECISION_THRESHOLD
+        )
+    
     def _generate_summary(self, patient_data: Dict[str, Any], risk_score: float, risk_level: str) -> str:
         """Generate clinical summary for the prediction"""
         age = patient_data.get('age', 'Unknown')
@@ -314,6 +641,19 @@ class ICUPredictor:
         
         return summary
     
+    def set_thread_count(self, threads: int):
+        """Threads each XGBoost call may use (sklearn n_jobs / booster nthread)"""
+        model = self.xgboost_model
+        if model is None:
+            return
+        components = list(getattr(model, "estimators_", None) or getattr(model, "estimators", None) or []) + [model]
+        for component in components:
+            if hasattr(component, "set_thread_count"):
+                component.set_thread_count(threads)
+            elif hasattr(component, "get_booster") and hasattr(component, "n_jobs"):
+                component.set_params(n_jobs=threads)
+                component.get_booster().set_param({"nthread": threads})
+    
     def is_loaded(self) -> bool:
         """Check if models are loaded"""
         return self.xgboost_model is not None or (self.lstm_predictor and self.lstm_predictor.is_loaded())
@@ -323,16 +663,24 @@ class ICUPredictor:
         return {
             "version": self.model_version,
             "ensemble_weights": settings.ENSEMBLE_WEIGHTS,
+            "cascade": {
+                "enabled": settings.CASCADE_ENABLED,
+                "margin": settings.CASCADE_MARGIN,
+                "lstm_score_range": [settings.CASCADE_LSTM_MIN, settings.CASCADE_LSTM_MAX]
+            },
             "xgboost": {
                 "loaded": self.xgboost_model is not None,
                 "features": self.tabular_features
             },
             "lstm": self.lstm_predictor.get_model_info() if self.lstm_predictor else {"status": "not_loaded"},
+            "model_bundle": self.bundle_path,
+            "explanation_cache": self.explainer.cache_info() if self.explainer else None,
             "scaler_loaded": self.scaler is not None,
             "feature_list_loaded": self.feature_list is not None,
             "risk_thresholds": {
                 "critical": settings.RISK_THRESHOLD_CRITICAL,
                 "high": settings.RISK_THRESHOLD_HIGH,
-                "medium": settings.RISK_THRESHOLD_MEDIUM
+                "medium": settings.RISK_THRESHOLD_MEDIUM,
+                "needs_icu": settings.ICU_DECISION_THRESHOLD
             }
         }
@@ -0,0 +1,188 @@
+"""
+Model Registry
+Several named model versions served side by side, loaded on first use and evicted under a memory budget
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Union
+
+from utils.memory import resident_bytes as _resident_bytes
+from .predictor import ICUPredictor
+
+ARTIFACT_KEYS = ("bundle_path", "model_path", "scaler_path", "feature_list_path")
+MB = 1024 * 1024
+
+
+class UnknownModelVersion(KeyError):
+    """Raised when a request selects a version or site the registry does not know"""
+
+
+class ModelLoadError(RuntimeError):
+    """Raised when a configured version's model artifacts cannot be loaded"""
+
+
+class ModelRegistry:
+    """
+    Named model versions sharing one process.
+    
+    The default predictor is loaded up front and never evicted. Other versions
+    are loaded on first request and kept in LRU order; after each load the least
+    recently used ones are evicted until the estimated footprint fits
+    memory_budget_mb. A model's footprint is the resident-memory growth while
+    loading it, but at least its artifact size on disk. Requests that still
+    hold an evicted predictor finish normally; it is freed when they are done.
+    A version whose artifacts don't load raises ModelLoadError and is not
+    cached, so the next request retries the load.
+    
+    A version spec is a bundle path or a dict of ICUPredictor artifact paths.
+    Sites map to version names, so callers can select by either. on_load is
+    called with each newly loaded predictor, e.g. to apply the thread budget.
+    """
+    
+    def __init__(self, default: ICUPredictor, default_name: str,
+                 versions: Optional[Dict[str, Union[str, Dict[str, str]]]] = None,
+                 sites: Optional[Dict[str, str]] = None, memory_budget_mb: float = 0,
+                 on_load: Optional[Callable[[ICUPredictor], None]] = None):
+        self.default_name = default_name
+        self.specs = {name: self._normalize(name, spec) for name, spec in (versions or {}).items()}
+        self.sites = dict(sites or {})
+        for site, name in self.sites.items():
+            if name != default_name and name not in self.specs:
+                raise ValueError(f"Site {site!r} maps to unknown model version {name!r}")
+        self.memory_budget = memory_budget_mb * MB
+        self.on_load = on_load
+        
+        self.default = default
+        self._loaded: "OrderedDict[str, ICUPredictor]" = OrderedDict()
+        self._footprint: Dict[str, int] = {}
+        self._usage: Dict[str, Dict[str, Any]] = {default_name: {"requests": 0, "loads": 1, "last_used": None}}
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {name: threading.Lock() for name in self.specs}
+        self.evictions = 0
+    
+    @staticmethod
+    def _normalize(name: str, spec: Union[str, Dict[str, str]]) -> Dict[str, str]:
+        if isinstance(spec, str):
+            spec = {"bundle_path": spec}
+        unknown = set(spec) - set(ARTIFACT_KEYS)
+        if unknown or not (spec.get("bundle_path") or spec.get("model_path")):
+            raise ValueError(
+                f"Model version {name!r} needs a bundle_path or model_path "
+                f"(allowed keys: {', '.join(ARTIFACT_KEYS)})"
+            )
+        return spec
+    
+    def resolve(self, version: Optional[str] = None, site: Optional[str] = None) -> str:
+        """Version name for an explicit version, else the site's version, else the default"""
+        if version:
+            if version != self.default_name and version not in self.specs:
+                raise UnknownModelVersion(f"Unknown model version {version!r}")
+            return version
+        if site:
+            if site not in self.sites:
+                raise UnknownModelVersion(f"No model version configured for site {site!r}")
+            return self.sites[site]
+        return self.default_name
+    
+    def get(self, version: Optional[str] = None, site: Optional[str] = None) -> ICUPredictor:
+        """Predictor for the selected version, loading it (and evicting others) if needed"""
+        name = self.resolve(version, site)
+        if name == self.default_name:
+            self._touch(name)
+            return self.default
+        
+        with self._lock:
+            predictor = self._loaded.get(name)
+            if predictor is not None:
+                self._loaded.move_to_end(name)
+        if predictor is None:
+            predictor = self._load(name)
+        self._touch(name)
+        return predictor
+    
+    def _touch(self, name: str):
+        with self._lock:
+            usage = self._usage.setdefault(name, {"requests": 0, "loads": 0, "last_used": None})
+            usage["requests"] += 1
+            usage["last_used"] = time.time()
+    
+    def _load(self, name: str) -> ICUPredictor:
+        # One load per version at a time; concurrent requests for it wait and reuse the result
+        with self._load_locks[name]:
+            with self._lock:
+                if name in self._loaded:
+                    self._loaded.move_to_end(name)
+                    return self._loaded[name]
+            
+            spec = self.specs[name]
+            before = _resident_bytes()
+            predictor = ICUPredictor(model_version=name, **spec)
+            after = _resident_bytes()
+            if predictor.xgboost_model is None:
+                # The predictor fell back to the rule engine; don't serve that under this version's name
+                raise ModelLoadError(f"Model version {name!r} could not be loaded from its artifacts")
+            if self.on_load is not None:
+                self.on_load(predictor)
+            on_disk = sum(os.path.getsize(path) for path in spec.values() if path and os.path.exists(path))
+            footprint = max(on_disk, after - before if before is not None and after is not None else 0)
+            
+            with self._lock:
+                self._loaded[name] = predictor
+                self._footprint[name] = footprint
+                usage = self._usage.setdefault(name, {"requests": 0, "loads": 0, "last_used": None})
+                usage["loads"] += 1
+                self._evict(keep=name)
+            print(f"✅ Model version {name} loaded ({footprint / MB:.1f} MB)")
+            return predictor
+    
+    def _evict(self, keep: str):
+        """Drop least recently used versions until the loaded ones fit the budget (lock held)"""
+        if not self.memory_budget:
+            return
+        while sum(self._footprint.values()) > self.memory_budget:
+            victim = next((name for name in self._loaded if name != keep), None)
+            if victim is None:
+                break
+            del self._loaded[victim]
+            del self._footprint[victim]
+            self.evictions += 1
+            print(f"⚠️ Evicted model version {victim} to stay within the registry memory budget")
+    
+    def unload(self, name: str) -> bool:
+        """Evict a loaded version now; the default cannot be unloaded"""
+        with self._lock:
+            if name not in self._loaded:
+                return False
+            del self._loaded[name]
+            del self._footprint[name]
+            self.evictions += 1
+            return True
+    
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            versions = {}
+            for name in [self.default_name, *self.specs]:
+                predictor = self.default if name == self.default_name else self._loaded.get(name)
+                usage = self._usage.get(name, {"requests": 0, "loads": 0, "last_used": None})
+                versions[name] = {
+                    "default": name == self.default_name,
+                    "loaded": predictor is not None,
+                    "model_version": predictor.model_version if predictor is not None else None,
+                    "footprint_mb": round(self._footprint[name] / MB, 1) if name in self._footprint else None,
+                    "requests": usage["requests"],
+                    "loads": usage["loads"],
+                    "last_used": (
+                        time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(usage["last_used"]))
+                        if usage["last_used"] else None
+                    )
+                }
+            return {
+                "default": self.default_name,
+                "sites": dict(self.sites),
+                "memory_budget_mb": round(self.memory_budget / MB, 1) if self.memory_budget else None,
+                "loaded_mb": round(sum(self._footprint.values()) / MB, 1),
+                "evictions": self.evictions,
+                "versions": versions
+            }
@@ -0,0 +1,147 @@
+"""
+Rule-Based Risk Scoring
+Declarative vital-sign rule tables evaluated for a whole batch with NumPy
+"""
+import string
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Values used when a vital is missing from the patient record
+VITAL_DEFAULTS = {
+    'age': 50,
+    'heart_rate': 80,
+    'systolic_blood_pressure': 120,
+    'diastolic_blood_pressure': 80,
+    'oxygen_saturation': 98,
+    'temperature': 37,
+    'respiratory_rate': 16,
+    'gcs_score': 14,
+    'lactate_level': 2.0
+}
+
+# Rule rows: (vital, below, above, weight, reason)
+# A row fires when value < below or value > above (None = no bound on that side).
+# Consecutive rows for the same vital are tiers: only the first firing tier counts.
+# Reasons are format strings over the patient's vitals; None means no risk factor is reported.
+ICU_FALLBACK_RULES = [
+    ('age', None, 75, 0.15, "Advanced age (>75)"),
+    ('age', None, 65, 0.08, None),
+    ('heart_rate', 45, 130, 0.2, "Critical heart rate ({heart_rate} bpm)"),
+    ('heart_rate', 55, 110, 0.1, None),
+    ('systolic_blood_pressure', 85, 180, 0.2, "Critical BP ({systolic_blood_pressure}/{diastolic_blood_pressure})"),
+    ('systolic_blood_pressure', 95, 150, 0.1, None),
+    ('oxygen_saturation', 88, None, 0.3, "Severe hypoxia (SpO2: {oxygen_saturation}%)"),
+    ('oxygen_saturation', 92, None, 0.2, "Low oxygen ({oxygen_saturation}%)"),
+    ('oxygen_saturation', 95, None, 0.1, None),
+    ('temperature', 34, 40, 0.15, "Critical temperature ({temperature}°C)"),
+    ('temperature', 35.5, 38.5, 0.08, None),
+    ('respiratory_rate', 8, 35, 0.2, "Critical respiratory rate ({respiratory_rate}/min)"),
+    ('respiratory_rate', 10, 25, 0.1, None),
+    ('gcs_score', 9, None, 0.25, "Severely altered consciousness (GCS: {gcs_score})"),
+    ('gcs_score', 13, None, 0.12, None),
+]
+
+LSTM_FALLBACK_RULES = [
+    ('heart_rate', 50, 120, 0.2, None),
+    ('heart_rate', 60, 100, 0.1, None),
+    ('systolic_blood_pressure', 90, 180, 0.2, None),
+    ('systolic_blood_pressure', 100, 140, 0.1, None),
+    ('oxygen_saturation', 90, None, 0.3, None),
+    ('oxygen_saturation', 94, None, 0.15, None),
+    ('temperature', 35, 39, 0.15, None),
+    ('respiratory_rate', 10, 30, 0.15, None),
+    ('respiratory_rate', 12, 24, 0.08, None),
+]
+
+
+class RuleEngine:
+    """
+    Compiles a rule table into arrays and scores a batch of patients in one pass.
+    
+    Each patient is a row of a (n_patients, n_vitals) matrix; every rule row is a
+    column comparison, and first-match-per-vital is enforced with a cumulative sum
+    over the tiers of each vital.
+    """
+    
+    def __init__(self, rules: Sequence[Tuple], defaults: Optional[Dict[str, float]] = None):
+        self.rules = list(rules)
+        self.defaults = dict(VITAL_DEFAULTS if defaults is None else defaults)
+        
+        self.vitals: List[str] = []
+        for vital, *_ in self.rules:
+            if vital not in self.vitals:
+                self.vitals.append(vital)
+        
+        self.rule_vital = np.array([self.vitals.index(r[0]) for r in self.rules], dtype=np.intp)
+        self.below = np.array([-np.inf if r[1] is None else r[1] for r in self.rules], dtype=np.float64)
+        self.above = np.array([np.inf if r[2] is None else r[2] for r in self.rules], dtype=np.float64)
+        self.weights = np.array([r[3] for r in self.rules], dtype=np.float64)
+        self.reasons = [r[4] for r in self.rules]
+        self.has_reason = np.array([r is not None for r in self.reasons])
+        # Vitals referenced by each reason string, so formatting only looks those up
+        self.reason_fields = [
+            [field for _, field, _, _ in string.Formatter().parse(r) if field] if r else []
+            for r in self.reasons
+        ]
+        
+        # Index of the first tier of each row's group of consecutive same-vital rows
+        group_start = np.zeros(len(self.rules), dtype=np.intp)
+        for i in range(1, len(self.rules)):
+            group_start[i] = group_start[i - 1] if self.rules[i][0] == self.rules[i - 1][0] else i
+        self.group_start = group_start
+    
+    def to_matrix(self, patients: Sequence[Dict[str, Any]]) -> np.ndarray:
+        """Build the (n_patients, n_vitals) value matrix, filling missing vitals with defaults"""
+        if isinstance(patients, pd.DataFrame):
+            frame = patients.reindex(columns=self.vitals).astype(np.float64)
+            return frame.fillna(self.defaults).to_numpy()
+        
+        values = np.empty((len(patients), len(self.vitals)), dtype=np.float64)
+        for j, vital in enumerate(self.vitals):
+            default = self.defaults.get(vital, np.nan)
+            values[:, j] = [default if p.get(vital) is None else p[vital] for p in patients]
+        return values
+    
+    def evaluate(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score a value matrix whose columns follow self.vitals.
+        
+        Returns:
+            (risk_scores clipped to [0, 1], fired) where fired is an
+            (n_patients, n_rules) boolean matrix of the tiers that counted
+        """
+        values = np.asarray(values, dtype=np.float64)
+        x = values[:, self.rule_vital]
+        hit = (x < self.below) | (x > self.above)
+        
+        # Hits in earlier tiers of the same vital suppress later tiers
+        hits_before = np.cumsum(hit, axis=1) - hit
+        earlier_in_group = hits_before - hits_before[:, self.group_start]
+        fired = hit & (earlier_in_group == 0)
+        
+        # Round away summation noise so tier sums such as 0.2 + 0.2 + 0.1 hit 0.5 exactly
+        scores = np.minimum(np.round(fired.astype(np.float64) @ self.weights, 10), 1.0)
+        return scores, fired
+    
+    def explain(self, fired: np.ndarray, patients: Sequence[Dict[str, Any]]) -> List[List[str]]:
+        """Format the reason strings of fired rules for each patient"""
+        reasons = [[] for _ in range(len(patients))]
+        rows, cols = np.nonzero(fired & self.has_reason)
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            patient = patients[row]
+            context = {}
+            for field in self.reason_fields[col]:
+                value = patient.get(field)
+                context[field] = self.defaults.get(field) if value is None else value
+            reasons[row].append(self.reasons[col].format(**context))
+        return reasons
+    
+    def score(self, patients: Sequence[Dict[str, Any]]) -> Tuple[np.ndarray, List[List[str]]]:
+        """Scores and triggered reasons for a batch of patient dicts"""
+        scores, fired = self.evaluate(self.to_matrix(patients))
+        return scores, self.explain(fired, patients)
+
+
+icu_rule_engine = RuleEngine(ICU_FALLBACK_RULES)
+lstm_rule_engine = RuleEngine(LSTM_FALLBACK_RULES)
@@ -0,0 +1,333 @@
+"""
+Traffic Replay
+Replays recorded /predict payloads against the ML service or a local ICUPredictor, optionally diffing two model versions
+
+Usage:
+    python replay.py /var/lib/ml-service/audit --baseline http://localhost:8000
+    python replay.py /var/lib/ml-service/audit --baseline http://localhost:8000 --candidate "http://localhost:8000?model_version=2.0.0" --speed 10
+    python replay.py capture.ndjson --baseline bundle:models/v1.bundle --candidate bundle:models/v2.bundle --timing max
+
+Targets are a service URL (query parameters such as model_version are forwarded to /predict),
+"local" for ICUPredictor with the configured artifacts, "bundle:<path>" or "pickle:<model>,<scaler>,<features>".
+"""
+import argparse
+import gzip
+import heapq
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from utils.audit import read_audit_log
+from utils.shadow import ShadowStats, latency_summary
+
+# /predict request fields (PatientVitals)
+VITALS_FIELDS = [
+    'age', 'gender', 'heart_rate', 'systolic_blood_pressure', 'diastolic_blood_pressure',
+    'oxygen_saturation', 'temperature', 'respiratory_rate', 'gcs_score', 'lactate_level'
+]
+
+TIMING_MODES = ("original", "max")
+
+
+def _parse_timestamp(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return (parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def _records(source: str) -> Iterator[Dict[str, Any]]:
+    if os.path.isdir(source):
+        yield from read_audit_log(source)
+        return
+    opener = gzip.open if source.endswith(".gz") else open
+    with opener(source, "rt", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                print(f"⚠️ Skipping invalid JSON on line {line_number} of {source}")
+
+
+def read_payloads(source: str, endpoints: Optional[List[str]] = None,
+                  limit: Optional[int] = None) -> Iterator[Tuple[Optional[float], Dict[str, Any], str]]:
+    """
+    Yield (recorded time, /predict payload, reference) from an audit log directory
+    or segment, or from an NDJSON capture of raw request bodies (with an optional
+    "timestamp"). Fields recorded as null are left out so the service applies its defaults.
+    """
+    count = 0
+    for index, record in enumerate(_records(source), 1):
+        if record.get("type", "prediction") != "prediction":
+            continue
+        if endpoints and record.get("endpoint", "/predict") not in endpoints:
+            continue
+        inputs = record.get("inputs", record)
+        payload = {field: inputs[field] for field in VITALS_FIELDS if inputs.get(field) is not None}
+        reference = record.get("audit_id") or f"#{index}"
+        if "row" in record:
+            reference = f"{reference}:{record['row']}"
+        yield _parse_timestamp(record.get("timestamp")), payload, reference
+        count += 1
+        if limit and count >= limit:
+            return
+
+
+class HttpTarget:
+    """POST /predict on a running service (thread-safe; one pooled client)"""
+    
+    def __init__(self, url: str, timeout: float = 30.0):
+        import httpx
+        parts = urlsplit(url)
+        self.name = url
+        self.path = parts.path if parts.path not in ("", "/") else "/predict"
+        self.params = dict(parse_qsl(parts.query))
+        self.client = httpx.Client(base_url=f"{parts.scheme}://{parts.netloc}", timeout=timeout)
+    
+    def predict(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        response = self.client.post(self.path, json=payload, params=self.params)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}")
+        return response.json()
+    
+    def close(self):
+        self.client.close()
+
+
+class LocalTarget:
+    """ICUPredictor in this process, bypassing HTTP and admission control"""
+    
+    def __init__(self, spec: str):
+        from models.predictor import ICUPredictor
+        self.name = spec
+        kind, _, paths = spec.partition(":")
+        if kind == "local":
+            self.predictor = ICUPredictor()
+        elif kind == "bundle":
+            self.predictor = ICUPredictor(bundle_path=paths)
+        elif kind == "pickle":
+            model_path, scaler_path, feature_list_path = (paths.split(",") + ["", ""])[:3]
+            self.predictor = ICUPredictor(model_path=model_path, scaler_path=scaler_path,
+                                          feature_list_path=feature_list_path, model_version=os.path.basename(model_path))
+        else:
+            raise ValueError(f"Unknown target {spec!r}")
+    
+    def predict(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return self.predictor.predict({field: payload.get(field) for field in VITALS_FIELDS})
+    
+    def close(self):
+        pass
+
+
+def make_target(spec: str, timeout: float = 30.0):
+    if spec.startswith(("http://", "https://")):
+        return HttpTarget(spec, timeout=timeout)
+    return LocalTarget(spec)
+
+
+class ReplayResults:
+    """Latency and error tallies per target plus the baseline/candidate comparison (thread-safe)"""
+    
+    def __init__(self, targets: List[Any], output_path: Optional[str] = None, top_deltas: int = 10):
+        self.targets = targets
+        self.latencies: List[List[float]] = [[] for _ in targets]
+        self.errors: List[Counter] = [Counter() for _ in targets]
+        # Unbounded reservoirs: percentiles over the whole replay
+        self.comparison = ShadowStats(reservoir_size=None) if len(targets) > 1 else None
+        self.candidate_version = None
+        self.largest: List[Tuple[float, str, Dict[str, Any]]] = []
+        self.top_deltas = top_deltas
+        self.lags: List[float] = []
+        self.replayed = 0
+        self._lock = threading.Lock()
+        self._output = open(output_path, "w") if output_path else None
+    
+    def record(self, reference: str, outcomes: List[Tuple[Optional[Dict[str, Any]], float, Optional[str]]]):
+        with self._lock:
+            self.replayed += 1
+            for i, (result, latency, error) in enumerate(outcomes):
+                if error is None:
+                    self.latencies[i].append(latency)
+                else:
+                    self.errors[i][error] += 1
+            
+            if self.comparison is not None and all(error is None for _, _, error in outcomes):
+                (baseline, baseline_latency, _), (candidate, candidate_latency, _) = outcomes
+                self.comparison.record(baseline, candidate, baseline_latency, candidate_latency)
+                self.candidate_version = candidate.get("model_version")
+                delta = candidate["risk_score"] - baseline["risk_score"]
+                entry = (abs(delta), reference, {
+                    "reference": reference,
+                    "baseline": {key: baseline[key] for key in ("risk_score", "risk_level", "needs_icu")},
+                    "candidate": {key: candidate[key] for key in ("risk_score", "risk_level", "needs_icu")},
+                    "delta": round(delta, 4)
+                })
+                if len(self.largest) < self.top_deltas:
+                    heapq.heappush(self.largest, entry)
+                elif entry[0] > self.largest[0][0]:
+                    heapq.heapreplace(self.largest, entry)
+            
+            if self._output is not None:
+                self._output.write(json.dumps({
+                    "reference": reference,
+                    "results": [
+                        {
+                            "target": target.name,
+                            "error": error,
+                            "latency_ms": round(latency * 1000, 3),
+                            **({key: result.get(key) for key in ("model_version", "risk_score", "risk_level", "needs_icu")}
+                               if result is not None else {})
+                        }
+                        for target, (result, latency, error) in zip(self.targets, outcomes)
+                    ]
+                }) + "\n")
+    
+    def report(self, wall_seconds: float) -> Dict[str, Any]:
+        names = ["baseline", "candidate"]
+        report = {
+            "replayed": self.replayed,
+            "wall_seconds": round(wall_seconds, 2),
+            "throughput_rps": round(self.replayed / max(wall_seconds, 1e-9), 1),
+            "schedule_lag": latency_summary(self.lags) if self.lags else None,
+            "targets": {
+                names[i]: {
+                    "target": target.name,
+                    "succeeded": len(self.latencies[i]),
+                    "errors": dict(self.errors[i]),
+                    "latency": latency_summary(self.latencies[i])
+                }
+                for i, target in enumerate(self.targets)
+            }
+        }
+        if self.comparison is not None:
+            comparison = self.comparison.snapshot(self.candidate_version)
+            comparison.pop("latency")
+            comparison["largest_deltas"] = [entry for _, _, entry in sorted(self.largest, reverse=True)]
+            report["comparison"] = comparison
+        return report
+    
+    def close(self):
+        if self._output is not None:
+            self._output.close()
+
+
+def _score(targets: List[Any], payload: Dict[str, Any]) -> List[Tuple[Optional[Dict[str, Any]], float, Optional[str]]]:
+    outcomes = []
+    for target in targets:
+        started = time.perf_counter()
+        try:
+            result, error = target.predict(payload), None
+        except Exception as e:
+            result, error = None, str(e) if isinstance(e, RuntimeError) else type(e).__name__
+        outcomes.append((result, time.perf_counter() - started, error))
+    return outcomes
+
+
+def replay(payloads: Iterator[Tuple[Optional[float], Dict[str, Any], str]], targets: List[Any],
+           timing: str = "original", speed: float = 1.0, concurrency: int = 4,
+           output_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Send every payload to each target and collect latencies and, for two targets, the score diff.
+    
+    timing="original" reproduces the recorded inter-arrival gaps divided by speed
+    (open loop: dispatch does not wait for responses, up to concurrency in flight;
+    schedule_lag shows how far dispatch fell behind). timing="max" sends as fast as
+    concurrency workers allow.
+    """
+    results = ReplayResults(targets, output_path=output_path)
+    slots = threading.BoundedSemaphore(concurrency)
+    first_recorded = None
+    started = time.perf_counter()
+    
+    def done(reference):
+        def callback(future):
+            slots.release()
+            results.record(reference, future.result())
+        return callback
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for recorded, payload, reference in payloads:
+            if timing == "original" and recorded is not None:
+                if first_recorded is None:
+                    first_recorded = recorded
+                due = started + (recorded - first_recorded) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                slots.acquire()
+                results.lags.append(max(0.0, time.perf_counter() - due))
+            else:
+                slots.acquire()
+            pool.submit(_score, targets, payload).add_done_callback(done(reference))
+    
+    wall_seconds = time.perf_counter() - started
+    results.close()
+    return results.report(wall_seconds)
+
+
+def print_summary(report: Dict[str, Any]):
+    print(f"✅ Replayed {report['replayed']:,} requests in {report['wall_seconds']}s ({report['throughput_rps']:,} req/s)")
+    for name, target in report["targets"].items():
+        latency = target["latency"]
+        errors = sum(target["errors"].values())
+        print(f"   {name:<9} {target['target']}: p50 {latency['p50_ms']} ms, p95 {latency['p95_ms']} ms, "
+              f"p99 {latency['p99_ms']} ms, {errors} error(s)")
+    if report.get("schedule_lag"):
+        print(f"   schedule lag p95 {report['schedule_lag']['p95_ms']} ms")
+    comparison = report.get("comparison")
+    if comparison:
+        print(f"   risk score delta: mean {comparison['score_delta']['mean']}, "
+              f"p95 |d| {comparison['score_delta']['p95_abs']}, max |d| {comparison['score_delta']['max_abs']}")
+        marker = "⚠️" if comparison["risk_band_disagreements"] or comparison["icu_decision_flips"] else "✅"
+        print(f"{marker} {comparison['risk_band_disagreements']} risk band change(s), "
+              f"{comparison['icu_decision_flips']} ICU decision flip(s) over {comparison['scored']:,} compared requests")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded prediction traffic against the ML service or a model")
+    parser.add_argument("source", help="Audit log directory or segment, or NDJSON capture of /predict bodies")
+    parser.add_argument("--baseline", required=True, help="Target URL, local, bundle:<path> or pickle:<model>,<scaler>,<features>")
+    parser.add_argument("--candidate", help="Second target; outputs are diffed against the baseline")
+    parser.add_argument("--timing", choices=TIMING_MODES, default="original", help="Recorded inter-arrival times or max throughput")
+    parser.add_argument("--speed", type=float, default=1.0, help="Speed-up factor for --timing original")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight")
+    parser.add_argument("--endpoint", action="append", help="Only replay audit records from this endpoint (repeatable)")
+    parser.add_argument("--limit", type=int, default=None, help="Replay at most this many requests")
+    parser.add_argument("--timeout", type=float, default=30.0, help="HTTP timeout in seconds")
+    parser.add_argument("--output", help="Write per-request results as NDJSON")
+    parser.add_argument("--report", help="Write the summary report as JSON")
+    args = parser.parse_args()
+    
+    targets = [make_target(args.baseline, args.timeout)]
+    if args.candidate:
+        targets.append(make_target(args.candidate, args.timeout))
+    try:
+        report = replay(
+            read_payloads(args.source, endpoints=args.endpoint, limit=args.limit),
+            targets,
+            timing=args.timing,
+            speed=args.speed,
+            concurrency=args.concurrency,
+            output_path=args.output
+        )
+    finally:
+        for target in targets:
+            target.close()
+    
+    print_summary(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
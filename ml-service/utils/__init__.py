@@ -0,0 +1,14 @@
+"""
+Runtime utilities for the ML service
+"""
+from .profiler import SamplingProfiler
+from .admission import AdmissionController, PriorityAdmissionController, Overloaded
+from .shadow import ShadowEvaluator
+from .threads import ThreadBudget, detect_cpu_limit
+from .audit import AuditLog, prediction_record, read_audit_log
+from .inference_pool import InferencePool
+from .memory import HeapTracker, AllocationAccounting
+
+__all__ = ["SamplingProfiler", "AdmissionController", "PriorityAdmissionController", "Overloaded", "ShadowEvaluator",
+           "ThreadBudget", "detect_cpu_limit", "AuditLog", "prediction_record", "read_audit_log",
+           "InferencePool", "HeapTracker", "AllocationAccounting"]
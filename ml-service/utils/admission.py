@@ -0,0 +1,190 @@
+"""
+Admission Control
+Bounded request queue in front of model inference with fail-fast load shedding
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed; retry_after is the suggested wait in seconds"""
+    
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Limits concurrent inference to max_concurrency and queues at most
+    max_queue_depth further requests for up to max_queue_wait seconds.
+    
+    Requests beyond those limits fail immediately with Overloaded instead of
+    piling up. Inference runs on a dedicated thread pool so the event loop
+    stays free to accept (and shed) requests while models are busy.
+    """
+    
+    def __init__(self, max_concurrency: int = 1, max_queue_depth: int = 32,
+                 max_queue_wait: float = 2.0, min_retry_after: int = 1):
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.max_queue_wait = max_queue_wait
+        self.min_retry_after = min_retry_after
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="inference")
+        self._waiters: deque = deque()
+        self._in_flight = 0
+        # Exponentially weighted service time, used to size Retry-After
+        self._service_time = 0.05
+        self._stats = {"admitted": 0, "shed_queue_full": 0, "shed_timeout": 0}
+    
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+    
+    def retry_after(self) -> int:
+        """Seconds until the current backlog is expected to drain"""
+        backlog = self.queue_depth + self._in_flight
+        return max(self.min_retry_after, math.ceil(backlog * self._service_time / self.max_concurrency))
+    
+    def _enqueue(self, waiter: asyncio.Future, **_):
+        self._waiters.append(waiter)
+    
+    def _dequeue(self) -> asyncio.Future:
+        return self._waiters.popleft()
+    
+    def _discard(self, waiter: asyncio.Future):
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+    
+    async def _acquire(self, **queue_args):
+        if self._in_flight < self.max_concurrency and not self.queue_depth:
+            self._in_flight += 1
+            return
+        
+        if self.queue_depth >= self.max_queue_depth:
+            self._stats["shed_queue_full"] += 1
+            raise Overloaded("Prediction queue is full", self.retry_after())
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self._enqueue(waiter, **queue_args)
+        try:
+            # The slot is transferred to us by _release(), so _in_flight is already counted
+            await asyncio.wait_for(waiter, timeout=self.max_queue_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # _release() handed us the slot just before the timeout or disconnect; pass it on
+                self._release()
+            else:
+                self._discard(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._stats["shed_timeout"] += 1
+            raise Overloaded("Timed out waiting for an inference slot", self.retry_after())
+    
+    def _release(self):
+        # Hand the slot directly to the next live waiter, if any
+        while self.queue_depth:
+            waiter = self._dequeue()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._in_flight -= 1
+    
+    async def run(self, fn: Callable, *args, **queue_args) -> Any:
+        """Run fn(*args) on the inference pool once admitted; raises Overloaded when shed"""
+        await self._acquire(**queue_args)
+        self._stats["admitted"] += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._service_time = 0.9 * self._service_time + 0.1 * elapsed
+            self._release()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+            "max_concurrency": self.max_concurrency,
+            "max_queue_depth": self.max_queue_depth,
+            "max_queue_wait_ms": round(self.max_queue_wait * 1000),
+            "avg_service_time_ms": round(self._service_time * 1000, 2),
+            **self._stats
+        }
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class PriorityAdmissionController(AdmissionController):
+    """
+    Admission controller that dispatches queued requests by acuity instead of FIFO.
+    
+    Each request carries a priority in [0, 1] (the rule-based risk score). It is
+    queued as if it had arrived priority * aging seconds earlier, so a critical
+    patient overtakes stable ones that arrived up to `aging` seconds before it,
+    while a stable request is never overtaken by anything arriving more than
+    `aging` seconds after it (starvation bound). aging must be below
+    max_queue_wait, or stable requests time out before the bound applies.
+    """
+    
+    def __init__(self, *args, aging: float = 0.5, **kwargs):
+        super().__init__(*args, **kwargs)
+        if aging >= self.max_queue_wait:
+            raise ValueError(
+                f"Priority aging ({aging * 1000:.0f} ms) must be below the max queue wait "
+                f"({self.max_queue_wait * 1000:.0f} ms), or low-acuity requests are shed before they can be dispatched"
+            )
+        self.aging = aging
+        self._waiters: list = []
+        self._entries: Dict[asyncio.Future, list] = {}
+        # Live entries in arrival order, to tell when dispatch overtakes an earlier arrival
+        self._arrivals: deque = deque()
+        self._sequence = itertools.count()
+        self._stats["reordered"] = 0
+    
+    @property
+    def queue_depth(self) -> int:
+        return len(self._entries)
+    
+    def _enqueue(self, waiter: asyncio.Future, priority: float = 0.0, **_):
+        arrival = time.monotonic()
+        entry = [arrival - min(max(priority, 0.0), 1.0) * self.aging, next(self._sequence), arrival, waiter]
+        self._entries[waiter] = entry
+        heapq.heappush(self._waiters, entry)
+        self._arrivals.append(entry)
+    
+    def _dequeue(self) -> asyncio.Future:
+        while True:
+            entry = heapq.heappop(self._waiters)
+            _, _, arrival, waiter = entry
+            # Discarded entries are left in the heap with no waiter
+            if waiter is None:
+                continue
+            del self._entries[waiter]
+            entry[3] = None
+            # Dispatched or discarded entries are dropped from the front lazily
+            while self._arrivals and self._arrivals[0][3] is None:
+                self._arrivals.popleft()
+            if self._arrivals and self._arrivals[0][2] < arrival:
+                self._stats["reordered"] += 1
+            return waiter
+    
+    def _discard(self, waiter: asyncio.Future):
+        entry = self._entries.pop(waiter, None)
+        if entry is not None:
+            entry[3] = None
+        if not self._entries:
+            self._waiters.clear()
+            self._arrivals.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "scheduler": "priority", "aging_ms": round(self.aging * 1000)}
@@ -0,0 +1,250 @@
+"""
+Prediction Audit Log
+Append-only record of every prediction, buffered in memory and written in compressed batches by a background thread
+"""
+import atexit
+import gzip
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+
+class AuditLog:
+    """
+    Bounded in-memory buffer drained by a writer thread into rotating segments.
+    
+    log() only appends to the buffer; the writer wakes every flush_interval
+    (or once batch_size records are waiting) and appends the batch to the
+    current segment as one gzip member, then fsyncs. Concatenated members are
+    a valid gzip stream, so a crash loses at most the unflushed tail and every
+    segment stays readable with gzip.open. Segments rotate past segment_max_mb
+    of uncompressed records or segment_max_age seconds.
+    
+    When the buffer is full the overflow policy applies: "block" waits up to
+    block_timeout for space before dropping (one deadline per log() or
+    log_many() call, however many records it has), "drop_oldest" evicts the oldest
+    buffered record and "drop_newest" discards the new one. Drops are counted
+    and written to the log as a gap record, so the trail shows what is missing.
+    """
+    
+    def __init__(self, directory: str, buffer_size: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 1.0, segment_max_mb: float = 64, segment_max_age: float = 3600,
+                 overflow: str = "block", block_timeout: float = 0.05, compresslevel: int = 6):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {', '.join(OVERFLOW_POLICIES)}")
+        self.directory = directory
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.segment_max_bytes = int(segment_max_mb * 1024 * 1024)
+        self.segment_max_age = segment_max_age
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.compresslevel = compresslevel
+        
+        self._buffer: deque = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._segment = None
+        self._segment_path: Optional[str] = None
+        self._segment_bytes = 0
+        self._segment_opened = 0.0
+        self._segment_seq = 0
+        self._pending_drops = 0
+        self.stats = {
+            "logged": 0, "written": 0, "dropped": 0, "batches": 0,
+            "segments": 0, "write_errors": 0, "blocked": 0
+        }
+    
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def log(self, record: Dict[str, Any]) -> bool:
+        """Buffer one record; returns False if it was dropped by the overflow policy"""
+        return self.log_many([record]) == 1
+    
+    def log_many(self, records: List[Dict[str, Any]]) -> int:
+        """Buffer several records under one lock; returns how many were accepted"""
+        accepted = 0
+        deadline = None
+        with self._cond:
+            if self._closed:
+                self.stats["dropped"] += len(records)
+                return 0
+            for record in records:
+                if len(self._buffer) >= self.buffer_size and deadline is None:
+                    # One block_timeout for the whole call, so a large batch can't stall for one per record
+                    deadline = time.monotonic() + self.block_timeout
+                if len(self._buffer) >= self.buffer_size and not self._make_room(deadline):
+                    self._pending_drops += 1
+                    self.stats["dropped"] += 1
+                    continue
+                self._buffer.append(record)
+                accepted += 1
+            self.stats["logged"] += accepted
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+        return accepted
+    
+    def _make_room(self, deadline: float) -> bool:
+        """Apply the overflow policy to a full buffer (lock held); True if there is now space"""
+        if self.overflow == "drop_oldest":
+            self._buffer.popleft()
+            self._pending_drops += 1
+            self.stats["dropped"] += 1
+            return True
+        if self.overflow == "block":
+            if time.monotonic() >= deadline:
+                return False
+            self.stats["blocked"] += 1
+            self._cond.notify_all()
+            while len(self._buffer) >= self.buffer_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return len(self._buffer) < self.buffer_size
+        return False
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._buffer) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                batch = [self._buffer.popleft() for _ in range(min(len(self._buffer), self.batch_size))]
+                drops, self._pending_drops = self._pending_drops, 0
+                closing = self._closed and not self._buffer
+                # Wake producers blocked on a full buffer
+                self._cond.notify_all()
+            if drops:
+                batch.append({"type": "gap", "timestamp": _timestamp(time.time()), "dropped_records": drops})
+            if batch:
+                self._write(batch)
+            if closing:
+                return
+    
+    def _write(self, batch: List[Dict[str, Any]]):
+        data = "".join(json.dumps(record, default=str, separators=(",", ":")) + "\n" for record in batch).encode()
+        try:
+            self._rotate_if_needed(len(data))
+            self._segment.write(gzip.compress(data, compresslevel=self.compresslevel))
+            self._segment.flush()
+            os.fsync(self._segment.fileno())
+            self._segment_bytes += len(data)
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+        except OSError as e:
+            self.stats["write_errors"] += 1
+            print(f"⚠️ Audit log write failed ({len(batch)} records lost): {e}")
+    
+    def _rotate_if_needed(self, incoming: int):
+        now = time.time()
+        if self._segment is not None and (
+            self._segment_bytes + incoming <= self.segment_max_bytes
+            and now - self._segment_opened < self.segment_max_age
+        ):
+            return
+        self._close_segment()
+        self._segment_seq += 1
+        name = f"audit-{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(now))}-{os.getpid()}-{self._segment_seq:04d}.ndjson.gz"
+        self._segment_path = os.path.join(self.directory, name)
+        self._segment = open(self._segment_path, "ab")
+        self._segment_bytes = 0
+        self._segment_opened = now
+        self.stats["segments"] += 1
+        _fsync_directory(self.directory)
+    
+    def _close_segment(self):
+        if self._segment is not None:
+            self._segment.flush()
+            os.fsync(self._segment.fileno())
+            self._segment.close()
+            self._segment = None
+    
+    def close(self, timeout: float = 10.0):
+        """Stop accepting records, write everything buffered and fsync the segment"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                print(f"⚠️ Audit log writer did not finish within {timeout}s; {len(self._buffer)} records unwritten")
+                return
+        try:
+            self._close_segment()
+        except OSError as e:
+            print(f"⚠️ Audit log close failed: {e}")
+    
+    def report(self) -> Dict[str, Any]:
+        with self._cond:
+            buffered = len(self._buffer)
+        return {
+            "directory": os.path.abspath(self.directory),
+            "current_segment": os.path.basename(self._segment_path) if self._segment_path else None,
+            "buffered": buffered,
+            "buffer_size": self.buffer_size,
+            "overflow_policy": self.overflow,
+            "closed": self._closed,
+            **self.stats
+        }
+
+
+def prediction_record(endpoint: str, inputs: Dict[str, Any], result: Dict[str, Any],
+                      latency: Dict[str, float], **context) -> Dict[str, Any]:
+    """Audit record for one scored patient (result is a predictor output dict or result row)"""
+    return {
+        "type": "prediction",
+        "timestamp": _timestamp(time.time()),
+        "endpoint": endpoint,
+        **context,
+        "model_version": result.get("model_version"),
+        "inputs": inputs,
+        "needs_icu": result.get("needs_icu"),
+        "risk_score": result.get("risk_score"),
+        "risk_level": result.get("risk_level"),
+        "confidence": result.get("confidence"),
+        "xgboost_score": result.get("xgboost_score"),
+        "lstm_score": result.get("lstm_score"),
+        "lstm_skipped": result.get("lstm_skipped", False),
+        "degraded": result.get("degraded", False),
+        "latency_ms": {name: round(seconds * 1000, 3) for name, seconds in latency.items()}
+    }
+
+
+def _timestamp(seconds: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds)) + f".{int(seconds % 1 * 1000):03d}Z"
+
+
+def _fsync_directory(directory: str):
+    """Make a newly created segment's directory entry durable (no-op where unsupported)"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def read_audit_log(directory: str):
+    """Yield records from all segments in a directory, oldest segment first"""
+    for name in sorted(os.listdir(directory)):
+        if name.startswith("audit-") and name.endswith(".ndjson.gz"):
+            with gzip.open(os.path.join(directory, name), "rt", encoding="utf-8") as f:
+                for line in f:
+                    yield json.loads(line)
@@ -0,0 +1,188 @@
+"""
+Batch Scoring
+Chunked CSV/NDJSON parsing, vectorized validation and streamed result encoding for bulk uploads
+"""
+import io
+import json
+import tempfile
+import time
+from itertools import islice
+from typing import Any, AsyncIterator, Callable, Dict, IO, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .admission import Overloaded
+
+RESULT_COLUMNS = [
+    "row", "needs_icu", "risk_score", "risk_level", "confidence",
+    "xgboost_score", "lstm_score", "lstm_skipped", "error"
+]
+
+
+class VitalsValidator:
+    """
+    Column-wise equivalent of validating each row with a pydantic model.
+    
+    Numeric fields are coerced with pd.to_numeric and range-checked as whole
+    columns; optional fields may be missing. Rows failing any
+    check are split off with an error message instead of raising.
+    """
+    
+    def __init__(self, bounds: Dict[str, tuple], integers: List[str], required: List[str], defaults: Dict[str, Any]):
+        self.bounds = bounds
+        self.integers = set(integers)
+        self.required = required
+        self.defaults = defaults
+    
+    @classmethod
+    def from_model(cls, model) -> "VitalsValidator":
+        """Derive bounds, required fields and defaults from a pydantic model's Field constraints"""
+        bounds, integers, required, defaults = {}, [], [], {}
+        for name, field in model.model_fields.items():
+            low = next((m.ge for m in field.metadata if hasattr(m, "ge")), None)
+            high = next((m.le for m in field.metadata if hasattr(m, "le")), None)
+            if low is not None or high is not None:
+                bounds[name] = (-np.inf if low is None else low, np.inf if high is None else high)
+            if int in (field.annotation, *getattr(field.annotation, "__args__", ())):
+                integers.append(name)
+            if field.is_required():
+                required.append(name)
+            else:
+                defaults[name] = field.default
+        return cls(bounds, integers, required, defaults)
+    
+    def validate(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        Validate a chunk of raw rows.
+        
+        Returns:
+            frame with the coerced fields plus an 'error' column (None for valid rows)
+        """
+        n = len(frame)
+        clean = pd.DataFrame(index=frame.index)
+        problems = {}
+        
+        for name in self.required + list(self.defaults):
+            raw = frame[name] if name in frame else pd.Series(np.nan, index=frame.index)
+            if name in self.bounds:
+                values = pd.to_numeric(raw, errors="coerce")
+                low, high = self.bounds[name]
+                # Optional fields may be absent (left NaN for the predictor to default-fill)
+                missing_ok = raw.isna() if name in self.defaults else pd.Series(False, index=frame.index)
+                bad = (values.isna() & ~missing_ok) | (values < low) | (values > high)
+                if name in self.integers:
+                    bad |= values.notna() & (values % 1 != 0)
+                clean[name] = values.astype(np.float64)
+            else:
+                values = raw if name not in self.defaults else raw.fillna(self.defaults[name])
+                bad = values.isna()
+                clean[name] = values
+            problems[name] = bad.to_numpy()
+        
+        names = list(problems)
+        bad_matrix = np.column_stack([problems[name] for name in names]) if names else np.zeros((n, 0), dtype=bool)
+        errors = np.full(n, None, dtype=object)
+        for i in np.flatnonzero(bad_matrix.any(axis=1)).tolist():
+            fields = [names[j] for j in np.flatnonzero(bad_matrix[i]).tolist()]
+            errors[i] = "Missing or out-of-range: " + ", ".join(fields)
+        clean["error"] = errors
+        return clean
+
+
+async def spool_upload(stream: AsyncIterator[bytes], max_memory: int) -> IO[bytes]:
+    """Copy a request body stream into a temp file that only spills to disk past max_memory bytes"""
+    upload = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    async for block in stream:
+        upload.write(block)
+    upload.seek(0)
+    return upload
+
+
+def iter_csv_chunks(upload: IO[bytes], chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """CSV chunks indexed by 1-based data row number"""
+    reader = pd.read_csv(upload, chunksize=chunk_rows, skipinitialspace=True)
+    for chunk in reader:
+        chunk.index = chunk.index + 1
+        yield chunk
+
+
+def iter_ndjson_chunks(upload: IO[bytes], chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """NDJSON chunks indexed by 1-based line number; unparseable lines become rows with only '_parse_error'"""
+    lines = io.TextIOWrapper(upload, encoding="utf-8")
+    line_number = 0
+    while True:
+        block = list(islice(lines, chunk_rows))
+        if not block:
+            return
+        records, index = [], []
+        for line in block:
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as e:
+                record = {"_parse_error": f"Invalid JSON: {e}"}
+            records.append(record)
+            index.append(line_number)
+        if records:
+            yield pd.DataFrame.from_records(records, index=index)
+
+
+def encode_results(results: pd.DataFrame, output: str, header: bool) -> bytes:
+    """Serialize a result chunk as NDJSON lines or CSV rows"""
+    results = results[RESULT_COLUMNS]
+    if output == "csv":
+        return results.to_csv(index=False, header=header).encode()
+    return results.to_json(orient="records", lines=True).rstrip("\n").encode() + b"\n"
+
+
+def stream_scores(chunks: Iterator[pd.DataFrame], validator: VitalsValidator,
+                  predict_batch: Callable[[pd.DataFrame], pd.DataFrame], output: str = "ndjson",
+                  upload: Optional[IO[bytes]] = None,
+                  on_scored: Optional[Callable[[pd.DataFrame, pd.DataFrame, float], None]] = None) -> Iterator[bytes]:
+    """
+    Validate and score each chunk, yielding encoded results in input order.
+    
+    predict_batch must return a frame indexed like its input. Only one chunk
+    is held in memory at a time. A parse failure ends the stream
+    with a final error record; the spooled upload is closed when done.
+    on_scored(inputs, results, seconds) is called with each chunk's valid rows.
+    """
+    first = True
+    try:
+        for chunk in chunks:
+            clean = validator.validate(chunk)
+            if "_parse_error" in chunk:
+                parse_errors = chunk["_parse_error"]
+                clean["error"] = parse_errors.where(parse_errors.notna(), clean["error"])
+            
+            valid = clean["error"].isna()
+            if valid.any():
+                started = time.perf_counter()
+                scored = predict_batch(clean[valid])
+                if on_scored is not None:
+                    on_scored(clean[valid], scored, time.perf_counter() - started)
+                results = scored.reindex(clean.index)
+            else:
+                results = pd.DataFrame(index=clean.index, columns=RESULT_COLUMNS[1:-1])
+            results["error"] = clean["error"]
+            results.insert(0, "row", clean.index)
+            
+            yield encode_results(results, output, header=first)
+            first = False
+    except (ValueError, pd.errors.ParserError) as e:
+        error = pd.DataFrame([{"error": f"Scoring stopped: {e}"}], columns=RESULT_COLUMNS)
+        yield encode_results(error, output, header=first)
+    except Overloaded as e:
+        error = pd.DataFrame(
+            [{"error": f"Scoring stopped: service overloaded ({e.reason}); retry after {e.retry_after}s"}],
+            columns=RESULT_COLUMNS
+        )
+        yield encode_results(error, output, header=first)
+    finally:
+        if upload is not None:
+            upload.close()
@@ -0,0 +1,385 @@
+"""
+Shared-Memory Inference Pool
+Worker processes that each hold a loaded predictor and exchange feature batches and scores through shared memory
+"""
+import multiprocessing
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .shadow import RISK_BANDS, latency_summary
+
+# Slot input columns, float64; gender is 1.0 for male, and NaN marks a value that was not supplied
+POOL_INPUTS = [
+    "age", "gender", "heart_rate", "systolic_blood_pressure", "diastolic_blood_pressure",
+    "oxygen_saturation", "temperature", "respiratory_rate", "gcs_score", "lactate_level",
+    # Model features a cohort export may supply directly (see _prepare_feature_frame)
+    "GCS_first", "Lactate_first", "SAPS-I"
+]
+DIRECT_FEATURES = ["GCS_first", "Lactate_first", "SAPS-I"]
+
+# Slot output columns written back by the worker (lstm_score NaN when skipped, flags 0/1,
+# risk_band an index into RISK_BANDS)
+POOL_OUTPUTS = ["risk_score", "confidence", "xgboost_score", "lstm_score", "lstm_skipped", "needs_icu", "risk_band"]
+
+# Control messages over each worker's pipe; only these few bytes cross it per batch
+REQUEST = struct.Struct("=ii")    # slot, rows (an empty message stops the worker)
+REPLY = struct.Struct("=iid")     # slot (-1: model loaded), status (0 ok), worker seconds
+READY_SLOT = -1
+
+
+def _slot_views(buffer, slots: int, max_batch: int):
+    """(inputs, outputs) arrays of shape (slots, max_batch, columns) over a worker's shared block"""
+    inputs = np.ndarray((slots, max_batch, len(POOL_INPUTS)), dtype=np.float64, buffer=buffer)
+    outputs = np.ndarray((slots, max_batch, len(POOL_OUTPUTS)), dtype=np.float64, buffer=buffer, offset=inputs.nbytes)
+    return inputs, outputs
+
+
+def _block_size(slots: int, max_batch: int) -> int:
+    return slots * max_batch * (len(POOL_INPUTS) + len(POOL_OUTPUTS)) * 8
+
+
+def _remaining(deadline: float) -> float:
+    return max(0.0, deadline - time.monotonic())
+
+
+def _pool_worker(index: int, artifact_paths: Dict[str, Optional[str]], shm_name: str,
+                 slots: int, max_batch: int, conn, cpus: float):
+    """Worker process: load the model once, then score the slots named on the pipe in place"""
+    from utils.threads import ThreadBudget
+    
+    # Each worker gets its share of the CPUs, as a single-request server would
+    budget = ThreadBudget(cpu_limit=cpus)
+    budget.apply()
+    from models.predictor import ICUPredictor
+    predictor = ICUPredictor(**artifact_paths)
+    budget.configure_predictor(predictor)
+    # Drift is recorded by the serving process, which sees every pooled batch
+    predictor.drift_monitor = None
+    
+    # Attaching registers the block with the resource tracker spawned children share with the
+    # serving process, which owns the block and unlinks it on shutdown
+    block = shared_memory.SharedMemory(name=shm_name)
+    inputs, outputs = _slot_views(block.buf, slots, max_batch)
+    conn.send_bytes(REPLY.pack(READY_SLOT, 0, 0.0))
+    
+    try:
+        while True:
+            try:
+                message = conn.recv_bytes()
+            except EOFError:
+                break
+            if not message:
+                break
+            slot, rows = REQUEST.unpack(message)
+            started = time.perf_counter()
+            status = 0
+            try:
+                frame = pd.DataFrame(inputs[slot, :rows], columns=POOL_INPUTS, copy=False)
+                frame["gender"] = np.where(frame["gender"] == 1, "Male", "Female")
+                # An all-NaN direct feature would override the value derived from the vitals
+                frame = frame.drop(columns=[col for col in DIRECT_FEATURES if frame[col].isna().all()])
+                # Unrounded, so single-patient results (and their summaries) match predict()
+                results = predictor.predict_batch(frame, round_scores=False)
+                results["risk_band"] = results["risk_level"].map(RISK_BANDS.index)
+                out = outputs[slot, :rows]
+                for j, column in enumerate(POOL_OUTPUTS):
+                    out[:, j] = results[column].to_numpy(dtype=np.float64)
+            except Exception as e:
+                status = 1
+                print(f"Inference pool worker {index} error: {e}")
+            conn.send_bytes(REPLY.pack(slot, status, time.perf_counter() - started))
+    finally:
+        del inputs, outputs
+        block.close()
+
+
+class _WorkerRing:
+    """Front-end state of one worker: its shared block, free slots and the futures waiting on busy ones"""
+    
+    def __init__(self, index: int, slots: int, max_batch: int):
+        self.index = index
+        self.block = shared_memory.SharedMemory(create=True, size=_block_size(slots, max_batch))
+        self.inputs, self.outputs = _slot_views(self.block.buf, slots, max_batch)
+        self.free = deque(range(slots))
+        self.pending: List[Optional[Future]] = [None] * slots
+        self.rows = [0] * slots
+        self.submitted = [0.0] * slots
+        self.process = None
+        self.conn = None
+        self.reader = None
+        self.ready = False
+        self.send_lock = threading.Lock()
+        self.batches = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+    
+    @property
+    def available(self) -> bool:
+        return self.ready and self.process is not None and self.process.is_alive()
+
+
+class InferencePool:
+    """
+    Scores batches in worker processes, each holding its own loaded predictor,
+    so XGBoost, sklearn and Keras work runs outside the serving process's GIL.
+    
+    Every worker has one preallocated shared-memory block split into slots of
+    max_batch rows. The serving process writes feature columns straight into a
+    free slot, sends the worker only (slot, rows) over a pipe, and the worker
+    writes its scores back into the same slot; no request dicts or frames are
+    pickled. A reader thread per worker resolves the waiting futures and
+    returns slots to the free ring. Batches go to the worker with the fewest in
+    flight and callers wait for a slot when all are busy. A batch the pool
+    has not answered within timeout seconds (slot wait included) is scored
+    in the serving process instead, so a stuck worker can't hold a request.
+    
+    While a worker scores a batch, the calling thread records its inputs in
+    the serving process's drift monitor, so /model/drift covers pooled traffic.
+    """
+    
+    def __init__(self, model, workers: int = 2, slots: int = 4, max_batch: int = 5000, cpus: float = 0,
+                 timeout: float = 10.0):
+        self.model = model
+        self.timeout = timeout
+        self.workers = max(1, workers)
+        self.slots = max(1, slots)
+        self.max_batch = max(1, max_batch)
+        self.cpus_per_worker = max(1.0, cpus / self.workers) if cpus else 1.0
+        self._rings: List[_WorkerRing] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._round_trips = deque(maxlen=2048)
+        self._stats = {"batches": 0, "rows": 0, "errors": 0, "slot_waits": 0, "timeouts": 0}
+    
+    def start(self):
+        """Allocate the shared blocks and spawn the workers (from app startup, not at import)"""
+        bundle_path, model_path, scaler_path, feature_list_path = self.model.artifact_paths
+        artifact_paths = {
+            "bundle_path": bundle_path,
+            "model_path": model_path,
+            "scaler_path": scaler_path,
+            "feature_list_path": feature_list_path,
+            "model_version": self.model.model_version
+        }
+        context = multiprocessing.get_context("spawn")
+        for index in range(self.workers):
+            ring = _WorkerRing(index, self.slots, self.max_batch)
+            ring.conn, child_conn = context.Pipe()
+            ring.process = context.Process(
+                target=_pool_worker,
+                args=(index, artifact_paths, ring.block.name, self.slots, self.max_batch, child_conn, self.cpus_per_worker),
+                name=f"inference-pool-{index}",
+                daemon=True
+            )
+            self._rings.append(ring)
+            ring.process.start()
+            child_conn.close()
+            ring.reader = threading.Thread(target=self._read_replies, args=(ring,), name=f"inference-pool-reader-{index}", daemon=True)
+            ring.reader.start()
+    
+    @property
+    def running(self) -> bool:
+        """True once at least one worker has loaded its model and is alive"""
+        return any(ring.available for ring in self._rings)
+    
+    def _acquire(self, timeout: Optional[float]):
+        """Reserve a free slot on the least busy worker; returns (ring, slot, future)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            waited = False
+            while True:
+                if self._closed:
+                    raise RuntimeError("Inference pool is shut down")
+                candidates = [ring for ring in self._rings if ring.available]
+                if not candidates:
+                    raise RuntimeError("No inference pool workers available")
+                candidates = [ring for ring in candidates if ring.free]
+                if candidates:
+                    ring = min(candidates, key=lambda r: self.slots - len(r.free))
+                    slot = ring.free.popleft()
+                    future = Future()
+                    ring.pending[slot] = future
+                    return ring, slot, future
+                if not waited:
+                    self._stats["slot_waits"] += 1
+                    waited = True
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("Timed out waiting for a free inference pool slot")
+                self._cond.wait(remaining)
+    
+    def _submit(self, patients: pd.DataFrame, timeout: Optional[float]) -> Future:
+        """Write up to max_batch patients into a slot and hand it to the worker"""
+        ring, slot, future = self._acquire(timeout)
+        rows = len(patients)
+        try:
+            view = ring.inputs[slot, :rows]
+            for j, column in enumerate(POOL_INPUTS):
+                if column == "gender":
+                    gender = patients["gender"] if "gender" in patients else pd.Series("", index=patients.index)
+                    view[:, j] = (gender.astype(str).str.lower() == "male").to_numpy(dtype=np.float64)
+                elif column in patients:
+                    view[:, j] = patients[column].to_numpy(dtype=np.float64, na_value=np.nan)
+                else:
+                    view[:, j] = np.nan
+            ring.rows[slot] = rows
+            ring.submitted[slot] = time.perf_counter()
+            with ring.send_lock:
+                ring.conn.send_bytes(REQUEST.pack(slot, rows))
+        except OSError as e:
+            self._release(ring, slot)
+            raise RuntimeError(f"Inference pool worker {ring.index} is gone: {e}")
+        except BaseException:
+            # e.g. a column that isn't numeric: the slot was never handed to the worker
+            self._release(ring, slot)
+            raise
+        return future
+    
+    def _release(self, ring: _WorkerRing, slot: int):
+        with self._cond:
+            ring.pending[slot] = None
+            ring.free.append(slot)
+            self._cond.notify()
+    
+    def _read_replies(self, ring: _WorkerRing):
+        """Reader thread: copy finished scores out of their slot, resolve the future, free the slot"""
+        while True:
+            try:
+                slot, status, seconds = REPLY.unpack(ring.conn.recv_bytes())
+            except (EOFError, OSError):
+                break
+            if slot == READY_SLOT:
+                with self._cond:
+                    ring.ready = True
+                    self._cond.notify_all()
+                continue
+            
+            future = ring.pending[slot]
+            rows = ring.rows[slot]
+            round_trip = time.perf_counter() - ring.submitted[slot]
+            ring.batches += 1
+            ring.busy_seconds += seconds
+            if status == 0:
+                result = ring.outputs[slot, :rows].copy()
+            else:
+                ring.errors += 1
+            with self._cond:
+                self._stats["batches"] += 1
+                self._stats["rows"] += rows
+                self._stats["errors"] += status != 0
+                self._round_trips.append(round_trip)
+            self._release(ring, slot)
+            if status == 0:
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(f"Inference pool worker {ring.index} failed to score the batch"))
+        
+        # Worker exited: fail whatever it still held
+        with self._cond:
+            ring.ready = False
+            orphaned = [future for future in ring.pending if future is not None]
+            ring.pending = [None] * self.slots
+            self._cond.notify_all()
+        for future in orphaned:
+            future.set_exception(RuntimeError(f"Inference pool worker {ring.index} exited"))
+    
+    def _timed_out(self, rows: int):
+        with self._cond:
+            self._stats["timeouts"] += 1
+        print(f"⚠️ Inference pool did not answer within {self.timeout}s; scoring {rows} row(s) in-process")
+    
+    def predict_batch(self, patients: pd.DataFrame, timeout: Optional[float] = None) -> pd.DataFrame:
+        """ICUPredictor.predict_batch, scored in the pool in slices of max_batch rows"""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        try:
+            futures = [
+                self._submit(patients.iloc[start:start + self.max_batch], _remaining(deadline))
+                for start in range(0, len(patients), self.max_batch)
+            ]
+            scores = [future.result(_remaining(deadline)) for future in futures]
+        except (TimeoutError, FutureTimeoutError):
+            self._timed_out(len(patients))
+            return self.model.predict_batch(patients)
+        self.model.observe_batch(patients)
+        scores = np.concatenate(scores) if scores else np.empty((0, len(POOL_OUTPUTS)))
+        results = pd.DataFrame(scores, columns=POOL_OUTPUTS, index=patients.index)
+        return pd.DataFrame({
+            "needs_icu": results["needs_icu"].astype(bool),
+            "risk_score": results["risk_score"].round(4),
+            "risk_level": np.asarray(RISK_BANDS)[results["risk_band"].to_numpy(dtype=np.int64)],
+            "confidence": results["confidence"].round(4),
+            "xgboost_score": results["xgboost_score"].round(4),
+            "lstm_score": results["lstm_score"].round(4),
+            "lstm_skipped": results["lstm_skipped"].astype(bool)
+        }, index=patients.index)
+    
+    def predict(self, patient_data: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """ICUPredictor.predict for one patient, scored in the pool"""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        patients = pd.DataFrame([patient_data])
+        try:
+            scores = self._submit(patients, _remaining(deadline)).result(_remaining(deadline))[0]
+        except (TimeoutError, FutureTimeoutError):
+            self._timed_out(1)
+            return self.model.predict(patient_data)
+        self.model.observe_batch(patients)
+        return self.model.result_from_batch(patient_data, dict(zip(POOL_OUTPUTS, scores)))
+    
+    def report(self) -> Dict[str, Any]:
+        with self._cond:
+            workers = [
+                {
+                    "worker": ring.index,
+                    "pid": ring.process.pid if ring.process else None,
+                    "ready": ring.ready,
+                    "alive": ring.process is not None and ring.process.is_alive(),
+                    "slots_in_use": self.slots - len(ring.free),
+                    "batches": ring.batches,
+                    "errors": ring.errors,
+                    "busy_seconds": round(ring.busy_seconds, 3)
+                }
+                for ring in self._rings
+            ]
+            round_trips = list(self._round_trips)
+            stats = dict(self._stats)
+        return {
+            "running": self.running,
+            "slots_per_worker": self.slots,
+            "max_batch_rows": self.max_batch,
+            "shared_memory_mb": round(len(self._rings) * _block_size(self.slots, self.max_batch) / (1024 * 1024), 2),
+            "cpus_per_worker": self.cpus_per_worker,
+            **stats,
+            "round_trip": latency_summary(round_trips),
+            "workers": workers
+        }
+    
+    def shutdown(self, timeout: float = 5.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for ring in self._rings:
+            try:
+                with ring.send_lock:
+                    ring.conn.send_bytes(b"")
+            except OSError:
+                pass
+        for ring in self._rings:
+            ring.process.join(timeout)
+            if ring.process.is_alive():
+                ring.process.terminate()
+                ring.process.join(timeout)
+            ring.conn.close()
+            if ring.reader is not None:
+                ring.reader.join(timeout)
+            # Views must go before the block can be closed
+            ring.inputs = ring.outputs = None
+            ring.block.close()
+            ring.block.unlink()
@@ -0,0 +1,303 @@
+"""
+Memory Allocation Tracking
+On-demand tracemalloc heap snapshots and diffs, and sampled per-stage allocation counters for requests
+"""
+import contextvars
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+SERVICE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GROUPINGS = ("module", "lineno", "filename", "traceback")
+
+# Allocations made by the tracking machinery itself
+_IGNORED = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>")
+]
+
+
+def resident_bytes() -> Optional[int]:
+    """Resident set size of this process (Linux /proc), or None where unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def module_of(filename: str) -> str:
+    """Group a source file by owner: the top-level package for installed code, the dotted module for service code"""
+    if filename.startswith("<"):
+        # <frozen ...>, <string>: no file to attribute
+        return filename
+    path = os.path.abspath(filename)
+    for marker in ("site-packages", "dist-packages"):
+        _, found, rest = path.partition(os.sep + marker + os.sep)
+        if found:
+            return rest.split(os.sep, 1)[0].split(".", 1)[0]
+    if path.startswith(SERVICE_ROOT + os.sep):
+        return os.path.splitext(os.path.relpath(path, SERVICE_ROOT))[0].replace(os.sep, ".")
+    if path.startswith(os.path.dirname(os.__file__) + os.sep):
+        return "stdlib:" + os.path.splitext(os.path.relpath(path, os.path.dirname(os.__file__)).split(os.sep, 1)[0])[0]
+    return filename
+
+
+def _mb(size: int) -> float:
+    return round(size / (1024 * 1024), 3)
+
+
+class HeapTracker:
+    """
+    tracemalloc snapshots and diffs, taken on demand.
+    
+    Tracing is off until start() (it slows every allocation while on); the
+    last max_snapshots snapshots are kept for diffing. Python objects and numpy
+    buffers are traced; memory allocated natively by XGBoost or TensorFlow is
+    not, so every snapshot also records RSS and the untraced remainder.
+    """
+    
+    def __init__(self, max_snapshots: int = 4):
+        self.max_snapshots = max_snapshots
+        self._snapshots: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+    
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+    
+    def start(self, frames: int = 1) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        return self.status()
+    
+    def stop(self) -> Dict[str, Any]:
+        """Stop tracing; drops the traces, so kept snapshots can only be diffed against each other"""
+        tracemalloc.stop()
+        return self.status()
+    
+    def _capture(self, label: Optional[str], snapshot_id: Optional[int]) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("Allocation tracing is off; start it first")
+        snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+        traced, peak = tracemalloc.get_traced_memory()
+        return {
+            "id": snapshot_id,
+            "label": label,
+            "taken_at": time.time(),
+            "traced_mb": _mb(traced),
+            "traced_peak_mb": _mb(peak),
+            "rss_mb": _mb(resident_bytes() or 0),
+            "snapshot": snapshot
+        }
+    
+    def take_snapshot(self, label: Optional[str] = None) -> Dict[str, Any]:
+        entry = self._capture(label, next(self._ids))
+        with self._lock:
+            self._snapshots[entry["id"]] = entry
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return self._describe(entry)
+    
+    def _get(self, snapshot_id: int) -> Dict[str, Any]:
+        with self._lock:
+            if snapshot_id not in self._snapshots:
+                raise KeyError(f"No snapshot {snapshot_id} (kept: {list(self._snapshots)})")
+            return self._snapshots[snapshot_id]
+    
+    def _describe(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in entry.items() if key != "snapshot"}
+    
+    def snapshots(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [self._describe(entry) for entry in self._snapshots.values()]
+    
+    def top(self, snapshot_id: int, group_by: str = "module", limit: int = 30) -> Dict[str, Any]:
+        """Largest allocation sites of one snapshot"""
+        entry = self._get(snapshot_id)
+        stats = self._statistics(entry["snapshot"], group_by)
+        return {
+            **self._describe(entry),
+            "group_by": group_by,
+            "top": [{"where": where, "size_mb": _mb(size), "count": count} for where, size, count in stats[:limit]]
+        }
+    
+    def diff(self, base_id: int, target_id: Optional[int] = None, group_by: str = "module", limit: int = 30) -> Dict[str, Any]:
+        """
+        Growth between two snapshots, largest first. Without a target the base is
+        compared with the heap now, through a snapshot that is not kept, so
+        repeated diffs against one base never evict it.
+        """
+        base = self._get(base_id)
+        target = self._get(target_id) if target_id is not None else self._capture("now", None)
+        before = {where: (size, count) for where, size, count in self._statistics(base["snapshot"], group_by)}
+        after = {where: (size, count) for where, size, count in self._statistics(target["snapshot"], group_by)}
+        
+        changes = []
+        for where in set(before) | set(after):
+            size_before, count_before = before.get(where, (0, 0))
+            size_after, count_after = after.get(where, (0, 0))
+            if size_after != size_before or count_after != count_before:
+                changes.append((where, size_after - size_before, count_after - count_before, size_after))
+        changes.sort(key=lambda change: abs(change[1]), reverse=True)
+        
+        traced_growth = target["traced_mb"] - base["traced_mb"]
+        rss_growth = target["rss_mb"] - base["rss_mb"]
+        return {
+            "base": self._describe(base),
+            "target": self._describe(target),
+            "group_by": group_by,
+            "traced_growth_mb": round(traced_growth, 3),
+            "rss_growth_mb": round(rss_growth, 3),
+            # RSS growth tracemalloc can't see: native allocations (XGBoost, TensorFlow) and fragmentation
+            "untraced_growth_mb": round(rss_growth - traced_growth, 3),
+            "top": [
+                {"where": where, "size_diff_mb": _mb(size_diff), "count_diff": count_diff, "size_mb": _mb(size)}
+                for where, size_diff, count_diff, size in changes[:limit]
+            ]
+        }
+    
+    def _statistics(self, snapshot: tracemalloc.Snapshot, group_by: str):
+        """(where, size, count) per group, largest first"""
+        if group_by not in GROUPINGS:
+            raise ValueError(f"group_by must be one of {', '.join(GROUPINGS)}")
+        if group_by == "module":
+            totals: Dict[str, List[int]] = {}
+            for stat in snapshot.statistics("filename"):
+                total = totals.setdefault(module_of(stat.traceback[0].filename), [0, 0])
+                total[0] += stat.size
+                total[1] += stat.count
+            stats = [(where, size, count) for where, (size, count) in totals.items()]
+        else:
+            stats = [
+                (" <- ".join(f"{frame.filename}:{frame.lineno}" for frame in stat.traceback), stat.size, stat.count)
+                for stat in snapshot.statistics(group_by)
+            ]
+        return sorted(stats, key=lambda stat: stat[1], reverse=True)
+    
+    def status(self) -> Dict[str, Any]:
+        traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        with self._lock:
+            kept = list(self._snapshots)
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_mb": _mb(traced),
+            "traced_peak_mb": _mb(peak),
+            "tracemalloc_overhead_mb": _mb(tracemalloc.get_tracemalloc_memory()),
+            "rss_mb": _mb(resident_bytes() or 0),
+            "snapshots": kept
+        }
+
+
+_sampled = contextvars.ContextVar("allocation_sampled", default=False)
+
+
+class AllocationAccounting:
+    """
+    Per-stage allocation counters for a sample of requests.
+    
+    request() decides once per request (sample_rate) whether its stages are
+    measured; stage() is a context-variable check for the others. A measured
+    stage records the change in live Python memory blocks and RSS, and, while
+    tracemalloc is tracing, the net traced bytes and the stage's peak. Counters
+    are process-wide, so with several requests in flight a stage can be
+    charged for its neighbours' allocations; averages over many samples still
+    show which stage retains memory.
+    """
+    
+    def __init__(self, sample_rate: float = 0.01):
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, Any]] = {}
+        self._requests = {"seen": 0, "sampled": 0}
+    
+    @contextmanager
+    def request(self):
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        token = _sampled.set(sampled)
+        try:
+            yield sampled
+        finally:
+            _sampled.reset(token)
+            with self._lock:
+                self._requests["seen"] += 1
+                self._requests["sampled"] += sampled
+    
+    @contextmanager
+    def stage(self, name: str):
+        if not _sampled.get():
+            yield
+            return
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            # Process-wide peak; snapshots report the peak since the last measured stage
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        blocks_before = sys.getallocatedblocks()
+        rss_before = resident_bytes() or 0
+        try:
+            yield
+        finally:
+            blocks = sys.getallocatedblocks() - blocks_before
+            rss = (resident_bytes() or 0) - rss_before
+            traced = peak = None
+            if tracing and tracemalloc.is_tracing():
+                current, peak_now = tracemalloc.get_traced_memory()
+                traced, peak = current - traced_before, peak_now - traced_before
+            self._record(name, blocks, rss, traced, peak)
+    
+    def _record(self, name: str, blocks: int, rss: int, traced: Optional[int], peak: Optional[int]):
+        with self._lock:
+            stats = self._stages.setdefault(name, {
+                "calls": 0, "blocks_net": 0, "rss_net": 0, "rss_grew": 0,
+                "traced_calls": 0, "traced_net": 0, "traced_peak_max": 0, "traced_peak_sum": 0
+            })
+            stats["calls"] += 1
+            stats["blocks_net"] += blocks
+            stats["rss_net"] += rss
+            stats["rss_grew"] += rss > 0
+            if traced is not None:
+                stats["traced_calls"] += 1
+                stats["traced_net"] += traced
+                stats["traced_peak_max"] = max(stats["traced_peak_max"], peak)
+                stats["traced_peak_sum"] += peak
+    
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+            self._requests = {"seen": 0, "sampled": 0}
+    
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {name: dict(stats) for name, stats in self._stages.items()}
+            requests = dict(self._requests)
+        report = {}
+        for name, stats in stages.items():
+            calls, traced_calls = stats["calls"], stats["traced_calls"]
+            report[name] = {
+                "sampled_calls": calls,
+                "blocks_net_per_call": round(stats["blocks_net"] / calls, 2),
+                "rss_net_kb_per_call": round(stats["rss_net"] / calls / 1024, 2),
+                "rss_grew_share": round(stats["rss_grew"] / calls, 3),
+                "traced_calls": traced_calls,
+                "traced_net_kb_per_call": round(stats["traced_net"] / traced_calls / 1024, 2) if traced_calls else None,
+                "traced_peak_kb_mean": round(stats["traced_peak_sum"] / traced_calls / 1024, 2) if traced_calls else None,
+                "traced_peak_kb_max": round(stats["traced_peak_max"] / 1024, 2) if traced_calls else None
+            }
+        return {
+            "sample_rate": self.sample_rate,
+            "tracing": tracemalloc.is_tracing(),
+            "requests": requests,
+            "stages": report
+        }
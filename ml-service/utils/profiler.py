@@ -0,0 +1,166 @@
+"""
+Sampling Profiler
+On-demand, low-overhead stack sampling across all service threads
+"""
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+# Leaf frames that mean a thread is parked rather than doing work
+IDLE_LEAVES = {
+    ("selectors", "select"),
+    ("threading", "wait"),
+    ("threading", "_wait_for_tstate_lock"),
+    ("queue", "get"),
+    ("concurrent.futures.thread", "_worker"),
+    ("asyncio.base_events", "_run_once"),
+}
+
+
+class SamplingProfiler:
+    """
+    Periodically snapshots every thread's Python stack via sys._current_frames()
+    and aggregates them into collapsed stacks ("a;b;c count"), ready for
+    flamegraph.pl / speedscope.
+    
+    Nothing runs while the profiler is off: the sampler thread only exists
+    during a session and record_request() is a single attribute check.
+    Time spent inside native code (XGBoost, Keras, BLAS) is attributed to
+    the Python frame that called into it.
+    """
+    
+    def __init__(self, max_stacks: int = 20000, max_depth: int = 64):
+        self.max_stacks = max_stacks
+        self.max_depth = max_depth
+        self.active = False
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._stacks: Counter = Counter()
+        self._samples = 0
+        self._dropped = 0
+        self._remaining_requests: Optional[int] = None
+        self._deadline: Optional[float] = None
+        self._interval = 0.005
+        self._include_idle = False
+        self._started_at: Optional[float] = None
+        self._stopped_at: Optional[float] = None
+    
+    def start(self, duration: Optional[float] = None, max_requests: Optional[int] = None,
+              interval: float = 0.005, include_idle: bool = False) -> Dict[str, Any]:
+        """Start a profiling session that ends after duration seconds or max_requests requests"""
+        with self._lock:
+            if self.active:
+                raise RuntimeError("Profiler is already running")
+            self._stacks = Counter()
+            self._samples = 0
+            self._dropped = 0
+            self._remaining_requests = max_requests
+            self._deadline = time.monotonic() + duration if duration else None
+            self._interval = interval
+            self._include_idle = include_idle
+            self._started_at = time.time()
+            self._stopped_at = None
+            self._stop_event.clear()
+            self.active = True
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+        return self.status()
+    
+    def stop(self) -> Dict[str, Any]:
+        """Stop the current session; collected samples stay available for report()"""
+        self._stop_event.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=1.0)
+        return self.status()
+    
+    def record_request(self):
+        """Count a handled request toward max_requests (no-op when the profiler is off)"""
+        if not self.active:
+            return
+        with self._lock:
+            if self._remaining_requests is None:
+                return
+            self._remaining_requests -= 1
+            if self._remaining_requests <= 0:
+                self._stop_event.set()
+    
+    def _run(self):
+        own_id = threading.get_ident()
+        try:
+            while not self._stop_event.is_set():
+                if self._deadline is not None and time.monotonic() >= self._deadline:
+                    break
+                self._sample(own_id)
+                self._stop_event.wait(self._interval)
+        finally:
+            with self._lock:
+                self.active = False
+                self._stopped_at = time.time()
+    
+    def _sample(self, own_id: int):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            
+            leaf = (frame.f_globals.get("__name__", "?"), frame.f_code.co_name)
+            if not self._include_idle and leaf in IDLE_LEAVES:
+                continue
+            
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+                frame = frame.f_back
+            stack.append(names.get(thread_id, f"thread-{thread_id}"))
+            key = ";".join(reversed(stack))
+            
+            with self._lock:
+                if key in self._stacks or len(self._stacks) < self.max_stacks:
+                    self._stacks[key] += 1
+                else:
+                    self._dropped += 1
+                self._samples += 1
+    
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active": self.active,
+                "samples": self._samples,
+                "distinct_stacks": len(self._stacks),
+                "dropped_samples": self._dropped,
+                "remaining_requests": self._remaining_requests,
+                "interval_ms": round(self._interval * 1000, 3),
+                "started_at": self._started_at,
+                "stopped_at": self._stopped_at
+            }
+    
+    def collapsed(self) -> str:
+        """Collapsed-stack text, one "frame;frame;frame count" line per stack"""
+        with self._lock:
+            items = self._stacks.most_common()
+        return "\n".join(f"{stack} {count}" for stack, count in items)
+    
+    def report(self, top: int = 50) -> Dict[str, Any]:
+        """JSON summary with the hottest stacks and self/total time per frame"""
+        with self._lock:
+            items = self._stacks.most_common()
+        
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        for stack, count in items:
+            frames = stack.split(";")
+            self_counts[frames[-1]] += count
+            for frame in set(frames[1:]):
+                total_counts[frame] += count
+        
+        return {
+            **self.status(),
+            "top_stacks": [{"stack": s, "samples": c} for s, c in items[:top]],
+            "top_self": [{"frame": f, "samples": c} for f, c in self_counts.most_common(top)],
+            "top_total": [{"frame": f, "samples": c} for f, c in total_counts.most_common(top)]
+        }
@@ -0,0 +1,222 @@
+"""
+Shadow Model Evaluation
+Scores a sample of live traffic with a candidate model in a separate low-priority process
+"""
+import multiprocessing
+import os
+import queue
+import random
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+RISK_BANDS = ["Low", "Medium", "High", "Critical"]
+
+
+def latency_summary(samples: Iterable[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99 in milliseconds of latencies given in seconds"""
+    samples = np.fromiter(samples, dtype=np.float64)
+    if not len(samples):
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+    return {"p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2)}
+
+
+class ShadowStats:
+    """Running comparison of primary vs candidate predictions (lives in the shadow process)"""
+    
+    def __init__(self, reservoir_size: int = 2048):
+        self.scored = 0
+        self.errors = 0
+        self.delta_sum = 0.0
+        self.abs_delta_sum = 0.0
+        self.max_abs_delta = 0.0
+        self.icu_flips = 0
+        self.band_disagreements = 0
+        self.band_matrix = np.zeros((len(RISK_BANDS), len(RISK_BANDS)), dtype=np.int64)
+        # Most recent samples, for percentiles
+        self.abs_deltas = deque(maxlen=reservoir_size)
+        self.primary_latency = deque(maxlen=reservoir_size)
+        self.candidate_latency = deque(maxlen=reservoir_size)
+    
+    def record(self, primary: Dict[str, Any], candidate: Dict[str, Any], primary_latency: float, candidate_latency: float):
+        delta = candidate["risk_score"] - primary["risk_score"]
+        self.scored += 1
+        self.delta_sum += delta
+        self.abs_delta_sum += abs(delta)
+        self.max_abs_delta = max(self.max_abs_delta, abs(delta))
+        self.abs_deltas.append(abs(delta))
+        self.icu_flips += primary["needs_icu"] != candidate["needs_icu"]
+        self.band_disagreements += primary["risk_level"] != candidate["risk_level"]
+        self.band_matrix[RISK_BANDS.index(primary["risk_level"]), RISK_BANDS.index(candidate["risk_level"])] += 1
+        self.primary_latency.append(primary_latency)
+        self.candidate_latency.append(candidate_latency)
+    
+    def snapshot(self, candidate_version: str) -> Dict[str, Any]:
+        n = max(self.scored, 1)
+        return {
+            "candidate_version": candidate_version,
+            "scored": self.scored,
+            "errors": self.errors,
+            "score_delta": {
+                "mean": round(self.delta_sum / n, 4),
+                "mean_abs": round(self.abs_delta_sum / n, 4),
+                "p95_abs": round(float(np.percentile(list(self.abs_deltas), 95)), 4) if self.abs_deltas else None,
+                "max_abs": round(self.max_abs_delta, 4)
+            },
+            "icu_decision_flips": self.icu_flips,
+            "risk_band_disagreements": self.band_disagreements,
+            "risk_band_agreement_rate": round(1 - self.band_disagreements / n, 4) if self.scored else None,
+            # rows: primary band, columns: candidate band
+            "risk_band_matrix": {
+                primary: {candidate: int(self.band_matrix[i, j]) for j, candidate in enumerate(RISK_BANDS)}
+                for i, primary in enumerate(RISK_BANDS)
+            },
+            "latency": {
+                "primary": latency_summary(self.primary_latency),
+                "candidate": latency_summary(self.candidate_latency)
+            }
+        }
+
+
+def _publish_snapshot(snapshots, snapshot: Dict[str, Any]):
+    """Replace the snapshot waiting in the one-slot queue, so an unread queue never grows"""
+    try:
+        snapshots.get_nowait()
+    except queue.Empty:
+        pass
+    try:
+        snapshots.put_nowait(snapshot)
+    except queue.Full:
+        # The previous one is still in flight; the next interval sends a fresher one
+        pass
+
+
+def _shadow_worker(candidate_paths: Dict[str, Optional[str]], requests, snapshots,
+                   cpu_budget: float, nice: int, snapshot_interval: float):
+    """Shadow process: load the candidate once, then score queued samples within the CPU budget"""
+    if nice:
+        os.nice(nice)
+    from models.predictor import ICUPredictor
+    
+    candidate = ICUPredictor(**candidate_paths)
+    # Runs within a fraction of one core anyway
+    candidate.set_thread_count(1)
+    stats = ShadowStats()
+    _publish_snapshot(snapshots, stats.snapshot(candidate.model_version))
+    last_snapshot = time.monotonic()
+    
+    while True:
+        try:
+            item = requests.get(timeout=snapshot_interval)
+        except queue.Empty:
+            item = ()
+        if item is None:
+            break
+        
+        if item:
+            patient_data, primary, primary_latency = item
+            started = time.perf_counter()
+            try:
+                result = candidate.predict(patient_data)
+                elapsed = time.perf_counter() - started
+                stats.record(primary, result, primary_latency, elapsed)
+            except Exception as e:
+                elapsed = time.perf_counter() - started
+                stats.errors += 1
+                print(f"Shadow prediction error: {e}")
+            # Idle long enough that scoring uses at most cpu_budget of one core
+            time.sleep(elapsed * (1.0 - cpu_budget) / cpu_budget)
+        
+        if time.monotonic() - last_snapshot >= snapshot_interval:
+            _publish_snapshot(snapshots, stats.snapshot(candidate.model_version))
+            last_snapshot = time.monotonic()
+    
+    _publish_snapshot(snapshots, stats.snapshot(candidate.model_version))
+
+
+class ShadowEvaluator:
+    """
+    Mirrors a sample of live predictions to a candidate model.
+    
+    The candidate runs in its own spawned, niced process fed through a bounded
+    queue; submit() never blocks and drops samples when the queue is full, so
+    the live request path only pays for a put_nowait. The shadow process sends
+    back aggregate snapshots rather than per-request results, through a one-slot
+    queue that only ever holds the latest.
+    """
+    
+    def __init__(self, candidate_paths: Dict[str, Optional[str]], sample_rate: float = 0.1,
+                 max_queue: int = 256, cpu_budget: float = 0.25, nice: int = 10,
+                 snapshot_interval: float = 1.0):
+        self.candidate_paths = candidate_paths
+        self.sample_rate = sample_rate
+        self.max_queue = max_queue
+        self.cpu_budget = min(max(cpu_budget, 0.01), 1.0)
+        self.nice = nice
+        self.snapshot_interval = snapshot_interval
+        self._process = None
+        self._requests = None
+        self._snapshots = None
+        self._latest: Dict[str, Any] = {}
+        self._stats = {"sampled": 0, "dropped": 0}
+    
+    def start(self):
+        """Start the shadow process (call from app startup, not at import, so spawn never recurses)"""
+        context = multiprocessing.get_context("spawn")
+        self._requests = context.Queue(maxsize=self.max_queue)
+        self._snapshots = context.Queue(maxsize=1)
+        self._process = context.Process(
+            target=_shadow_worker,
+            args=(self.candidate_paths, self._requests, self._snapshots,
+                  self.cpu_budget, self.nice, self.snapshot_interval),
+            name="shadow-model",
+            daemon=True
+        )
+        self._process.start()
+    
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+    
+    def submit(self, patient_data: Dict[str, Any], primary: Dict[str, Any], primary_latency: float) -> bool:
+        """Queue a sampled request for the candidate; returns False if not sampled or dropped"""
+        if not self.running or random.random() >= self.sample_rate:
+            return False
+        summary = {key: primary[key] for key in ("risk_score", "risk_level", "needs_icu")}
+        try:
+            self._requests.put_nowait((patient_data, summary, primary_latency))
+        except queue.Full:
+            self._stats["dropped"] += 1
+            return False
+        self._stats["sampled"] += 1
+        return True
+    
+    def report(self) -> Dict[str, Any]:
+        if self._snapshots is not None:
+            try:
+                self._latest = self._snapshots.get_nowait()
+            except queue.Empty:
+                pass
+        return {
+            "running": self.running,
+            "candidate": {key: path for key, path in self.candidate_paths.items() if path},
+            "sample_rate": self.sample_rate,
+            "cpu_budget": self.cpu_budget,
+            "queue_capacity": self.max_queue,
+            **self._stats,
+            **self._latest
+        }
+    
+    def shutdown(self, timeout: float = 5.0):
+        if self._process is None:
+            return
+        try:
+            self._requests.put_nowait(None)
+        except queue.Full:
+            pass
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
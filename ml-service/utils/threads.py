@@ -0,0 +1,130 @@
+"""
+CPU Thread Budget
+Sizes XGBoost, TensorFlow and BLAS/OpenMP thread pools against the container's CPU quota and worker count
+"""
+import math
+import os
+from typing import Any, Dict, Optional, Tuple
+
+# Read by OpenMP/BLAS runtimes when they initialize (covers spawned child processes)
+BLAS_THREAD_ENV = [
+    "OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+    "BLIS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS"
+]
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def detect_cpu_limit() -> Tuple[float, str]:
+    """
+    CPUs this process may use: the cgroup CFS quota (v2 cpu.max or v1
+    cfs_quota_us/cfs_period_us) capped by the CPU affinity mask.
+    
+    Returns:
+        (cpus, source)
+    """
+    try:
+        cpus, source = float(len(os.sched_getaffinity(0))), "affinity"
+    except AttributeError:
+        cpus, source = float(os.cpu_count() or 1), "cpu_count"
+    
+    quota = None
+    cpu_max = _read("/sys/fs/cgroup/cpu.max")
+    if cpu_max:
+        limit, _, period = cpu_max.partition(" ")
+        if limit != "max" and period:
+            quota, quota_source = int(limit) / int(period), "cgroup v2"
+    else:
+        limit, period = _read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us"), _read("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+        if limit and period and int(limit) > 0:
+            quota, quota_source = int(limit) / int(period), "cgroup v1"
+    
+    if quota is not None and quota < cpus:
+        cpus, source = quota, quota_source
+    return cpus, source
+
+
+class ThreadBudget:
+    """
+    Splits the available CPUs between worker processes, concurrent requests
+    within a worker (inter-request parallelism, the admission slots) and the
+    threads each request may use inside XGBoost, TensorFlow and BLAS (intra-op).
+    
+    Every library otherwise sizes its pool to the host's core count, so on a
+    small container several pools run at once on the same cores.
+    """
+    
+    def __init__(self, cpu_limit: float = 0, workers: int = 1, concurrency: int = 1, intra_op_threads: int = 0):
+        if cpu_limit:
+            self.cpus, self.source = float(cpu_limit), "CPU_LIMIT"
+        else:
+            self.cpus, self.source = detect_cpu_limit()
+        self.workers = max(1, workers)
+        self.concurrency = max(1, concurrency)
+        # Fractional quotas round down, but every worker gets at least one thread
+        self.cpus_per_worker = max(1, math.floor(self.cpus / self.workers))
+        self.intra_op_threads = intra_op_threads or max(1, self.cpus_per_worker // self.concurrency)
+        self.applied: Dict[str, Any] = {}
+    
+    def apply(self) -> Dict[str, Any]:
+        """Limit BLAS/OpenMP and TensorFlow pools in this process (models are configured separately)"""
+        threads = self.intra_op_threads
+        for name in BLAS_THREAD_ENV:
+            os.environ[name] = str(threads)
+        
+        try:
+            from threadpoolctl import threadpool_limits
+            # Not used as a context manager: the limit stays in place for the process
+            threadpool_limits(limits=threads)
+            self.applied["blas"] = threads
+        except ImportError:
+            self.applied["blas"] = "env only (threadpoolctl not installed)"
+        
+        from models.lstm_model import TF_AVAILABLE
+        if TF_AVAILABLE:
+            import tensorflow as tf
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(threads)
+                tf.config.threading.set_inter_op_parallelism_threads(1)
+                self.applied["tensorflow"] = {"intra_op": threads, "inter_op": 1}
+            except RuntimeError as e:
+                # TensorFlow fixes its pools once the runtime has started
+                self.applied["tensorflow"] = f"not applied: {e}"
+        else:
+            self.applied["tensorflow"] = "not installed"
+        
+        self.applied["xgboost"] = threads
+        return self.applied
+    
+    def configure_predictor(self, predictor):
+        """Per-model XGBoost thread count (XGBoost's global nthread is per calling thread)"""
+        predictor.set_thread_count(self.intra_op_threads)
+    
+    def report(self) -> Dict[str, Any]:
+        total = self.workers * self.concurrency * self.intra_op_threads
+        report = {
+            "cpus": round(self.cpus, 2),
+            "cpu_source": self.source,
+            "workers": self.workers,
+            "cpus_per_worker": self.cpus_per_worker,
+            "inter_request_concurrency": self.concurrency,
+            "intra_op_threads": self.intra_op_threads,
+            "busy_threads_at_peak": total,
+            "oversubscription": round(total / max(self.cpus, 1e-9), 2),
+            "applied": self.applied
+        }
+        try:
+            from threadpoolctl import threadpool_info
+            report["native_pools"] = [
+                {"api": pool["internal_api"], "library": os.path.basename(pool["filepath"]), "threads": pool["num_threads"]}
+                for pool in threadpool_info()
+            ]
+        except ImportError:
+            pass
+        return report
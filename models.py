@@ -1,8 +1,18 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.sqlite import insert
 from datetime import datetime
 
 db = SQLAlchemy()
 
+# Risk bands by minimum risk score (same thresholds as the ML service)
+RISK_BANDS = [('Critical', 0.8), ('High', 0.6), ('Medium', 0.4), ('Low', 0.0)]
+
+def risk_band(risk_score):
+    for band, minimum in RISK_BANDS:
+        if (risk_score or 0.0) >= minimum:
+            return band
+    return 'Low'
+
 class Patient(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
@@ -26,4 +36,62 @@ class Patient(db.Model):
     # ML Predictions
     predicted_icu_need = db.Column(db.Boolean, default=False)
     risk_score = db.Column(db.Float)
-    generative_summary = db.Column(db.Text)
\ No newline at end of file
+    generative_summary = db.Column(db.Text)
+
+
+class RiskSummary(db.Model):
+    """Running totals per hour, location and risk band, kept in step with Patient inserts"""
+    __tablename__ = 'risk_summary'
+    
+    hour = db.Column(db.DateTime, primary_key=True)
+    location = db.Column(db.String(200), primary_key=True)
+    risk_band = db.Column(db.String(10), primary_key=True)
+    
+    patient_count = db.Column(db.Integer, nullable=False, default=0)
+    icu_count = db.Column(db.Integer, nullable=False, default=0)
+    risk_score_sum = db.Column(db.Float, nullable=False, default=0.0)
+
+
+def summary_key(patient):
+    if patient.timestamp is None:
+        # Set now rather than at flush so the patient and its summary row agree on the hour
+        patient.timestamp = datetime.utcnow()
+    return patient.timestamp.replace(minute=0, second=0, microsecond=0), patient.location or '', risk_band(patient.risk_score)
+
+
+def record_patient_summary(patient):
+    """Add a new patient to its summary row; call before committing the patient, in the same transaction"""
+    hour, location, band = summary_key(patient)
+    icu = 1 if patient.predicted_icu_need else 0
+    risk_score = patient.risk_score or 0.0
+    # Single upsert, so concurrent reports increment the row instead of overwriting each other
+    statement = insert(RiskSummary).values(
+        hour=hour, location=location, risk_band=band,
+        patient_count=1, icu_count=icu, risk_score_sum=risk_score
+    )
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['hour', 'location', 'risk_band'],
+        set_={
+            'patient_count': RiskSummary.patient_count + 1,
+            'icu_count': RiskSummary.icu_count + icu,
+            'risk_score_sum': RiskSummary.risk_score_sum + risk_score
+        }
+    ))
+
+
+def rebuild_risk_summary():
+    """Recompute the summary table from all patients (one scan, for databases created before it existed)"""
+    totals = {}
+    for patient in db.session.query(Patient).yield_per(1000):
+        row = totals.setdefault(summary_key(patient), [0, 0, 0.0])
+        row[0] += 1
+        row[1] += 1 if patient.predicted_icu_need else 0
+        row[2] += patient.risk_score or 0.0
+    db.session.query(RiskSummary).delete()
+    db.session.add_all(
+        RiskSummary(hour=hour, location=location, risk_band=band,
+                    patient_count=count, icu_count=icu, risk_score_sum=risk_sum)
+        for (hour, location, band), (count, icu, risk_sum) in totals.items()
+    )
+    db.session.commit()
+    return sum(row[0] for row in totals.values())
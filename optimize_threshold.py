@@ -7,15 +7,119 @@ import pandas as pd
 import numpy as np
 import joblib
 import matplotlib.pyplot as plt
-from sklearn.metrics import precision_recall_curve, roc_curve
 import warnings
 warnings.filterwarnings('ignore')
 
+class ThresholdSweep:
+    """
+    Confusion counts at every distinct threshold from a single sort.
+    
+    Scores are sorted once in descending order and TP/FP are accumulated with
+    cumulative sums, so each selection criterion is an O(n) array query
+    instead of a confusion matrix per candidate threshold. A sample is
+    predicted positive when its score is >= the threshold.
+    """
+    
+    def __init__(self, y_true, y_scores):
+        y_true = np.asarray(y_true).astype(bool)
+        y_scores = np.asarray(y_scores, dtype=np.float64)
+        
+        order = np.argsort(-y_scores, kind='mergesort')
+        sorted_scores = y_scores[order]
+        sorted_true = y_true[order]
+        
+        # Last index of each run of tied scores
+        distinct_idx = np.r_[np.flatnonzero(np.diff(sorted_scores)), len(sorted_scores) - 1]
+        tp = np.cumsum(sorted_true, dtype=np.int64)[distinct_idx]
+        fp = (distinct_idx + 1) - tp
+        
+        # Leading point at +inf: nothing predicted positive
+        self.thresholds = np.r_[np.inf, sorted_scores[distinct_idx]]
+        self.tp = np.r_[0, tp]
+        self.fp = np.r_[0, fp]
+        self.n_pos = int(y_true.sum())
+        self.n_neg = int(len(y_true) - self.n_pos)
+        self.fn = self.n_pos - self.tp
+        self.tn = self.n_neg - self.fp
+    
+    @staticmethod
+    def _ratio(num, den):
+        return np.divide(num, den, out=np.zeros(len(num), dtype=np.float64), where=den > 0)
+    
+    @property
+    def sensitivity(self):
+        return self._ratio(self.tp, np.full(len(self.tp), self.n_pos))
+    
+    @property
+    def specificity(self):
+        return self._ratio(self.tn, np.full(len(self.tn), self.n_neg))
+    
+    @property
+    def fpr(self):
+        return 1 - self.specificity
+    
+    @property
+    def precision(self):
+        return self._ratio(self.tp, self.tp + self.fp)
+    
+    @property
+    def npv(self):
+        return self._ratio(self.tn, self.tn + self.fn)
+    
+    @property
+    def f1(self):
+        return self._ratio(2 * self.tp, 2 * self.tp + self.fp + self.fn)
+    
+    def costs(self, fn_cost=5, fp_cost=1):
+        """Expected misclassification cost per sample at every threshold"""
+        return (fn_cost * self.fn + fp_cost * self.fp) / (self.n_pos + self.n_neg)
+    
+    def best_f1(self):
+        return int(np.argmax(self.f1))
+    
+    def best_youden(self):
+        return int(np.argmax(self.sensitivity - self.fpr))
+    
+    def best_balanced(self):
+        return int(np.argmin(np.hypot(1 - self.sensitivity, self.fpr)))
+    
+    def best_high_sensitivity(self, min_sensitivity=0.9):
+        """Index with the best specificity among those reaching min_sensitivity, or None"""
+        candidates = np.flatnonzero(self.sensitivity >= min_sensitivity)
+        if len(candidates) == 0:
+            return None
+        return int(candidates[np.argmax(self.specificity[candidates])])
+    
+    def best_cost(self, fn_cost=5, fp_cost=1):
+        return int(np.argmin(self.costs(fn_cost, fp_cost)))
+    
+    def cost_sweep(self, fn_costs, fp_cost=1):
+        """Optimal threshold index for each FN cost in fn_costs (one O(n) pass per ratio)"""
+        return np.array([self.best_cost(fn_cost, fp_cost) for fn_cost in fn_costs], dtype=np.int64)
+    
+    def index_for(self, threshold):
+        """Index of the sweep point equivalent to predicting score >= threshold"""
+        # thresholds are strictly descending; count how many are >= threshold
+        ascending = self.thresholds[::-1]
+        n_at_or_above = len(ascending) - np.searchsorted(ascending, threshold, side='left')
+        return max(int(n_at_or_above) - 1, 0)
+    
+    def curves(self):
+        """ROC and precision-recall arrays in the layout of sklearn's roc_curve/precision_recall_curve"""
+        roc = (self.fpr, self.sensitivity, self.thresholds)
+        # PR curve: ascending thresholds, final (precision=1, recall=0) point has no threshold
+        precision = np.r_[self.precision[:0:-1], 1.0]
+        recall = np.r_[self.sensitivity[:0:-1], 0.0]
+        pr = (precision, recall, self.thresholds[:0:-1])
+        return pr, roc
+
+
 class ThresholdOptimizer:
     """Optimize prediction threshold for healthcare applications"""
     
     def __init__(self, model_path='emergency_predictor_stacked.pkl'):
         """Initialize with trained model"""
+        self._sweep_cache = None
         try:
             self.model = joblib.load(model_path)
             print("✅ Model loaded successfully")
@@ -51,91 +155,100 @@ class ThresholdOptimizer:
         
         return X_test, y_test
     
-    def find_optimal_thresholds(self, X_test, y_test):
-        """Find optimal thresholds using different criteria"""
+    def get_sweep(self, X_test, y_test):
+        """Score X_test once and return the cached ThresholdSweep for it"""
+        if self._sweep_cache is not None:
+            cached_X, cached_y, sweep = self._sweep_cache
+            if cached_X is X_test and cached_y is y_test:
+                return sweep
         
-        # Get prediction probabilities
         y_pred_proba = self.model.predict_proba(X_test)[:, 1]
-        
-        # Calculate precision-recall curve
-        precision, recall, pr_thresholds = precision_recall_curve(y_test, y_pred_proba)
-        
-        # Calculate ROC curve
-        fpr, tpr, roc_thresholds = roc_curve(y_test, y_pred_proba)
+        sweep = ThresholdSweep(y_test, y_pred_proba)
+        self._sweep_cache = (X_test, y_test, sweep)
+        return sweep
+    
+    def find_optimal_thresholds(self, X_test, y_test, fn_cost=5, fp_cost=1, min_sensitivity=0.9):
+        """Find optimal thresholds using different criteria"""
+        sweep = self.get_sweep(X_test, y_test)
+        sensitivity = sweep.sensitivity
+        specificity = sweep.specificity
         
         # Method 1: Maximize F1-Score
-        f1_scores = 2 * (precision[:-1] * recall[:-1]) / (precision[:-1] + recall[:-1])
-        optimal_f1_idx = np.argmax(f1_scores)
-        optimal_f1_threshold = pr_thresholds[optimal_f1_idx]
+        optimal_f1_idx = sweep.best_f1()
         
         # Method 2: Youden's Index (maximize sensitivity + specificity - 1)
-        youdens_index = tpr - fpr
-        optimal_youden_idx = np.argmax(youdens_index)
-        optimal_youden_threshold = roc_thresholds[optimal_youden_idx]
+        optimal_youden_idx = sweep.best_youden()
         
         # Method 3: Balance sensitivity and specificity (closest to top-left corner)
-        distances = np.sqrt((1 - tpr)**2 + fpr**2)
-        optimal_balance_idx = np.argmin(distances)
-        optimal_balance_threshold = roc_thresholds[optimal_balance_idx]
+        optimal_balance_idx = sweep.best_balanced()
         
         # Method 4: Prioritize sensitivity (healthcare critical)
-        # Find threshold where sensitivity >= 0.9
-        high_sensitivity_indices = np.where(tpr >= 0.9)[0]
-        if len(high_sensitivity_indices) > 0:
-            # Among high sensitivity thresholds, pick one with best specificity
-            best_spec_idx = high_sensitivity_indices[np.argmax(1 - fpr[high_sensitivity_indices])]
-            optimal_sensitivity_threshold = roc_thresholds[best_spec_idx]
+        # Among thresholds with sensitivity >= min_sensitivity, pick the best specificity
+        best_spec_idx = sweep.best_high_sensitivity(min_sensitivity)
+        if best_spec_idx is not None:
+            optimal_sensitivity_threshold = sweep.thresholds[best_spec_idx]
         else:
             optimal_sensitivity_threshold = 0.3  # Conservative default
         
-        # Method 5: Cost-sensitive (assuming FN cost 5x higher than FP)
-        fn_cost = 5  # Missing ICU case is 5x costlier than unnecessary admission
-        fp_cost = 1
-        costs = fn_cost * (1 - tpr) * y_test.mean() + fp_cost * fpr * (1 - y_test.mean())
-        optimal_cost_idx = np.argmin(costs)
-        optimal_cost_threshold = roc_thresholds[optimal_cost_idx]
+        # Method 5: Cost-sensitive (by default a missed ICU case is 5x costlier
+        # than an unnecessary admission)
+        costs = sweep.costs(fn_cost, fp_cost)
+        optimal_cost_idx = int(np.argmin(costs))
         
         thresholds_info = {
             'F1-Optimized': {
-                'threshold': optimal_f1_threshold,
-                'f1_score': f1_scores[optimal_f1_idx],
-                'precision': precision[optimal_f1_idx],
-                'recall': recall[optimal_f1_idx]
+                'threshold': sweep.thresholds[optimal_f1_idx],
+                'f1_score': sweep.f1[optimal_f1_idx],
+                'precision': sweep.precision[optimal_f1_idx],
+                'recall': sensitivity[optimal_f1_idx]
             },
             'Youden-Index': {
-                'threshold': optimal_youden_threshold,
-                'sensitivity': tpr[optimal_youden_idx],
-                'specificity': 1 - fpr[optimal_youden_idx],
-                'youden_index': youdens_index[optimal_youden_idx]
+                'threshold': sweep.thresholds[optimal_youden_idx],
+                'sensitivity': sensitivity[optimal_youden_idx],
+                'specificity': specificity[optimal_youden_idx],
+                'youden_index': sensitivity[optimal_youden_idx] + specificity[optimal_youden_idx] - 1
             },
             'Balanced': {
-                'threshold': optimal_balance_threshold,
-                'sensitivity': tpr[optimal_balance_idx],
-                'specificity': 1 - fpr[optimal_balance_idx],
-                'distance': distances[optimal_balance_idx]
+                'threshold': sweep.thresholds[optimal_balance_idx],
+                'sensitivity': sensitivity[optimal_balance_idx],
+                'specificity': specificity[optimal_balance_idx],
+                'distance': np.hypot(1 - sensitivity[optimal_balance_idx], 1 - specificity[optimal_balance_idx])
             },
             'High-Sensitivity': {
                 'threshold': optimal_sensitivity_threshold,
                 'note': 'Prioritizes catching ICU cases'
             },
             'Cost-Sensitive': {
-                'threshold': optimal_cost_threshold,
-                'sensitivity': tpr[optimal_cost_idx],
-                'specificity': 1 - fpr[optimal_cost_idx],
+                'threshold': sweep.thresholds[optimal_cost_idx],
+                'sensitivity': sensitivity[optimal_cost_idx],
+                'specificity': specificity[optimal_cost_idx],
                 'cost': costs[optimal_cost_idx]
             }
         }
         
-        return thresholds_info, (precision, recall, pr_thresholds), (fpr, tpr, roc_thresholds)
+        pr_data, roc_data = sweep.curves()
+        return thresholds_info, pr_data, roc_data
+    
+    def cost_sensitive_thresholds(self, X_test, y_test, fn_costs, fp_cost=1):
+        """Optimal threshold for each FN:FP cost ratio in fn_costs"""
+        sweep = self.get_sweep(X_test, y_test)
+        results = {}
+        for fn_cost, idx in zip(fn_costs, sweep.cost_sweep(fn_costs, fp_cost)):
+            results[fn_cost] = {
+                'threshold': sweep.thresholds[idx],
+                'sensitivity': sweep.sensitivity[idx],
+                'specificity': sweep.specificity[idx],
+                'cost': sweep.costs(fn_cost, fp_cost)[idx]
+            }
+        return results
     
     def evaluate_threshold_performance(self, X_test, y_test, threshold):
         """Evaluate model performance at specific threshold"""
-        y_pred_proba = self.model.predict_proba(X_test)[:, 1]
-        y_pred = (y_pred_proba >= threshold).astype(int)
-        
-        from sklearn.metrics import confusion_matrix, classification_report
+        sweep = self.get_sweep(X_test, y_test)
+        idx = sweep.index_for(threshold)
         
-        tn, fp, fn, tp = confusion_matrix(y_test, y_pred).ravel()
+        tp, fp = int(sweep.tp[idx]), int(sweep.fp[idx])
+        tn, fn = int(sweep.tn[idx]), int(sweep.fn[idx])
         
         metrics = {
             'Sensitivity': tp / (tp + fn),
@@ -179,7 +292,7 @@ class ThresholdOptimizer:
         ax2.grid(alpha=0.3)
         
         # 3. F1-Score vs Threshold
-        f1_scores = 2 * (precision[:-1] * recall[:-1]) / (precision[:-1] + recall[:-1])
+        f1_scores = np.nan_to_num(2 * (precision[:-1] * recall[:-1]) / (precision[:-1] + recall[:-1]))
         ax3.plot(pr_thresholds, f1_scores, 'purple', alpha=0.8)
         max_f1_idx = np.argmax(f1_scores)
         ax3.axvline(pr_thresholds[max_f1_idx], color='red', linestyle='--', 
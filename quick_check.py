@@ -3,6 +3,10 @@ Quick Model Accuracy Checker
 Simple script to quickly check current model performance
 """
 
+import argparse
+import hashlib
+import json
+import sys
 import pandas as pd
 import numpy as np
 import joblib
@@ -11,6 +15,15 @@ from sklearn.metrics import classification_report, roc_auc_score, confusion_matr
 import warnings
 warnings.filterwarnings('ignore')
 
+GOLDEN_FORMAT_VERSION = 1
+GOLDEN_SNAPSHOT_PATH = 'golden_predictions.npz'
+
+TABULAR_FEATURES = [
+    'Age', 'Gender', 'HR_first', 'SysABP_first', 'DiasABP_first',
+    'SaO2_first', 'Temp_first', 'RespRate_first', 'GCS_first',
+    'Lactate_first', 'SAPS-I'
+]
+
 def quick_accuracy_check(model_path='emergency_predictor_stacked.pkl', 
                         X_path='X_train_2025.csv', y_path='y_train_2025.csv'):
     """Quick accuracy check for your model"""
@@ -40,11 +53,7 @@ def quick_accuracy_check(model_path='emergency_predictor_stacked.pkl',
     df = X_df.copy()
     df['needs_icu'] = y_df['In-hospital_death']
     
-    tabular_features = [
-        'Age', 'Gender', 'HR_first', 'SysABP_first', 'DiasABP_first',
-        'SaO2_first', 'Temp_first', 'RespRate_first', 'GCS_first',
-        'Lactate_first', 'SAPS-I'
-    ]
+    tabular_features = TABULAR_FEATURES
     
     # Fill missing values
     for col in tabular_features:
@@ -114,5 +123,139 @@ def quick_accuracy_check(model_path='emergency_predictor_stacked.pkl',
     if fp > 20:
         print(f"💰 {fp} unnecessary ICU predictions - consider raising threshold to reduce false alarms")
 
+def model_artifact_hash(model_path):
+    """SHA-256 of the model file, used to version golden snapshots"""
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def select_golden_sample(X_df, sample_size=500):
+    """
+    Pick a fixed sample of records by hashing their RecordID (or row position).
+    
+    Selection depends only on record identity, so the same records are chosen
+    regardless of file order or later appended rows.
+    """
+    keys = X_df['RecordID'] if 'RecordID' in X_df.columns else pd.Series(np.arange(len(X_df)))
+    record_hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+    chosen = np.sort(np.argsort(record_hashes, kind='stable')[:sample_size])
+    return chosen, keys.to_numpy()[chosen]
+
+def save_golden_snapshot(model_path='emergency_predictor_stacked.pkl', X_path='X_train_2025.csv',
+                         y_path='y_train_2025.csv', snapshot_path=GOLDEN_SNAPSHOT_PATH, sample_size=500):
+    """Score a hashed sample once and store inputs, labels and probabilities as a golden snapshot"""
+    print("📸 SAVING GOLDEN PREDICTION SNAPSHOT")
+    print("=" * 40)
+    
+    model = joblib.load(model_path)
+    X_df = pd.read_csv(X_path)
+    y_df = pd.read_csv(y_path)
+    
+    # Impute with full-dataset medians (same as quick_accuracy_check) before sampling
+    features = X_df[TABULAR_FEATURES].fillna(X_df[TABULAR_FEATURES].median())
+    rows, record_ids = select_golden_sample(X_df, sample_size)
+    
+    X_sample = features.iloc[rows]
+    probabilities = model.predict_proba(X_sample)[:, 1]
+    
+    metadata = {
+        'format_version': GOLDEN_FORMAT_VERSION,
+        'model_sha256': model_artifact_hash(model_path),
+        'model_path': str(model_path),
+        'features': TABULAR_FEATURES,
+        'sample_size': int(len(rows))
+    }
+    np.savez_compressed(
+        snapshot_path,
+        metadata=np.array(json.dumps(metadata)),
+        record_ids=record_ids,
+        features=X_sample.to_numpy(dtype=np.float64),
+        labels=y_df['In-hospital_death'].to_numpy()[rows].astype(np.int8),
+        probabilities=probabilities.astype(np.float64)
+    )
+    
+    print(f"✅ {len(rows)} golden predictions saved to {snapshot_path}")
+    print(f"   Model hash: {metadata['model_sha256'][:16]}")
+    return metadata
+
+def golden_regression_check(model_path='emergency_predictor_stacked.pkl', snapshot_path=GOLDEN_SNAPSHOT_PATH,
+                            threshold=0.5, max_drift_tolerance=0.01, max_label_flips=0):
+    """
+    Re-score only the golden sample and compare against the stored probabilities.
+    
+    Reports max/mean probability drift, label flips at threshold and the AUC
+    delta. Returns a result dict whose 'passed' flag is suitable for a
+    pre-deploy gate.
+    """
+    print("🔁 GOLDEN PREDICTION REGRESSION CHECK")
+    print("=" * 40)
+    
+    with np.load(snapshot_path, allow_pickle=False) as snapshot:
+        metadata = json.loads(str(snapshot['metadata']))
+        if metadata.get('format_version') != GOLDEN_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported golden snapshot format {metadata.get('format_version')} "
+                f"(expected {GOLDEN_FORMAT_VERSION}); re-create it with --save-golden"
+            )
+        features = snapshot['features']
+        labels = snapshot['labels']
+        golden_proba = snapshot['probabilities']
+    
+    current_hash = model_artifact_hash(model_path)
+    same_model = current_hash == metadata['model_sha256']
+    if same_model:
+        print(f"✅ Model artifact matches snapshot ({current_hash[:16]})")
+    else:
+        print(f"⚠️  Model artifact differs from snapshot: "
+              f"{current_hash[:16]} vs {metadata['model_sha256'][:16]}")
+    
+    model = joblib.load(model_path)
+    X_sample = pd.DataFrame(features, columns=metadata['features'])
+    current_proba = model.predict_proba(X_sample)[:, 1]
+    
+    drift = np.abs(current_proba - golden_proba)
+    label_flips = int(np.sum((current_proba >= threshold) != (golden_proba >= threshold)))
+    if len(np.unique(labels)) > 1:
+        auc_delta = roc_auc_score(labels, current_proba) - roc_auc_score(labels, golden_proba)
+    else:
+        auc_delta = float('nan')
+    
+    passed = drift.max() <= max_drift_tolerance and label_flips <= max_label_flips
+    
+    print(f"\n📊 Golden sample: {len(golden_proba)} records")
+    print(f"   Max drift:   {drift.max():.6f}")
+    print(f"   Mean drift:  {drift.mean():.6f}")
+    print(f"   Label flips: {label_flips} (threshold {threshold})")
+    print(f"   AUC delta:   {auc_delta:+.6f}")
+    print("\n✅ PASSED" if passed else "\n❌ FAILED - predictions drifted beyond tolerance")
+    
+    return {
+        'passed': bool(passed),
+        'same_model': same_model,
+        'model_sha256': current_hash,
+        'snapshot_model_sha256': metadata['model_sha256'],
+        'max_drift': float(drift.max()),
+        'mean_drift': float(drift.mean()),
+        'label_flips': label_flips,
+        'auc_delta': float(auc_delta)
+    }
+
 if __name__ == "__main__":
-    quick_accuracy_check()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Quick model accuracy and golden-prediction checks")
+    parser.add_argument('--model', default='emergency_predictor_stacked.pkl')
+    parser.add_argument('--save-golden', action='store_true', help="Store a golden prediction snapshot")
+    parser.add_argument('--check-golden', action='store_true', help="Compare against the golden snapshot")
+    parser.add_argument('--snapshot', default=GOLDEN_SNAPSHOT_PATH)
+    parser.add_argument('--sample-size', type=int, default=500)
+    parser.add_argument('--tolerance', type=float, default=0.01, help="Maximum allowed probability drift")
+    args = parser.parse_args()
+    
+    if args.save_golden:
+        save_golden_snapshot(args.model, snapshot_path=args.snapshot, sample_size=args.sample_size)
+    elif args.check_golden:
+        result = golden_regression_check(args.model, args.snapshot, max_drift_tolerance=args.tolerance)
+        sys.exit(0 if result['passed'] else 1)
+    else:
+        quick_accuracy_check(args.model)
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""
+Render cache for the pages the ER wall screens poll
+Rendered HTML keyed on page and query parameters, with ETags so unchanged pages cost a version lookup instead of a query and a render
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import make_response, request, session
+
+
+class RenderCache:
+    """
+    Server-side cache of rendered pages, keyed on the state of the data.
+
+    version() returns the data version from state every server process shares
+    (e.g. the newest row id in the database); it is read once per request, so
+    a write committed through any worker invalidates every worker's entries.
+    A page's ETag is derived from the version and its cache key, so a matching
+    If-None-Match is answered with 304 before the view runs, and ETags stay
+    valid across workers and restarts. Each process keeps its own entries.
+    """
+
+    def __init__(self, version, max_entries=256):
+        self.version = version
+        self.max_entries = max_entries
+        self.generation = None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'bypassed': 0, 'invalidations': 0}
+
+    def _current(self):
+        """Data version for this request; entries from an older version are dropped"""
+        generation = self.version()
+        with self.lock:
+            if generation != self.generation:
+                self.generation = generation
+                self.entries.clear()
+                self.stats['invalidations'] += 1
+        return generation
+
+    def cached(self, view):
+        """Decorator for GET views returning rendered HTML"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Flash messages are per user and consumed by the render
+            if session.get('_flashes'):
+                self.stats['bypassed'] += 1
+                return view(*args, **kwargs)
+
+            key = (request.path, tuple(sorted(request.args.items(multi=True))))
+            generation = self._current()
+            with self.lock:
+                body = self.entries.get(key) if generation == self.generation else None
+                if body is not None:
+                    self.entries.move_to_end(key)
+            etag = f"{generation}-{hashlib.sha1(repr(key).encode()).hexdigest()[:16]}"
+
+            if request.if_none_match.contains(etag):
+                self.stats['not_modified'] += 1
+                response = make_response('', 304)
+            elif body is not None:
+                self.stats['hits'] += 1
+                response = make_response(body)
+            else:
+                self.stats['misses'] += 1
+                body = view(*args, **kwargs)
+                with self.lock:
+                    # Don't store a page under a version another request has since replaced
+                    if generation == self.generation:
+                        self.entries[key] = body
+                        if len(self.entries) > self.max_entries:
+                            self.entries.popitem(last=False)
+                response = make_response(body)
+
+            response.set_etag(etag)
+            # Browsers revalidate on every poll instead of showing a stale copy
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+
+    def report(self):
+        with self.lock:
+            return {'generation': self.generation, 'entries': len(self.entries), 'max_entries': self.max_entries, **self.stats}
@@ -1,2 +1,33 @@
 // This file is ready for any future JavaScript interactivity.
-console.log("Emergency Response System JS loaded.");
\ No newline at end of file
+console.log("Emergency Response System JS loaded.");
+
+// Dashboard: patient rows pushed by the server (server-sent events) are
+// inserted or replaced in place instead of reloading the page.
+const patientRows = document.getElementById("patient-rows");
+if (patientRows && window.EventSource) {
+    // Start from the event the page was rendered at, so rows reported since are replayed
+    const since = encodeURIComponent(patientRows.dataset.lastEventId || "");
+    const events = new EventSource(`${patientRows.dataset.eventsUrl}?since=${since}`);
+    events.addEventListener("patient", (event) => {
+        const data = JSON.parse(event.data);
+        const template = document.createElement("template");
+        template.innerHTML = data.html.trim();
+        const row = template.content.firstElementChild;
+        const existing = patientRows.querySelector(`tr[data-patient-id="${data.id}"]`);
+        if (existing) {
+            existing.replaceWith(row);
+        } else {
+            const empty = patientRows.querySelector(".empty-row");
+            if (empty) empty.remove();
+            patientRows.prepend(row);
+        }
+    });
+    // Missed more events than the server buffers: fetch the whole page once
+    events.addEventListener("resync", () => window.location.reload());
+    // Stream refused (the server has no capacity for it): revalidate the page periodically instead
+    events.addEventListener("error", () => {
+        if (events.readyState === EventSource.CLOSED) {
+            setTimeout(() => window.location.reload(), 30000);
+        }
+    });
+}
@@ -1,7 +1,10 @@
+import os
+import sys
+import argparse
 import pandas as pd
 import numpy as np
 import joblib
-import tensorflow as tf
+import xgboost
 from xgboost import XGBClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, roc_auc_score
@@ -9,12 +12,28 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import StackingClassifier
 from sklearn.linear_model import LogisticRegression
 
+# The bundle format lives with the serving code; import it without loading the ML service package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ml-service', 'models'))
+from bundle import write_model_bundle
+from training_data import (ChunkedTrainingData, XGBoostChunkIter, compute_feature_stats,
+                           fill_and_scale, fitted_scaler)
+
 # --- Configuration ---
 X_DATA_PATH = 'X_train_2025.csv'
 Y_DATA_PATH = 'y_train_2025.csv'
 # We will save the final, best model (the Stacking model)
 MODEL_SAVE_PATH = 'emergency_predictor_stacked.pkl' 
 SCALER_SAVE_PATH = 'scaler.pkl'
+FEATURE_LIST_SAVE_PATH = 'feature_list.pkl'
+# Single-file bundle (model + scaler + feature order + LSTM weights) for the ML service
+BUNDLE_SAVE_PATH = 'icu_model.bundle'
+
+TABULAR_FEATURES = [
+    'Age', 'Gender', 'HR_first', 'SysABP_first', 'DiasABP_first', 'SaO2_first',
+    'Temp_first', 'RespRate_first', 'GCS_first', 'Lactate_first', 'SAPS-I',
+]
+TIME_SERIES_BASE_FEATURES = ['HR', 'SysABP', 'DiasABP', 'SaO2', 'Temp', 'RespRate']
+XGB_PARAMS = dict(n_estimators=150, max_depth=5, learning_rate=0.1, random_state=42)
 
 # --- 1. Data Loading and Preprocessing ---
 def load_and_preprocess_data():
@@ -26,14 +45,11 @@ def load_and_preprocess_data():
     df.rename(columns={'In-hospital_death': 'needs_icu'}, inplace=True)
 
     # --- FEATURE SELECTION for XGBoost (uses all relevant first-reads) ---
-    tabular_features = [
-        'Age', 'Gender', 'HR_first', 'SysABP_first', 'DiasABP_first', 'SaO2_first',
-        'Temp_first', 'RespRate_first', 'GCS_first', 'Lactate_first', 'SAPS-I',
-    ]
+    tabular_features = TABULAR_FEATURES
     
     # --- FEATURE SELECTION for LSTM (time-series features) ---
     # We select vitals that have multiple readings (_first, _last, _median)
-    time_series_base_features = ['HR', 'SysABP', 'DiasABP', 'SaO2', 'Temp', 'RespRate']
+    time_series_base_features = TIME_SERIES_BASE_FEATURES
     time_series_features = [f'{feat}_{suffix}' for feat in time_series_base_features for suffix in ['first', 'median', 'last']]
 
     all_features = sorted(list(set(tabular_features + time_series_features)))
@@ -50,7 +66,7 @@ def load_and_preprocess_data():
     
     # Save the scaler and feature list for the Flask app
     joblib.dump(scaler, SCALER_SAVE_PATH)
-    joblib.dump(all_features, 'feature_list.pkl')
+    joblib.dump(all_features, FEATURE_LIST_SAVE_PATH)
     print(f"Scaler and feature list saved.")
     
     X_scaled_df = pd.DataFrame(X_scaled, columns=all_features)
@@ -58,6 +74,8 @@ def load_and_preprocess_data():
 
 # --- 2. Model Training ---
 def train_all_models(X, y, tabular_features, time_series_base_features):
+    # Only the in-memory pipeline trains the LSTM
+    import tensorflow as tf
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
     
     # --- Model A: XGBoost (Champion Challenger) ---
@@ -122,8 +140,95 @@ def train_all_models(X, y, tabular_features, time_series_base_features):
     # Save the final, best model
     joblib.dump(stacking_model, MODEL_SAVE_PATH)
     print(f"\n✅ Final Stacking model saved to {MODEL_SAVE_PATH}")
+    
+    return stacking_model, lstm_model
+
+# --- 3. Model Bundle ---
+def save_model_bundle(stacking_model, lstm_model):
+    scaler = joblib.load(SCALER_SAVE_PATH)
+    feature_list = joblib.load(FEATURE_LIST_SAVE_PATH)
+    manifest = write_model_bundle(BUNDLE_SAVE_PATH, feature_list, scaler, stacking_model, lstm_model)
+    print(f"✅ Model bundle {manifest['model_version']} saved to {BUNDLE_SAVE_PATH}")
+
+
+# --- 4. Out-of-core training ---
+def train_out_of_core(chunk_rows=100000, xgb_data='quantile', cache_dir=None):
+    """
+    Train on exports larger than memory: float32 chunks, streaming medians and
+    scaler statistics, and XGBoost fed by a data iterator instead of a DataFrame.
+
+    Peak memory is a few chunks plus XGBoost's quantized matrix; with
+    xgb_data='external' that matrix is paged to cache_dir as well. Stacking (5-fold
+    CV) and the LSTM need the data in memory, so this trains the XGBoost model alone.
+    """
+    time_series_features = [f'{feat}_{suffix}' for feat in TIME_SERIES_BASE_FEATURES for suffix in ['first', 'median', 'last']]
+    all_features = sorted(set(TABULAR_FEATURES + time_series_features))
+    data = ChunkedTrainingData(X_DATA_PATH, Y_DATA_PATH, all_features, chunk_rows=chunk_rows)
+
+    print(f"Computing medians and scaler statistics in chunks of {chunk_rows:,} rows...")
+    stats, medians = compute_feature_stats(data)
+    scaler = fitted_scaler(stats, medians, all_features)
+    joblib.dump(scaler, SCALER_SAVE_PATH)
+    joblib.dump(all_features, FEATURE_LIST_SAVE_PATH)
+    print(f"Scaler and feature list saved ({stats.rows:,} rows).")
+
+    positives = negatives = 0
+    for _, y_chunk in data.split(test=False):
+        positives += int(y_chunk.sum())
+        negatives += len(y_chunk) - int(y_chunk.sum())
+
+    print(f"\n--- Training XGBoost Classifier ({xgb_data} data iterator) ---")
+    iterator = XGBoostChunkIter(data, medians, scaler, TABULAR_FEATURES,
+                                cache_prefix=os.path.join(cache_dir or '.', 'xgb_cache') if xgb_data == 'external' else None)
+    if xgb_data == 'external':
+        # ExtMemQuantileDMatrix on XGBoost >= 3.0, paged DMatrix before that
+        matrix_type = getattr(xgboost, 'ExtMemQuantileDMatrix', xgboost.DMatrix)
+        dtrain = matrix_type(iterator)
+    else:
+        dtrain = xgboost.QuantileDMatrix(iterator)
+    params = {
+        'objective': 'binary:logistic', 'eval_metric': 'logloss', 'tree_method': 'hist',
+        'scale_pos_weight': negatives / max(positives, 1), 'max_depth': XGB_PARAMS['max_depth'],
+        'learning_rate': XGB_PARAMS['learning_rate'], 'seed': XGB_PARAMS['random_state']
+    }
+    booster = xgboost.train(params, dtrain, num_boost_round=XGB_PARAMS['n_estimators'])
+    del dtrain
+
+    # Holdout scores are kept (5 bytes per test row) for the exact AUC
+    scores, labels = [], []
+    columns = [all_features.index(c) for c in TABULAR_FEATURES]
+    for X_chunk, y_chunk in data.split(test=True):
+        X_chunk = fill_and_scale(X_chunk, medians, scaler)[:, columns]
+        scores.append(booster.predict(xgboost.DMatrix(X_chunk, feature_names=TABULAR_FEATURES)).astype(np.float32))
+        labels.append(y_chunk)
+    scores, labels = np.concatenate(scores), np.concatenate(labels)
+    print("\n--- XGBoost Performance Report ---")
+    print(classification_report(labels, (scores > 0.5).astype(int), target_names=['Survived', 'Died']))
+    print(f"XGBoost AUC Score: {roc_auc_score(labels, scores):.4f}")
+
+    model = XGBClassifier()
+    model.load_model(bytearray(booster.save_raw('ubj')))
+    joblib.dump(model, MODEL_SAVE_PATH)
+    print(f"\n✅ XGBoost model saved to {MODEL_SAVE_PATH}")
+
+    manifest = write_model_bundle(BUNDLE_SAVE_PATH, all_features, scaler, model)
+    print(f"✅ Model bundle {manifest['model_version']} saved to {BUNDLE_SAVE_PATH}")
+    return model
 
 
 if __name__ == "__main__":
-    X_data, y_data, tabular_cols, time_series_cols = load_and_preprocess_data()
-    train_all_models(X_data, y_data, tabular_cols, time_series_cols)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the ICU risk models")
+    parser.add_argument("--out-of-core", action="store_true",
+                        help="Stream the CSVs in chunks and train XGBoost through a data iterator (no stacking/LSTM)")
+    parser.add_argument("--chunk-rows", type=int, default=100000, help="Rows per chunk for --out-of-core")
+    parser.add_argument("--xgb-data", choices=["quantile", "external"], default="quantile",
+                        help="QuantileDMatrix in memory, or external memory paged to --cache-dir")
+    parser.add_argument("--cache-dir", default=None, help="Directory for external-memory cache pages")
+    args = parser.parse_args()
+
+    if args.out_of_core:
+        train_out_of_core(chunk_rows=args.chunk_rows, xgb_data=args.xgb_data, cache_dir=args.cache_dir)
+    else:
+        X_data, y_data, tabular_cols, time_series_cols = load_and_preprocess_data()
+        stacking, lstm = train_all_models(X_data, y_data, tabular_cols, time_series_cols)
+        save_model_bundle(stacking, lstm)
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""
+Out-of-core training data pipeline
+Chunked float32 reads, streaming median/scaler statistics and XGBoost data iterators for exports larger than memory
+"""
+from itertools import zip_longest
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import xgboost
+from sklearn.preprocessing import StandardScaler
+
+
+class ChunkedTrainingData:
+    """
+    Feature and label CSVs read together chunk by chunk, only the needed columns, as float32.
+    
+    Each row is assigned to the test split by a generator seeded with the chunk
+    number, so every pass over the files sees the same split.
+    """
+    
+    def __init__(self, x_path: str, y_path: str, features: List[str], label: str = 'In-hospital_death',
+                 chunk_rows: int = 100000, test_size: float = 0.2, seed: int = 42):
+        self.x_path = x_path
+        self.y_path = y_path
+        self.features = list(features)
+        self.label = label
+        self.chunk_rows = chunk_rows
+        self.test_size = test_size
+        self.seed = seed
+    
+    def chunks(self) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Yield (X float32 (n, n_features), y int8, test mask) per chunk"""
+        x_reader = pd.read_csv(self.x_path, usecols=self.features, dtype='float32', chunksize=self.chunk_rows)
+        y_reader = pd.read_csv(self.y_path, usecols=[self.label], dtype={self.label: 'int8'}, chunksize=self.chunk_rows)
+        for number, (x_chunk, y_chunk) in enumerate(zip_longest(x_reader, y_reader)):
+            # zip() would stop silently at the shorter file
+            if x_chunk is None or y_chunk is None or len(x_chunk) != len(y_chunk):
+                raise ValueError(f"{self.x_path} and {self.y_path} have different row counts")
+            X = x_chunk[self.features].to_numpy(dtype=np.float32)
+            y = y_chunk[self.label].to_numpy()
+            test = np.random.default_rng([self.seed, number]).random(len(X)) < self.test_size
+            yield X, y, test
+    
+    def split(self, test: bool = False) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        for X, y, test_mask in self.chunks():
+            rows = test_mask if test else ~test_mask
+            yield X[rows], y[rows]
+
+
+class StreamingFeatureStats:
+    """
+    Per-feature statistics of the observed (non-NaN) values, built in two passes.
+    
+    Pass 1 merges count/mean/M2 (Chan et al.) and min/max per chunk. Pass 2 fills
+    a fixed histogram between min and max, from which the median is interpolated to
+    within (max - min) / bins. Memory is O(features x bins) whatever the row count.
+    """
+    
+    def __init__(self, n_features: int, bins: int = 16384):
+        self.bins = bins
+        self.rows = 0
+        self.count = np.zeros(n_features, dtype=np.int64)
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+        self.min = np.full(n_features, np.inf)
+        self.max = np.full(n_features, -np.inf)
+        self.histogram = np.zeros((n_features, bins), dtype=np.int64)
+    
+    def update_moments(self, X: np.ndarray):
+        observed = ~np.isnan(X)
+        batch_count = observed.sum(axis=0)
+        values = np.where(observed, X, 0.0).astype(np.float64)
+        batch_mean = values.sum(axis=0) / np.maximum(batch_count, 1)
+        batch_m2 = np.where(observed, (X - batch_mean) ** 2, 0.0).sum(axis=0)
+        
+        total = self.count + batch_count
+        delta = batch_mean - self.mean
+        safe_total = np.maximum(total, 1)
+        self.m2 += batch_m2 + delta ** 2 * self.count * batch_count / safe_total
+        self.mean += delta * batch_count / safe_total
+        self.count = total
+        self.rows += len(X)
+        self.min = np.fmin(self.min, np.nanmin(np.where(observed, X, np.inf), axis=0))
+        self.max = np.fmax(self.max, np.nanmax(np.where(observed, X, -np.inf), axis=0))
+    
+    def _bin_width(self) -> np.ndarray:
+        span = np.where(self.max > self.min, self.max - self.min, 1.0)
+        return span / self.bins
+    
+    def update_histogram(self, X: np.ndarray):
+        observed = ~np.isnan(X)
+        low = np.where(np.isfinite(self.min), self.min, 0.0)
+        positions = (np.where(observed, X, low) - low) / self._bin_width()
+        buckets = np.clip(np.floor(positions).astype(np.int64), 0, self.bins - 1)
+        flat = (buckets + np.arange(X.shape[1]) * self.bins)[observed]
+        self.histogram += np.bincount(flat, minlength=self.histogram.size).reshape(self.histogram.shape)
+    
+    def medians(self) -> np.ndarray:
+        """Medians interpolated within the histogram bin holding the middle value (NaN if never observed)"""
+        medians = np.full(len(self.count), np.nan)
+        width = self._bin_width()
+        for j, counts in enumerate(self.histogram):
+            if not self.count[j]:
+                continue
+            if self.max[j] == self.min[j]:
+                medians[j] = self.min[j]
+                continue
+            cumulative = np.cumsum(counts)
+            middle = self.count[j] / 2.0
+            b = int(np.searchsorted(cumulative, middle))
+            before = cumulative[b - 1] if b else 0
+            medians[j] = self.min[j] + (b + (middle - before) / max(counts[b], 1)) * width[j]
+        return medians
+    
+    def filled_moments(self, fill: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Mean and population variance after filling every missing value with `fill`"""
+        missing = self.rows - self.count
+        mean = (self.count * self.mean + missing * fill) / max(self.rows, 1)
+        m2 = self.m2 + (fill - self.mean) ** 2 * self.count * missing / max(self.rows, 1)
+        return mean, m2 / max(self.rows, 1)
+
+
+def compute_feature_stats(data: ChunkedTrainingData) -> Tuple[StreamingFeatureStats, np.ndarray]:
+    """Two streaming passes over all rows; returns the stats and per-feature medians"""
+    stats = StreamingFeatureStats(len(data.features))
+    for X, _, _ in data.chunks():
+        stats.update_moments(X)
+    for X, _, _ in data.chunks():
+        stats.update_histogram(X)
+    return stats, stats.medians()
+
+
+def fitted_scaler(stats: StreamingFeatureStats, medians: np.ndarray, features: List[str]) -> StandardScaler:
+    """StandardScaler equivalent to fit_transform on the median-filled data, without materialising it"""
+    mean, var = stats.filled_moments(medians)
+    scaler = StandardScaler()
+    scaler.mean_ = mean
+    scaler.var_ = var
+    scaler.scale_ = np.where(var > np.finfo(np.float64).eps, np.sqrt(var), 1.0)
+    scaler.n_samples_seen_ = np.int64(stats.rows)
+    scaler.n_features_in_ = len(features)
+    scaler.feature_names_in_ = np.asarray(features, dtype=object)
+    return scaler
+
+
+def fill_and_scale(X: np.ndarray, medians: np.ndarray, scaler: StandardScaler) -> np.ndarray:
+    """Median-fill and standardise a float32 chunk in place"""
+    missing = np.isnan(X)
+    if missing.any():
+        X[missing] = np.broadcast_to(medians.astype(np.float32), X.shape)[missing]
+    X -= scaler.mean_.astype(np.float32)
+    X /= scaler.scale_.astype(np.float32)
+    return X
+
+
+class XGBoostChunkIter(xgboost.DataIter):
+    """
+    Feeds prepared training chunks to QuantileDMatrix / external-memory DMatrix.
+    XGBoost calls next() until it returns 0, then reset(), possibly several times.
+    """
+    
+    def __init__(self, data: ChunkedTrainingData, medians: np.ndarray, scaler: StandardScaler,
+                 columns: List[str], cache_prefix: Optional[str] = None):
+        self.data = data
+        self.medians = medians
+        self.scaler = scaler
+        self.columns = columns
+        self.column_index = [data.features.index(c) for c in columns]
+        self._chunks = None
+        super().__init__(cache_prefix=cache_prefix)
+    
+    def next(self, input_data) -> int:
+        if self._chunks is None:
+            self._chunks = self.data.split(test=False)
+        for X, y in self._chunks:
+            if len(X):
+                X = fill_and_scale(X, self.medians, self.scaler)[:, self.column_index]
+                input_data(data=X, label=y, feature_names=self.columns)
+                return 1
+        return 0
+    
+    def reset(self):
+        self._chunks = None